@@ -1,14 +1,63 @@
 # import logging
 
 from audio_exp._lowlevel import (
+    AudioStreamReader,
+    WavFileMeta,
+    WavStreamReader,
+    add_inplace,
+    bias_inplace,
+    clip_inplace,
+    deinterleave,
+    float_to_int,
+    gain_inplace,
+    ima_adpcm_decode,
+    ima_adpcm_encode,
+    int_to_float,
+    interleave,
+    read_audio_file,
+    read_audio_file_metadata,
     read_wav_file,
     read_wav_file_metadata,
+    read_wav_files,
+    read_wav_files_metadata,
+    read_wav_frames,
     write_wav_file,
 )
+from audio_exp.buffer_pool import BufferPool
+from audio_exp.instrument import enable_stats, reset_stats, stats
+from audio_exp.wav_index import WavMetadataTable, scan_wav_metadata
 
 # FORMAT = "%(levelname)s %(name)s %(asctime)-15s %(filename)s:%(lineno)d %(message)s"
 # logging.basicConfig(format=FORMAT)
 # logging.getLogger().setLevel(logging.INFO)
 
 
-__all__ = ["read_wav_file_metadata", "read_wav_file", "write_wav_file"]
+__all__ = [
+    "read_audio_file",
+    "read_audio_file_metadata",
+    "AudioStreamReader",
+    "read_wav_file_metadata",
+    "read_wav_file",
+    "read_wav_files",
+    "read_wav_files_metadata",
+    "read_wav_frames",
+    "write_wav_file",
+    "WavFileMeta",
+    "WavStreamReader",
+    "ima_adpcm_encode",
+    "ima_adpcm_decode",
+    "gain_inplace",
+    "add_inplace",
+    "bias_inplace",
+    "clip_inplace",
+    "interleave",
+    "deinterleave",
+    "int_to_float",
+    "float_to_int",
+    "scan_wav_metadata",
+    "WavMetadataTable",
+    "BufferPool",
+    "enable_stats",
+    "stats",
+    "reset_stats",
+]
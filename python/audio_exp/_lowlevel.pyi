@@ -1,18 +1,114 @@
-from typing import NamedTuple, TypeVar
+from os import PathLike
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
 import numpy as np
 import numpy.typing as npt
 
-class WavFileMeta(NamedTuple):
+class WavFileMeta:
+    def __init__(
+        self,
+        bits_per_sample: int,
+        channels: int,
+        sample_rate: int,
+        sample_format_int: bool = True,
+    ) -> None: ...
     bits_per_sample: int  # u16
     channels: int  # u16
     sample_rate: int  # u32
     sample_format_int: bool
     duration: int  # u32
     length: int  # u32
-    duration_seconds: int  # u32
+    duration_seconds: float
 
-# TODO correctly type this
-T = TypeVar("T", bound=np.int16)
+# samples come back in the native container of the file:
+# uint8 (8-bit), int16, int32 (24 and 32-bit) or float32
+T = TypeVar("T", np.uint8, np.int16, np.int32, np.float32)
 
 def read_wav_file_metadata(file_path: str) -> WavFileMeta: ...
-def read_wav_file_np(file_path: str, channel: int) -> npt.NDArray[T]: ...
+def read_wav_files_metadata(
+    file_paths: Sequence[str], num_threads: Optional[int] = None
+) -> Dict[str, Any]: ...
+def write_wav_file(
+    file: Union[str, PathLike, int], spec: WavFileMeta, data: npt.NDArray[T]
+) -> None: ...
+def read_wav_file(
+    file_path: str, starting_time_ms: int = 0, duration_ms: Optional[int] = None
+) -> npt.NDArray[T]: ...
+def read_wav_frames(
+    file_path: str, start_frame: int = 0, n_frames: Optional[int] = None
+) -> npt.NDArray[T]: ...
+def read_wav_files(
+    file_paths: Sequence[str],
+    start_frame: int = 0,
+    n_frames: Optional[int] = None,
+    num_threads: Optional[int] = None,
+) -> List[npt.NDArray[Any]]: ...
+
+class WavStreamReader:
+    def __init__(self, file_path: str, block_frames: int = 4096) -> None: ...
+    @property
+    def metadata(self) -> WavFileMeta: ...
+    @property
+    def dtype(self) -> str: ...
+    @property
+    def position(self) -> int: ...
+    @property
+    def block_frames(self) -> int: ...
+    def seek(self, frame: int) -> None: ...
+    def read(self, n_frames: Optional[int] = None) -> npt.NDArray[T]: ...
+    def read_into(self, out: npt.NDArray[T]) -> int: ...
+    def __iter__(self) -> Iterator[npt.NDArray[T]]: ...
+    def __next__(self) -> npt.NDArray[T]: ...
+
+# compressed formats decode to int16, or float32 with `float=True`
+def read_audio_file_metadata(file_path: str, float: bool = False) -> WavFileMeta: ...
+def read_audio_file(
+    file_path: str,
+    start_frame: int = 0,
+    n_frames: Optional[int] = None,
+    float: bool = False,
+) -> npt.NDArray[Union[np.int16, np.float32]]: ...
+
+class AudioStreamReader:
+    def __init__(self, file_path: str, float: bool = False) -> None: ...
+    @property
+    def metadata(self) -> WavFileMeta: ...
+    @property
+    def dtype(self) -> str: ...
+    def __iter__(self) -> Iterator[npt.NDArray[Union[np.int16, np.float32]]]: ...
+    def __next__(self) -> npt.NDArray[Union[np.int16, np.float32]]: ...
+
+# IMA ADPCM, two codes per byte like `audioop.lin2adpcm`; `state` is the
+# (valpred, index) pair returned by the previous call on the same stream
+def ima_adpcm_encode(
+    samples: npt.NDArray[np.int16], state: Optional[Tuple[int, int]] = None
+) -> Tuple[npt.NDArray[np.uint8], Tuple[int, int]]: ...
+def ima_adpcm_decode(
+    codes: npt.NDArray[np.uint8], state: Optional[Tuple[int, int]] = None
+) -> Tuple[npt.NDArray[np.int16], Tuple[int, int]]: ...
+
+# in-place kernels on int16, int32 or float32 arrays of any shape, `width`
+# is the sample width in bytes like in `npaudioop`
+def gain_inplace(samples: npt.NDArray[Any], width: int, factor: float) -> None: ...
+def add_inplace(samples: npt.NDArray[T], other: npt.NDArray[T], width: int) -> None: ...
+def bias_inplace(samples: npt.NDArray[Any], width: int, bias: float) -> None: ...
+def clip_inplace(samples: npt.NDArray[Any], lo: float, hi: float) -> None: ...
+def interleave(channels: Sequence[npt.NDArray[T]], out: npt.NDArray[T]) -> None: ...
+def deinterleave(samples: npt.NDArray[T], outs: Sequence[npt.NDArray[T]]) -> None: ...
+def int_to_float(
+    samples: npt.NDArray[Union[np.int16, np.int32]],
+    width: int,
+    out: npt.NDArray[np.float32],
+) -> None: ...
+def float_to_int(
+    samples: npt.NDArray[np.float32],
+    width: int,
+    out: npt.NDArray[Union[np.int16, np.int32]],
+) -> None: ...
+
+# counters of the functions above, see `audio_exp.instrument`
+def set_stats_enabled(enabled: bool) -> None: ...
+def stats_snapshot() -> Dict[str, Dict[str, Union[int, float]]]: ...
+def reset_stats() -> None: ...
+
+# most verbose Python logging level forwarded from the `log` crate
+def set_log_level(level: int) -> None: ...
@@ -1,17 +1,35 @@
 import array
+import io
+import os
 import wave
 
 import numpy as np
 
 from enum import IntEnum
 
-try:
-    import audioop
-except ImportError:
-    # py3.13+ would not have audioop
-    from .legacy_compatible import pyaudioop as audioop
-
-from audio_exp import read_wav_file, read_wav_file_metadata
+from audio_exp import (
+    WavFileMeta,
+    WavStreamReader,
+    float_to_int,
+    gain_inplace,
+    int_to_float,
+    interleave,
+    npaudioop,
+    read_audio_file,
+    read_audio_file_metadata,
+    read_wav_file,
+    read_wav_file_metadata,
+    read_wav_frames,
+    write_wav_file,
+)
+from audio_exp.envelope import windowed_envelope
+from audio_exp.instrument import counted
+from audio_exp.lazy import TransformPlan
+from audio_exp.resample import resample
+from audio_exp.wav_mmap import memmap_wav_file, read_wav_header
+
+# containers the in-place kernels of the extension work on
+_NATIVE_DTYPES = (np.dtype(np.int16), np.dtype(np.int32), np.dtype(np.float32))
 
 
 def db_to_float(db, using_amplitude=True):
@@ -26,6 +44,77 @@ def db_to_float(db, using_amplitude=True):
         return 10 ** (db / 10)
 
 
+def _is_wav_file(file_path):
+    # probe the content rather than trusting the extension
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+def _time_range_to_frames(start_time, duration, frame_rate):
+    """
+    Converts a (start, duration) range in ms to (start_frame, n_frames).
+
+    The end frame is derived from the end time, so consecutive ranges tile
+    without gaps or overlaps. `duration=None` stands for "up to the end".
+    """
+    start_frame = start_time * frame_rate // 1000
+    if duration is None:
+        return start_frame, None
+    return start_frame, (start_time + duration) * frame_rate // 1000 - start_frame
+
+
+def _decode_pcm24(frames, as_float=False):
+    # every 3-byte sample is copied into the top 3 bytes of an int32, that
+    # int32 is the sample times 256 with its sign in place: one copy, then
+    # an in-place shift
+    triplets = np.frombuffer(frames, "u1").reshape(-1, 3)
+    samples = np.empty(len(triplets), dtype="<i4")
+    samples_bytes = samples.view("u1").reshape(-1, 4)
+    samples_bytes[:, 0] = 0
+    samples_bytes[:, 1:] = triplets
+    if as_float:
+        # exact, float32 has 24 bits of mantissa
+        as_float = samples.astype(np.float32)
+        as_float *= 2.0**-31
+        return as_float
+    samples >>= 8
+    return samples
+
+
+def _encode_pcm24(samples):
+    # the low 3 bytes of every little-endian int32, copied in one pass
+    samples = np.ascontiguousarray(samples.reshape(-1), dtype="<i4")
+    packed = np.empty((len(samples), 3), dtype="u1")
+    packed[...] = samples.view("u1").reshape(-1, 4)[:, :3]
+    return packed.reshape(-1)
+
+
+def _export_io(result, seg, out_f, sample_width=None, dither=False):
+    samples = seg._samples.size
+    if sample_width is None:
+        sample_width = (
+            seg._samples.itemsize
+            if seg._samples.dtype.kind == "f"
+            else seg.sample_width
+        )
+    return {"bytes_written": samples * sample_width, "samples": samples}
+
+
+def _output(out, shape, dtype):
+    # array a sample-level op writes its result to: `out` when given,
+    # checked against the result, otherwise a new one
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if out.shape != tuple(shape) or out.dtype != dtype:
+        raise ValueError(
+            "out should be a {} array of shape {}, got {} {}".format(
+                np.dtype(dtype), tuple(shape), out.dtype, out.shape
+            )
+        )
+    return out
+
+
 class PCMEncoding(IntEnum):
     UNSIGNED_8 = 1
     SIGNED_16 = 2
@@ -44,33 +133,39 @@ class PCMEncoding(IntEnum):
     def num_bits(self):
         return 8 * self
 
-    def decode(self, frames):
+    def decode(self, frames, as_float=False):
+        """
+        Little-endian PCM bytes as samples in the canonical container of the
+        width (`npaudioop._DTYPES`), or as float32 normalized to [-1, 1)
+        with `as_float`. Only 24-bit samples are copied.
+        """
         match self:
-            case PCMEncoding.UNSIGNED_8:
-                # return np.frombuffer(frames, "u1") / self.max * 2 - 1
-                return np.frombuffer(frames, "u1")
-            case PCMEncoding.SIGNED_16:
-                # The less-than symbol (<) in the format string explicitly
-                # indicates little-endian as the byte order of
-                # each two-byte audio sample (i2).
-                # return np.frombuffer(frames, "<i2") / -self.min
-                return np.frombuffer(frames, "<i2")
+            case PCMEncoding.UNSIGNED_8 | PCMEncoding.SIGNED_16 | PCMEncoding.SIGNED_32:
+                # The less-than symbol (<) in the canonical dtypes explicitly
+                # indicates little-endian as the byte order of each sample.
+                samples = np.frombuffer(frames, npaudioop._DTYPES[self])
             case PCMEncoding.SIGNED_24:
-                triplets = np.frombuffer(frames, "u1").reshape(-1, 3)
-                padded = np.pad(triplets, ((0, 0), (0, 1)), mode="constant")
-                samples = padded.flatten().view("<i4")
-                samples[samples > self.max] += 2 * self.min
-                return samples
-
-                # The following code is an alternative less efficient implementation
-                # samples = (
-                #     int.from_bytes(frames[i : i + 3], byteorder="little", signed=True)
-                #     for i in range(0, len(frames), 3)
-                # )
-                # return np.fromiter(samples, "<i4")
-            case PCMEncoding.SIGNED_32:
-                # return np.frombuffer(frames, "<i4") / -self.min
-                return np.frombuffer(frames, "<i4")
+                return _decode_pcm24(frames, as_float)
+            case _:
+                raise TypeError("unsupported encoding")
+        return npaudioop.lin2float(samples, self) if as_float else samples
+
+    def encode(self, samples):
+        """
+        Samples (in a container wide enough for the width, or floats
+        normalized to [-1, 1)) as little-endian PCM bytes, returned as a
+        flat uint8 array usable wherever bytes are.
+        """
+        if samples.dtype.kind == "f":
+            samples = npaudioop.float2lin(samples, self)
+        match self:
+            case PCMEncoding.SIGNED_24:
+                return _encode_pcm24(samples)
+            case PCMEncoding.UNSIGNED_8 | PCMEncoding.SIGNED_16 | PCMEncoding.SIGNED_32:
+                encoded = np.ascontiguousarray(
+                    samples.reshape(-1), dtype=npaudioop._DTYPES[self]
+                )
+                return encoded.view("u1")
             case _:
                 raise TypeError("unsupported encoding")
 
@@ -92,51 +187,302 @@ class AudioSegment:
 
         self.frame_width = self.channels * self.sample_width
 
-        pcm = PCMEncoding(self.sample_width)
-
         # array aleady has type information
         # TODO maybe remove support for array.array
         if isinstance(data, array.array):
             data = np.array(data)
 
         elif isinstance(data, bytes):
-            data = pcm.decode(data)
+            data = PCMEncoding(self.sample_width).decode(data)
             # data = np.frombuffer(data, dtype="<h")
         elif isinstance(data, np.ndarray):
             pass
 
+        # transforms not applied yet in lazy mode, see `lazy()`
+        self._plan = None
         self._data = data
 
+    @property
+    def _data(self):
+        if self._plan is not None and self._plan.steps:
+            self._samples = self._plan.run(self._samples)
+            self._plan = TransformPlan(
+                self.channels, self.sample_width, self.frame_rate
+            )
+        return self._samples
+
+    @_data.setter
+    def _data(self, data):
+        self._samples = data
+
+    def __len__(self):
+        """
+        Returns the length of this audio segment in milliseconds.
+        """
+        return round(1000 * (self.frame_count() / self.frame_rate))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, millisecond):
+        """
+        `seg[start:end]` is the audio between two positions in ms, negative
+        positions count from the end. `seg[ms]` is the millisecond at `ms`
+        and `seg[start:end:step]` iterates over consecutive `step` ms chunks.
+        The results are views on the samples of this segment, nothing is
+        copied.
+        """
+        if isinstance(millisecond, slice):
+            if millisecond.step:
+                return (
+                    self[i : i + millisecond.step]
+                    for i in range(*millisecond.indices(len(self)))
+                )
+            start = 0 if millisecond.start is None else millisecond.start
+            end = float("inf") if millisecond.stop is None else millisecond.stop
+        else:
+            start = millisecond
+            # the last millisecond ends at the end, not at 0
+            end = float("inf") if millisecond == -1 else millisecond + 1
+
+        return self.get_sample_slice(
+            self._parse_position(start), self._parse_position(end)
+        )
+
+    def _parse_position(self, ms):
+        # frame at `ms`, clamped to the segment
+        n_frames = int(self.frame_count())
+        if ms == float("inf"):
+            return n_frames
+        frame = int(abs(ms) * self.frame_rate // 1000)
+        if ms < 0:
+            frame = n_frames - frame
+        return min(max(frame, 0), n_frames)
+
+    def get_sample_slice(self, start_sample=None, end_sample=None):
+        """
+        Frames `start_sample` to `end_sample`, indexed like a Python slice
+        (`None` for the ends, negative from the end), as a view on the
+        samples of this segment.
+        """
+        start, end, _ = slice(start_sample, end_sample).indices(int(self.frame_count()))
+        end = max(start, end)
+        return self._spawn(self._data[start * self.channels : end * self.channels])
+
+    def frame_count(self, ms=None):
+        """
+        Number of frames in the segment, or in `ms` milliseconds of audio
+        when given. A float, like in pydub.
+        """
+        if ms is not None:
+            return ms * (self.frame_rate / 1000.0)
+        return float(len(self._data) // self.channels)
+
+    @property
+    def duration_seconds(self):
+        return self.frame_rate and self.frame_count() / self.frame_rate or 0.0
+
+    @counted("AudioSegment.envelope")
+    def envelope(self, window_ms=50, hop_ms=None):
+        """
+        RMS, peak, dBFS and zero-crossing rate of every channel over windows
+        of `window_ms` starting every `hop_ms` (`window_ms` by default),
+        returns an `audio_exp.envelope.Envelope` of (windows, channels)
+        arrays. Only whole windows are analysed.
+        """
+        window = max(1, int(self.frame_count(ms=window_ms)))
+        hop = window if hop_ms is None else max(1, int(self.frame_count(ms=hop_ms)))
+        return windowed_envelope(
+            self._data, self.sample_width, self.channels, window, hop
+        )
+
+    def lazy(self):
+        """
+        Returns the same audio in lazy mode: `apply_gain`, `set_channels`,
+        `set_sample_width` and `set_frame_rate` then only record the
+        transform, and the whole chain runs fused in a single pass over the
+        samples the first time they are needed (`export`, `_data`...).
+        Segments derived from a lazy segment are lazy too. See
+        `audio_exp.lazy` for how results can differ from eager mode.
+        """
+        seg = self._spawn(self._data)
+        seg._plan = TransformPlan(self.channels, self.sample_width, self.frame_rate)
+        return seg
+
+    def _spawn_lazy(self, plan):
+        # shares the source samples, only the plan grows
+        seg = self.__class__(
+            self._samples,
+            channels=plan.out_channels,
+            sample_width=plan.out_sample_width,
+            frame_rate=plan.out_frame_rate,
+        )
+        seg._plan = plan
+        return seg
+
     @classmethod
-    def from_file(cls, file_path, start_time=0):
+    @counted("AudioSegment.from_file")
+    def from_file(cls, file_path, start_time=0, duration=None, mmap=False):
         # read audio data from a file into AudioSegment object
         # use `read_wav_file_metadata` from `lib.rs` to read audio metadata
         # use `read_wav_file_np` from `lib.rs` to read audio frames
+        # `start_time` and `duration` are in ms, only that range is decoded
+        # with `mmap=True` the data is a read-only view on the file instead
+        # other formats than WAV (MP3...) go through `read_audio_file`
+
+        if not _is_wav_file(file_path):
+            metadata = cls._check_compressed(file_path, mmap)
+            start_frame, n_frames = _time_range_to_frames(
+                start_time, duration, metadata.sample_rate
+            )
+            frames = read_audio_file(file_path, start_frame, n_frames)
+            return cls._from_file_data(frames, metadata)
+
+        if mmap:
+            header = read_wav_header(file_path)
+            start_frame, n_frames = _time_range_to_frames(
+                start_time, duration, header.sample_rate
+            )
+            return cls._from_file_mmap(file_path, start_frame, n_frames, header)
+
+        metadata = read_wav_file_metadata(file_path)
+        frames = read_wav_file(file_path, start_time, duration)
+        return cls._from_file_data(frames, metadata)
+
+    @classmethod
+    @counted("AudioSegment.from_file_frames")
+    def from_file_frames(cls, file_path, start_frame=0, n_frames=None, mmap=False):
+        # same as `from_file` with the range given in frames, `n_frames=None`
+        # reads up to the end of the file
+
+        if not _is_wav_file(file_path):
+            metadata = cls._check_compressed(file_path, mmap)
+            frames = read_audio_file(file_path, start_frame, n_frames)
+            return cls._from_file_data(frames, metadata)
+
+        if mmap:
+            return cls._from_file_mmap(file_path, start_frame, n_frames)
 
         metadata = read_wav_file_metadata(file_path)
-        sample_width = metadata.bits_per_sample // 8
+        frames = read_wav_frames(file_path, start_frame, n_frames)
+        return cls._from_file_data(frames, metadata)
 
-        # TODO: support read frames by nframes
-        frames = read_wav_file(file_path, start_time)
+    @staticmethod
+    def _check_compressed(file_path, mmap):
+        if mmap:
+            raise ValueError("only WAV files can be memory-mapped")
+        return read_audio_file_metadata(file_path)
 
-        obj = cls(
+    @classmethod
+    def _from_file_data(cls, frames, metadata):
+        return cls(
             data=frames,
-            sample_width=sample_width,
+            sample_width=metadata.bits_per_sample // 8,
             frame_rate=metadata.sample_rate,
             channels=metadata.channels,
         )
-        return obj
-
-    def export(self, output_file_path):
-        # export the AudioSegment to a new file
-        # writing in binary mode
-        with wave.open(output_file_path, mode="wb") as wav_file:
-            wav_file.setnchannels(self.channels)
-            wav_file.setsampwidth(self.sample_width)
-            wav_file.setframerate(self.frame_rate)
-            # writeframes() takes a bytes object as input
-            # is there any overhead in converting the ndarray data to bytes?
-            wav_file.writeframes(self._data)
+
+    @classmethod
+    def _from_file_mmap(cls, file_path, start_frame=0, n_frames=None, header=None):
+        samples, header = memmap_wav_file(file_path, header)
+        if start_frame > header.frame_count:
+            raise ValueError("Starting sample is beyond the duration of the WAV file")
+
+        end_frame = header.frame_count
+        if n_frames is not None:
+            end_frame = min(start_frame + n_frames, end_frame)
+
+        return cls(
+            data=samples[start_frame * header.channels : end_frame * header.channels],
+            sample_width=header.bits_per_sample // 8,
+            frame_rate=header.sample_rate,
+            channels=header.channels,
+        )
+
+    @classmethod
+    def iter_chunks(cls, file_path, chunk_ms, reuse_buffer=False):
+        """
+        Read a WAV file lazily as consecutive AudioSegments of `chunk_ms`.
+
+        Only one chunk is held in memory at a time, the last chunk may be
+        shorter. With `reuse_buffer=True` every chunk is a view on the same
+        buffer, so a chunk is only valid until the next one is requested.
+        """
+        reader = WavStreamReader(file_path)
+        metadata = reader.metadata
+        chunk_frames = max(1, chunk_ms * metadata.sample_rate // 1000)
+        spec = {
+            "sample_width": metadata.bits_per_sample // 8,
+            "frame_rate": metadata.sample_rate,
+            "channels": metadata.channels,
+        }
+
+        buffer = None
+        if reuse_buffer:
+            buffer = np.empty(chunk_frames * metadata.channels, dtype=reader.dtype)
+
+        while True:
+            if buffer is None:
+                frames = reader.read(chunk_frames)
+            else:
+                n_frames = reader.read_into(buffer)
+                frames = buffer[: n_frames * metadata.channels]
+            if len(frames) == 0:
+                return
+            yield cls(data=frames, **spec)
+
+    @counted("AudioSegment.export", io=_export_io)
+    def export(self, out_f, sample_width=None, dither=False):
+        # export the AudioSegment as a WAV file, `out_f` is a path or a file
+        # opened in binary mode
+        # samples are written in bulk by `write_wav_file` with the GIL released
+        # float samples are written as a float WAV file, integer samples at
+        # their own width; with `sample_width` both are converted to
+        # integer samples of that width first (see `to_int`)
+        if sample_width is None:
+            self._write(out_f)
+            return
+        if sample_width not in npaudioop._DTYPES:
+            raise ValueError(
+                "sample_width should be 1, 2, 3 or 4, got {}".format(sample_width)
+            )
+        self.to_int(sample_width, dither)._write(out_f)
+
+    def _write(self, out_f):
+        spec = WavFileMeta(
+            self.sample_width * 8,
+            self.channels,
+            self.frame_rate,
+            sample_format_int=self._data.dtype.kind != "f",
+        )
+        data = np.ascontiguousarray(self._data)
+
+        if isinstance(out_f, (str, os.PathLike)):
+            write_wav_file(out_f, spec, data)
+            return
+
+        try:
+            fd = out_f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            fd = None
+
+        if fd is not None:
+            # anything still buffered must land before the WAV data
+            out_f.flush()
+            write_wav_file(fd, spec, data)
+        else:
+            # in-memory files have no descriptor, go through `wave`, which
+            # only writes integer PCM
+            if data.dtype.kind == "f":
+                raise ValueError(
+                    "float samples can only be exported to a path or a file "
+                    "descriptor, or pass a sample_width"
+                )
+            with wave.open(out_f, mode="wb") as wav_file:
+                wav_file.setnchannels(self.channels)
+                wav_file.setsampwidth(self.sample_width)
+                wav_file.setframerate(self.frame_rate)
+                wav_file.writeframes(PCMEncoding(self.sample_width).encode(data))
 
     def __add__(self, arg):
         if isinstance(arg, AudioSegment):
@@ -153,49 +499,111 @@ class AudioSegment:
             return self.apply_gain(-arg)
 
     def append(self, seg, crossfade=0):
-        # sync metadata
-        seg1, seg2 = AudioSegment._sync(self, seg)
+        return self.concat([self, seg], crossfade=crossfade)
 
-        if not crossfade:
-            return seg1._spawn(seg1._data + seg2._data)
-        elif crossfade > len(self):
+    @classmethod
+    @counted("AudioSegment.concat")
+    def concat(cls, segments, crossfade=0):
+        """
+        Join `segments` end to end, each one fading into the next over
+        `crossfade` ms (linear amplitude ramps). The segments are first
+        converted to a common format like with `+`, then the output is
+        allocated once and every segment and crossfade is written in place,
+        so joining n segments costs O(total length) instead of the O(n^2)
+        of repeated `append`.
+        """
+        segments = list(segments)
+        if not segments:
+            raise ValueError("no segments to concatenate")
+        segs = cls._sync(*segments)
+        first = segs[0]
+        xf = int(first.frame_count(ms=crossfade))
+        frames = [seg._data.reshape(-1, first.channels) for seg in segs]
+
+        dtype = frames[0].dtype
+        if any(f.dtype != dtype for f in frames):
+            raise ValueError("can't concatenate integer and float samples")
+        if len(frames[0]) < xf:
             raise ValueError(
                 "Crossfade is longer than the original AudioSegment ({}ms > {}ms)".format(
-                    crossfade, len(self)
+                    crossfade, len(segments[0])
                 )
             )
-        elif crossfade > len(seg):
-            raise ValueError(
-                "Crossfade is longer than the appended AudioSegment ({}ms > {}ms)".format(
-                    crossfade, len(seg)
+        for seg, f in zip(segments[1:], frames[1:]):
+            if len(f) < xf:
+                raise ValueError(
+                    "Crossfade is longer than the appended AudioSegment ({}ms > {}ms)".format(
+                        crossfade, len(seg)
+                    )
                 )
-            )
-        else:
-            raise NotImplementedError("Crossfade not implemented")
-        # TODO: implement crossfade
-        # xf = seg1[-crossfade:].fade(to_gain=-120, start=0, end=float("inf"))
-        # xf *= seg2[:crossfade].fade(from_gain=-120, start=0, end=float("inf"))
-
-        # output = BytesIO()
 
-        # output.write(seg1[:-crossfade]._data)
-        # output.write(xf._data)
-        # output.write(seg2[crossfade:]._data)
+        n_frames = sum(len(f) for f in frames) - xf * (len(frames) - 1)
+        out = np.empty((n_frames, first.channels), dtype=dtype)
+        out[: len(frames[0])] = frames[0]
+        pos = len(frames[0])
+        fade_in = (np.arange(xf, dtype=np.float64) / xf)[:, None] if xf else None
+        for f in frames[1:]:
+            if xf:
+                out[pos - xf : pos] = first._crossfade(
+                    out[pos - xf : pos], f[:xf], fade_in
+                )
+            out[pos : pos + len(f) - xf] = f[xf:]
+            pos += len(f) - xf
+
+        return first._spawn(out.reshape(-1))
+
+    def _crossfade(self, fade_out_frames, fade_in_frames, fade_in):
+        # mix of two regions, the first fading out while the second fades in
+        if fade_out_frames.dtype.kind == "f":
+            mixed = fade_out_frames * (1 - fade_in) + fade_in_frames * fade_in
+            return mixed.astype(fade_out_frames.dtype)
+        width = self.sample_width
+        mixed = npaudioop._centred(fade_out_frames, width, np.float64)
+        mixed *= 1 - fade_in
+        mixed += npaudioop._centred(fade_in_frames, width, np.float64) * fade_in
+        return npaudioop._saturate(mixed, width, fade_out_frames, floor=True)
+
+    @counted("AudioSegment.apply_gain")
+    def apply_gain(self, volume_change, out=None):
+        factor = db_to_float(float(volume_change))
+        self._check_eager(out)
+        if self._plan is not None:
+            return self._spawn_lazy(self._plan.gain(factor))
+        if self._data.dtype not in _NATIVE_DTYPES:
+            data = _output(out, self._data.shape, self._data.dtype)
+            return self._spawn(
+                data=npaudioop.mul(self._data, self.sample_width, factor, out=data)
+            )
+        # one copy, scaled in place without float64 temporaries
+        data = _output(out, self._data.shape, self._data.dtype)
+        np.copyto(data, self._data)
+        gain_inplace(data, self.sample_width, factor)
+        return self._spawn(data=data)
 
-        # output.seek(0)
-        # obj = seg1._spawn(data=output)
-        # output.close()
-        # return obj
+    def _check_eager(self, out):
+        """
+        The sample-level ops (`apply_gain`, `set_channels`,
+        `set_sample_width`, `to_float`, `to_int`) write their result to
+        `out` when it is given, an array of the exact shape and dtype of
+        the result, e.g. from a `BufferPool`. Lazy segments only record
+        the ops, so they don't take one.
+        """
+        if out is not None and self._plan is not None:
+            raise ValueError("lazy segments don't take out=")
 
-    def apply_gain(self, volume_change):
-        return self._spawn(
-            data=audioop.mul(
-                self._data, self.sample_width, db_to_float(float(volume_change))
-            )
-        )
+    def _copy_to(self, out):
+        # result of an op that leaves the samples as they are
+        if out is None:
+            return self
+        data = _output(out, self._data.shape, self._data.dtype)
+        np.copyto(data, self._data)
+        return self._spawn(data)
 
     @classmethod
     def _sync(cls, *segs):
+        if any(seg._samples.dtype.kind == "f" for seg in segs):
+            # integer segments join float ones normalized, like `to_float`
+            segs = tuple(seg.to_float() for seg in segs)
         channels = max(seg.channels for seg in segs)
         sample_width = max(seg.sample_width for seg in segs)
         frame_rate = max(seg.frame_rate for seg in segs)
@@ -221,79 +629,238 @@ class AudioSegment:
             "frame_width": self.frame_width,
         }
         metadata.update(overrides)
-        return self.__class__(data, **metadata)
+        seg = self.__class__(data, **metadata)
+        if self._plan is not None:
+            seg._plan = TransformPlan(seg.channels, seg.sample_width, seg.frame_rate)
+        return seg
 
-    def set_channels(self, channels):
-        if channels == self.channels:
-            return self
+    @counted("AudioSegment.set_channels")
+    def set_channels(self, channels, matrix=None, out=None):
+        """
+        Converts to `channels` channels with a single matrix product: output
+        channel j is `sum_i input[i] * matrix[i, j]`, clipped to the sample
+        width. Without `matrix` the default of `npaudioop.mixing_matrix` is
+        used (mono copied to every channel, 5.1 and other standard layouts
+        downmixed to stereo with the ITU coefficients, averaged to mono).
+        """
+        self._check_eager(out)
+        if matrix is None:
+            if channels == self.channels:
+                return self._copy_to(out)
+            matrix = npaudioop.mixing_matrix(self.channels, channels)
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.shape != (self.channels, channels):
+            raise ValueError(
+                "expected a {}x{} mixing matrix, got {}x{}".format(
+                    self.channels, channels, *matrix.shape
+                )
+            )
 
-        if channels == 2 and self.channels == 1:
-            # TODO: reimplementation of ratecv for ndarray
-            fn = audioop.tostereo
-            frame_width = self.frame_width * 2
-            fac = 1
-            converted = fn(self._data.tobytes(), self.sample_width, fac, fac)
-        elif channels == 1 and self.channels == 2:
-            # TODO: reimplementation of ratecv for ndarray
-            fn = audioop.tomono
-            frame_width = self.frame_width // 2
-            fac = 0.5
-            converted = fn(self._data.tobytes(), self.sample_width, fac, fac)
-        elif channels == 1:
-            raise NotImplemented
-            # TODO
-            # channels_data = [seg.get_array_of_samples() for seg in self.split_to_mono()]
-            # frame_count = int(self.frame_count())
-            # converted = array.array(
-            #     channels_data[0].typecode, b"\0" * (frame_count * self.sample_width)
-            # )
-            # for raw_channel_data in channels_data:
-            #     for i in range(frame_count):
-            #         converted[i] += raw_channel_data[i] // self.channels
-            # frame_width = self.frame_width // self.channels
-        elif self.channels == 1:
-            raise NotImplemented
-            # TODO
-            # dup_channels = [self for iChannel in range(channels)]
-            # return AudioSegment.from_mono_audiosegments(*dup_channels)
-        else:
+        if self._plan is not None:
+            return self._spawn_lazy(self._plan.mix(matrix))
+
+        frames = self._data.size // self.channels
+        shape = (frames * channels,) if self._data.ndim == 1 else (frames, channels)
+        converted = npaudioop.mix(
+            self._data,
+            self.sample_width,
+            matrix,
+            out=_output(out, shape, self._data.dtype),
+        )
+        return self._spawn(
+            data=converted,
+            overrides={
+                "channels": channels,
+                "frame_width": self.sample_width * channels,
+            },
+        )
+
+    def split_to_mono(self):
+        """
+        One mono segment per channel, each a strided view on the samples of
+        this segment.
+        """
+        if self.channels == 1:
+            return [self]
+        frames = self._data.reshape(-1, self.channels)
+        return [
+            self._spawn(
+                frames[:, i],
+                overrides={"channels": 1, "frame_width": self.sample_width},
+            )
+            for i in range(self.channels)
+        ]
+
+    @classmethod
+    def from_mono_audiosegments(cls, *mono_segments):
+        """
+        Interleaves mono segments of the same sample width and frame rate
+        into one segment with a channel per segment. Shorter segments are
+        padded with silence.
+        """
+        if not mono_segments:
+            raise ValueError("At least one AudioSegment instance is required")
+        if not all(seg.channels == 1 for seg in mono_segments):
+            raise ValueError(
+                "AudioSegment.from_mono_audiosegments requires all arguments are mono AudioSegment instances"
+            )
+        first = mono_segments[0]
+        if any(
+            seg.sample_width != first.sample_width or seg.frame_rate != first.frame_rate
+            for seg in mono_segments
+        ):
             raise ValueError(
-                "AudioSegment.set_channels only supports mono-to-multi channel and multi-to-mono channel conversion"
+                "AudioSegment.from_mono_audiosegments requires all arguments to have the same sample width and frame rate"
             )
 
+        samples = [seg._data for seg in mono_segments]
+        dtype = np.result_type(*samples)
+        frames = np.empty((max(len(s) for s in samples), len(samples)), dtype=dtype)
+        # silence: 0, or the middle of the range for unsigned 8-bit
+        frames[...] = npaudioop._offset(frames, first.sample_width)
+        if dtype in _NATIVE_DTYPES and all(s.dtype == dtype for s in samples):
+            interleave(samples, frames)
+        else:
+            for i, channel in enumerate(samples):
+                frames[: len(channel), i] = channel
+
+        return cls(
+            frames.reshape(-1),
+            channels=len(samples),
+            sample_width=first.sample_width,
+            frame_rate=first.frame_rate,
+        )
+
+    @counted("AudioSegment.to_float")
+    def to_float(self, out=None):
+        """
+        The same audio as float32 samples normalized to [-1, 1), for chains
+        of effects without intermediate rounding and clipping. Every
+        transform keeps float samples in float, `to_int` (or `export` with a
+        `sample_width`) converts back once at the end. The segment then has
+        a `sample_width` of 4, the size of a float32.
+        """
+        self._check_eager(out)
+        if self._data.dtype.kind == "f":
+            return self._copy_to(out)
+        if self._data.dtype in _NATIVE_DTYPES:
+            data = _output(out, self._data.shape, np.float32)
+            int_to_float(self._data, self.sample_width, data)
+        else:
+            data = _output(out, self._data.shape, np.float32)
+            npaudioop.lin2float(self._data, self.sample_width, out=data)
         return self._spawn(
-            data=converted, overrides={"channels": channels, "frame_width": frame_width}
+            data, overrides={"sample_width": 4, "frame_width": 4 * self.channels}
+        )
+
+    @counted("AudioSegment.to_int")
+    def to_int(self, sample_width=2, dither=False, out=None):
+        """
+        Float samples back to integer samples of `sample_width` bytes,
+        rounded to nearest and clipped, with TPDF dither when `dither` is
+        set.
+        """
+        self._check_eager(out)
+        if self._data.dtype.kind != "f":
+            return self.set_sample_width(sample_width, out=out)
+        dtype = npaudioop._DTYPES.get(sample_width)
+        if not dither and self._data.dtype == np.float32 and dtype in _NATIVE_DTYPES:
+            data = _output(out, self._data.shape, dtype)
+            float_to_int(self._data, sample_width, data)
+        else:
+            data = _output(out, self._data.shape, dtype)
+            npaudioop.float2lin(self._data, sample_width, dither, out=data)
+        return self._spawn(
+            data,
+            overrides={
+                "sample_width": sample_width,
+                "frame_width": sample_width * self.channels,
+            },
+        )
+
+    @counted("AudioSegment.to_ulaw")
+    def to_ulaw(self):
+        """
+        G.711 u-law codes of the samples, a uint8 array (interleaved like
+        the samples) usable wherever bytes are. Float samples are encoded
+        from their 16-bit rounding.
+        """
+        return npaudioop.lin2ulaw(self._data, self.sample_width)
+
+    @counted("AudioSegment.to_alaw")
+    def to_alaw(self):
+        """G.711 A-law codes of the samples, see `to_ulaw`."""
+        return npaudioop.lin2alaw(self._data, self.sample_width)
+
+    @classmethod
+    def _from_g711(cls, data, decode, frame_rate, channels, sample_width):
+        codes = data if isinstance(data, np.ndarray) else np.frombuffer(data, "u1")
+        return cls(
+            decode(codes.reshape(-1), sample_width),
+            channels=channels,
+            sample_width=sample_width,
+            frame_rate=frame_rate,
+        )
+
+    @classmethod
+    @counted("AudioSegment.from_ulaw")
+    def from_ulaw(cls, data, frame_rate=8000, channels=1, sample_width=2):
+        """
+        Decodes G.711 u-law codes (bytes or a uint8 array) to samples of
+        `sample_width` bytes.
+        """
+        return cls._from_g711(
+            data, npaudioop.ulaw2lin, frame_rate, channels, sample_width
         )
 
-    def set_sample_width(self, sample_width):
+    @classmethod
+    @counted("AudioSegment.from_alaw")
+    def from_alaw(cls, data, frame_rate=8000, channels=1, sample_width=2):
+        """Decodes G.711 A-law codes, see `from_ulaw`."""
+        return cls._from_g711(
+            data, npaudioop.alaw2lin, frame_rate, channels, sample_width
+        )
+
+    @counted("AudioSegment.set_sample_width")
+    def set_sample_width(self, sample_width, out=None):
+        self._check_eager(out)
         if sample_width == self.sample_width:
-            return self
+            return self._copy_to(out)
+        if self._samples.dtype.kind == "f":
+            raise ValueError("float samples have no integer width, use to_int()")
 
         frame_width = self.channels * sample_width
 
+        if self._plan is not None:
+            return self._spawn_lazy(self._plan.convert_width(sample_width))
+
+        data = _output(out, self._data.shape, npaudioop._DTYPES.get(sample_width))
+        npaudioop.lin2lin(self._data, self.sample_width, sample_width, out=data)
         return self._spawn(
-            # TODO: reimplementation of ratecv for ndarray
-            audioop.lin2lin(self._data.tobytes(), self.sample_width, sample_width),
+            data,
             overrides={"sample_width": sample_width, "frame_width": frame_width},
         )
 
-    def set_frame_rate(self, frame_rate):
+    @counted("AudioSegment.set_frame_rate")
+    def set_frame_rate(self, frame_rate, quality="sinc_medium"):
+        """
+        Resample to `frame_rate`. `quality` is "linear" or one of the
+        windowed-sinc filters, see `audio_exp.resample.QUALITIES`.
+        """
         if frame_rate == self.frame_rate:
             return self
 
-        if self._data:
-            # TODO: reimplementation of ratecv for ndarray
-            converted, _ = audioop.ratecv(
-                self._data.tobytes(),
-                self.sample_width,
-                self.channels,
-                self.frame_rate,
-                frame_rate,
-                None,
-            )
-        else:
-            converted = self._data
+        if self._plan is not None:
+            return self._spawn_lazy(self._plan.resample(frame_rate, quality))
 
+        converted = resample(
+            self._data,
+            self.sample_width,
+            self.channels,
+            self.frame_rate,
+            frame_rate,
+            quality,
+        )
         return self._spawn(data=converted, overrides={"frame_rate": frame_rate})
 
     # Add more methods as needed
@@ -0,0 +1,572 @@
+"""
+Throughput benchmarks of the audio kernels and I/O paths.
+
+The same operation is often available from several backends, each one is
+measured on the same samples:
+    - "audioop": the stdlib module (audioop-lts on 3.13+), on bytes
+    - "pyaudioop": `legacy_compatible.pyaudioop`, on bytes
+    - "numpy": `npaudioop` and the NumPy modules, on arrays
+    - "native": the Rust readers, writers, codecs and in-place kernels of
+      `_lowlevel`
+    - "wave", "mmap": the stdlib `wave` module and `wav_mmap`, for I/O
+
+Every operation runs on a synthetic signal for every sample width and
+channel count asked for, and on the WAV files of the `--sounds`
+directory when one is given (`python/tests/sounds` in a source checkout,
+the fixtures don't ship with the package).
+A case reports the best time of a few rounds as samples per second, and
+the peak memory traced by `tracemalloc` during one call. NumPy buffers
+are traced, allocations made inside the Rust extension are not.
+`pyaudioop` loops over samples in Python, so it only gets the first
+`slow_samples` samples of each source.
+
+    python -m audio_exp.bench --out results.json
+    python -m audio_exp.bench --out new.json --compare results.json
+
+With `--compare` every case found in both runs is printed with its
+throughput ratio, and the exit status is 1 when a case got slower by more
+than `--tolerance`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from audio_exp import (
+    WavFileMeta,
+    gain_inplace,
+    read_wav_file,
+    read_wav_file_metadata,
+    write_wav_file,
+)
+from audio_exp import npaudioop
+from audio_exp.audio_segment import PCMEncoding
+from audio_exp.envelope import windowed_envelope
+from audio_exp.legacy_compatible import pyaudioop
+from audio_exp.resample import resample
+from audio_exp.wav_mmap import memmap_wav_file
+
+try:
+    import audioop
+except ImportError:  # removed from the stdlib in 3.13
+    audioop = None
+
+WIDTHS = (1, 2, 3, 4)
+CHANNELS = (1, 2, 6)
+FRAME_RATE = 48000
+
+# target rate of the rate conversions
+_RATE = 16000
+
+
+class Source(NamedTuple):
+    name: str
+    # 1-d interleaved, in the canonical container of `width`
+    samples: np.ndarray
+    width: int
+    channels: int
+    frame_rate: int
+    # WAV file holding the samples
+    path: str
+
+
+class Case(NamedTuple):
+    fn: Callable[[], object]
+    # samples processed by one call of `fn`
+    n_samples: int
+
+
+class _Context(NamedTuple):
+    slow_samples: int
+    tmp_dir: str
+
+
+def synthetic_samples(width, channels, frame_rate, seconds, seed=0):
+    """A 440 Hz tone with noise at about -6 dBFS, interleaved."""
+    n_frames = int(seconds * frame_rate)
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames) / frame_rate
+    values = 0.1 * rng.standard_normal((n_frames, channels))
+    values += 0.4 * np.sin(2 * np.pi * 440 * t)[:, None]
+    return npaudioop.float2lin(values.reshape(-1), width)
+
+
+def _new_width(width):
+    return 4 if width == 2 else 2
+
+
+def _new_rate(frame_rate):
+    return _RATE if frame_rate != _RATE else 8000
+
+
+# every factory takes a `Source` and a `_Context`, returns a `Case` or
+# `None` when the backend can't run the operation on that source
+
+
+def _array_case(source, call):
+    return Case(lambda: call(source.samples), len(source.samples))
+
+
+def _bytes_case(module, call):
+    # `call(module, fragment, source)` on the packed bytes `audioop` expects
+    def factory(source, context):
+        if module is None or (module is pyaudioop and source.width == 3):
+            return None
+        samples = source.samples
+        if module is pyaudioop:
+            limit = context.slow_samples
+            samples = samples[: limit - limit % source.channels]
+        if source.width == 1:
+            # signed, like `audioop` fragments
+            fragment = (samples ^ 0x80).view("i1").tobytes()
+        else:
+            fragment = PCMEncoding(source.width).encode(samples).tobytes()
+        return Case(lambda: call(module, fragment, source), len(samples))
+
+    return factory
+
+
+def _kernel(bytes_call, array_call, accepts=lambda source: True):
+    # one operation of the `audioop` API on its three implementations
+    def only(factory):
+        return lambda source, context: (
+            factory(source, context) if accepts(source) else None
+        )
+
+    return {
+        "audioop": only(_bytes_case(audioop, bytes_call)),
+        "pyaudioop": only(_bytes_case(pyaudioop, bytes_call)),
+        "numpy": only(
+            lambda source, context: _array_case(
+                source, lambda samples: array_call(samples, source)
+            )
+        ),
+    }
+
+
+def _read_wave(source, context):
+    def read():
+        with wave.open(source.path) as wav_file:
+            frames = wav_file.readframes(wav_file.getnframes())
+        return PCMEncoding(source.width).decode(frames)
+
+    try:
+        read()
+    except wave.Error:
+        # e.g. WAVE_FORMAT_EXTENSIBLE before 3.12
+        return None
+    return _array_case(source, lambda _: read())
+
+
+def _read_mmap(source, context):
+    try:
+        memmap_wav_file(source.path)
+    except ValueError:
+        # 24-bit data has no NumPy dtype
+        return None
+    return _array_case(source, lambda _: np.array(memmap_wav_file(source.path)[0]))
+
+
+def _write_native(source, context):
+    path = os.path.join(context.tmp_dir, "write.wav")
+    spec = WavFileMeta(8 * source.width, source.channels, source.frame_rate, True)
+    return _array_case(source, lambda samples: write_wav_file(path, spec, samples))
+
+
+def _write_wave(source, context):
+    path = os.path.join(context.tmp_dir, "write.wav")
+
+    def write(samples):
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(source.channels)
+            wav_file.setsampwidth(source.width)
+            wav_file.setframerate(source.frame_rate)
+            wav_file.writeframes(PCMEncoding(source.width).encode(samples))
+
+    return _array_case(source, write)
+
+
+def _gain_native(source, context):
+    if source.samples.dtype.kind != "i":
+        # 8-bit samples are unsigned, the kernels only take signed ones
+        return None
+    # the copy keeps the case comparable with the other backends, which
+    # return a new array
+    buffer = np.empty_like(source.samples)
+
+    def gain(samples):
+        np.copyto(buffer, samples)
+        gain_inplace(buffer, source.width, 0.5)
+
+    return _array_case(source, gain)
+
+
+def _downmix(samples, source):
+    if source.channels == 2:
+        return npaudioop.tomono(samples, source.width, 0.5, 0.5)
+    matrix = npaudioop.mixing_matrix(source.channels, 2)
+    return npaudioop.mix(samples.reshape(-1, source.channels), source.width, matrix)
+
+
+def _halves(data, frame_size):
+    # the first and second half of `data`, whole frames of `frame_size`
+    # items each: two different signals of the same length, without copies
+    half = len(data) // (2 * frame_size) * frame_size
+    return data[:half], data[half : 2 * half]
+
+
+def _mix_bytes(module, fragment, source):
+    frame_size = source.width * source.channels
+    return module.add(*_halves(memoryview(fragment), frame_size), source.width)
+
+
+def _mix_array(samples, source):
+    return npaudioop.add(*_halves(samples, source.channels), source.width)
+
+
+def _upmix(samples, source):
+    return npaudioop.mix(samples, source.width, npaudioop.mixing_matrix(1, 2))
+
+
+OPERATIONS = {
+    "read": {
+        "native": lambda source, context: _array_case(
+            source, lambda _: read_wav_file(source.path)
+        ),
+        "wave": _read_wave,
+        "mmap": _read_mmap,
+    },
+    "write": {
+        "native": _write_native,
+        "wave": _write_wave,
+    },
+    "gain": {
+        **_kernel(
+            lambda module, fragment, source: module.mul(fragment, source.width, 0.5),
+            lambda samples, source: npaudioop.mul(samples, source.width, 0.5),
+        ),
+        "native": _gain_native,
+    },
+    "downmix": {
+        **_kernel(
+            lambda module, fragment, source: module.tomono(
+                fragment, source.width, 0.5, 0.5
+            ),
+            _downmix,
+            accepts=lambda source: source.channels == 2,
+        ),
+        # other layouts only have the matrix mix
+        "numpy": lambda source, context: (
+            _array_case(source, lambda samples: _downmix(samples, source))
+            if source.channels > 1
+            else None
+        ),
+    },
+    # two signals summed, saturated like `audioop.add`
+    "mix": _kernel(_mix_bytes, _mix_array),
+    # mono to stereo, `tostereo` or the matrix product of `set_channels`
+    "upmix": _kernel(
+        lambda module, fragment, source: module.tostereo(
+            fragment, source.width, 1.0, 1.0
+        ),
+        _upmix,
+        accepts=lambda source: source.channels == 1,
+    ),
+    "width": _kernel(
+        lambda module, fragment, source: module.lin2lin(
+            fragment, source.width, _new_width(source.width)
+        ),
+        lambda samples, source: npaudioop.lin2lin(
+            samples, source.width, _new_width(source.width)
+        ),
+    ),
+    "rate": _kernel(
+        lambda module, fragment, source: module.ratecv(
+            fragment,
+            source.width,
+            source.channels,
+            source.frame_rate,
+            _new_rate(source.frame_rate),
+            None,
+        ),
+        # linear interpolation, like `ratecv`
+        lambda samples, source: resample(
+            samples,
+            source.width,
+            source.channels,
+            source.frame_rate,
+            _new_rate(source.frame_rate),
+            quality="linear",
+        ),
+    ),
+    "resample_sinc": {
+        "numpy": lambda source, context: _array_case(
+            source,
+            lambda samples: resample(
+                samples,
+                source.width,
+                source.channels,
+                source.frame_rate,
+                _new_rate(source.frame_rate),
+            ),
+        ),
+    },
+    "rms": _kernel(
+        lambda module, fragment, source: module.rms(fragment, source.width),
+        lambda samples, source: npaudioop.rms(samples, source.width),
+    ),
+    "peak": _kernel(
+        lambda module, fragment, source: module.max(fragment, source.width),
+        lambda samples, source: npaudioop.max(samples, source.width),
+    ),
+    "cross": _kernel(
+        lambda module, fragment, source: module.cross(fragment, source.width),
+        lambda samples, source: npaudioop.cross(samples, source.width),
+    ),
+    "envelope": {
+        "numpy": lambda source, context: _array_case(
+            source,
+            lambda samples: windowed_envelope(
+                samples, source.width, source.channels, 1024, 512
+            ),
+        ),
+    },
+    "ulaw": _kernel(
+        lambda module, fragment, source: module.lin2ulaw(fragment, source.width),
+        lambda samples, source: npaudioop.lin2ulaw(samples, source.width),
+    ),
+    # the "numpy" ADPCM codec runs in `_lowlevel`
+    "adpcm": _kernel(
+        lambda module, fragment, source: module.lin2adpcm(fragment, source.width, None),
+        lambda samples, source: npaudioop.lin2adpcm(samples, source.width),
+    ),
+}
+
+
+def _best_time(fn, repeat, min_time):
+    # seconds per call: calls are batched until a batch lasts `min_time`,
+    # the best of `repeat` batches counts
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def _peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def fixture_sources(sounds_dir):
+    """A `Source` for every WAV file of `sounds_dir`."""
+    for name in sorted(os.listdir(sounds_dir)):
+        if not name.endswith(".wav"):
+            continue
+        path = os.path.join(sounds_dir, name)
+        metadata = read_wav_file_metadata(path)
+        yield Source(
+            name="sounds/" + name,
+            samples=read_wav_file(path),
+            width=metadata.bits_per_sample // 8,
+            channels=metadata.channels,
+            frame_rate=metadata.sample_rate,
+            path=path,
+        )
+
+
+def synthetic_sources(tmp_dir, seconds, widths=WIDTHS, channels=CHANNELS):
+    """A synthetic `Source` for every width and channel count."""
+    path = os.path.join(tmp_dir, "synthetic.wav")
+    for width in widths:
+        for n_channels in channels:
+            samples = synthetic_samples(width, n_channels, FRAME_RATE, seconds)
+            spec = WavFileMeta(8 * width, n_channels, FRAME_RATE, True)
+            write_wav_file(path, spec, samples)
+            yield Source(
+                name="synthetic/{}s".format(seconds),
+                samples=samples,
+                width=width,
+                channels=n_channels,
+                frame_rate=FRAME_RATE,
+                path=path,
+            )
+
+
+def run_benchmarks(
+    sources,
+    tmp_dir,
+    operations=None,
+    backends=None,
+    repeat=3,
+    min_time=0.2,
+    slow_samples=1 << 16,
+    log=None,
+):
+    """
+    Measure every (operation, backend) on every source, returns a list of
+    result dicts. `operations` and `backends` restrict the names run.
+    """
+    context = _Context(slow_samples, tmp_dir)
+    results = []
+    for source in sources:
+        for op, factories in OPERATIONS.items():
+            if operations is not None and op not in operations:
+                continue
+            for backend, factory in factories.items():
+                if backends is not None and backend not in backends:
+                    continue
+                case = factory(source, context)
+                if case is None:
+                    continue
+                seconds = _best_time(case.fn, repeat, min_time)
+                result = {
+                    "op": op,
+                    "backend": backend,
+                    "source": source.name,
+                    "width": source.width,
+                    "channels": source.channels,
+                    "frame_rate": source.frame_rate,
+                    "samples": case.n_samples,
+                    "seconds": seconds,
+                    "samples_per_sec": case.n_samples / seconds,
+                    "peak_bytes": _peak_memory(case.fn),
+                }
+                results.append(result)
+                if log is not None:
+                    log(_format(result))
+    return results
+
+
+def _key(result):
+    return (
+        result["op"],
+        result["backend"],
+        result["source"],
+        result["width"],
+        result["channels"],
+    )
+
+
+def _format(result):
+    return "{op:>13} {backend:>9} {source:>32} {width}B x{channels:<2}".format(
+        **result
+    ) + " {:>14,.0f} samples/s {:>12,} B".format(
+        result["samples_per_sec"], result["peak_bytes"]
+    )
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    `(result, ratio)` for every case of `results` also in `baseline`, the
+    ratio being new over old throughput, and whether any of them dropped
+    below `1 - tolerance`.
+    """
+    old = {_key(result): result for result in baseline}
+    ratios = [
+        (result, result["samples_per_sec"] / old[_key(result)]["samples_per_sec"])
+        for result in results
+        if _key(result) in old
+    ]
+    regressed = any(ratio < 1 - tolerance for _, ratio in ratios)
+    return ratios, regressed
+
+
+def _metadata():
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "audioop": audioop is not None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m audio_exp.bench", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--widths", type=int, nargs="+", default=WIDTHS)
+    parser.add_argument("--channels", type=int, nargs="+", default=CHANNELS)
+    parser.add_argument("--ops", nargs="+", choices=sorted(OPERATIONS))
+    parser.add_argument("--backends", nargs="+")
+    parser.add_argument("--sounds", help="directory of WAV files to measure too")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--slow-samples", type=int, default=1 << 16)
+    args = parser.parse_args(argv)
+
+    def log(line):
+        print(line, file=sys.stderr, flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sources = []
+        if args.sounds is not None:
+            if os.path.isdir(args.sounds):
+                sources.append(fixture_sources(args.sounds))
+            else:
+                log("no directory {}, synthetic sources only".format(args.sounds))
+        if args.seconds > 0:
+            sources.append(
+                synthetic_sources(tmp_dir, args.seconds, args.widths, args.channels)
+            )
+        results = run_benchmarks(
+            (source for group in sources for source in group),
+            tmp_dir,
+            operations=args.ops,
+            backends=args.backends,
+            repeat=args.repeat,
+            min_time=args.min_time,
+            slow_samples=args.slow_samples,
+            log=log,
+        )
+
+    report = {"metadata": _metadata(), "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        ratios, regressed = compare(results, baseline, args.tolerance)
+        for result, ratio in ratios:
+            flag = "  REGRESSION" if ratio < 1 - args.tolerance else ""
+            log("{} {:6.2f}x{}".format(_format(result), ratio, flag))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Reusable scratch arrays for chunked pipelines.
+
+Every `AudioSegment` op allocates its result. When a stream is processed
+chunk by chunk, that means new arrays of the same few sizes for every
+chunk. A `BufferPool` keeps the arrays released by a pipeline and hands
+them out again, and the sample-level ops write into them through their
+`out=` parameter. A loop over a whole file then allocates a constant
+number of arrays.
+
+Buffers are grouped by size, rounded up to a power of two bytes, so
+chunks of slightly different lengths (the last one of a file...) share
+them. The released buffers kept by the pool are capped at `max_bytes`,
+the least recently released ones are freed first.
+
+    pool = BufferPool()
+    for chunk in AudioSegment.iter_chunks(path, 1000, reuse_buffer=True):
+        out = pool.acquire(chunk._data.shape, np.float32)
+        model.feed(chunk.to_float(out=out)._data)
+        pool.release(out)
+"""
+
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+# smallest bucket, tiny arrays are not worth a lookup
+_MIN_BYTES = 1 << 12
+
+
+def _bucket(nbytes):
+    return max(_MIN_BYTES, 1 << (int(nbytes) - 1).bit_length())
+
+
+class BufferPool:
+    def __init__(self, max_bytes=64 << 20):
+        """
+        Args:
+            max_bytes (int): Cap on the bytes of the released buffers kept
+                for reuse. Leased buffers don't count.
+        """
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # released buffers, least recently released first
+        self._free = OrderedDict()
+        # the same buffers by size
+        self._buckets = {}
+        self._leased = {}
+        self._free_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._trimmed = 0
+
+    def acquire(self, shape, dtype):
+        """
+        An uninitialized array of `shape` and `dtype`, on a buffer of the
+        pool when one of its size was released, otherwise on a new one.
+        Give it back with `release` once it isn't used anymore.
+        """
+        dtype = np.dtype(dtype)
+        shape = (shape,) if np.isscalar(shape) else tuple(shape)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        size = _bucket(nbytes)
+        with self._lock:
+            bucket = self._buckets.get(size)
+            if bucket:
+                key, raw = bucket.popitem()
+                del self._free[key]
+                self._free_bytes -= raw.nbytes
+                self._hits += 1
+            else:
+                raw = np.empty(size, dtype=np.uint8)
+                self._misses += 1
+            self._leased[id(raw)] = raw
+        return raw[:nbytes].view(dtype).reshape(shape)
+
+    def release(self, array):
+        """
+        Gives back an array returned by `acquire`, or any view of it. Its
+        buffer can be handed out again, so neither the array nor segments
+        wrapping it may be used afterwards.
+        """
+        raw = array
+        while isinstance(raw.base, np.ndarray):
+            raw = raw.base
+        with self._lock:
+            if self._leased.pop(id(raw), None) is not raw:
+                raise ValueError("array was not acquired from this pool")
+            self._free[id(raw)] = raw
+            self._buckets.setdefault(raw.nbytes, OrderedDict())[id(raw)] = raw
+            self._free_bytes += raw.nbytes
+            self._trim()
+
+    def _trim(self):
+        while self._free_bytes > self.max_bytes:
+            key, raw = self._free.popitem(last=False)
+            del self._buckets[raw.nbytes][key]
+            self._free_bytes -= raw.nbytes
+            self._trimmed += 1
+
+    def clear(self):
+        """Frees every released buffer."""
+        with self._lock:
+            self._free.clear()
+            self._buckets.clear()
+            self._free_bytes = 0
+
+    def stats(self):
+        """
+        `hits` and `misses` of `acquire`, buffers `trimmed` because of
+        `max_bytes`, and the bytes of the `free` and `leased` buffers.
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "trimmed": self._trimmed,
+                "free_bytes": self._free_bytes,
+                "leased_bytes": sum(raw.nbytes for raw in self._leased.values()),
+            }
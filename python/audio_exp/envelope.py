@@ -0,0 +1,106 @@
+"""
+Windowed analysis (RMS, peak, dBFS, zero-crossing rate) of sample arrays.
+
+Windows of `window` frames start every `hop` frames, only whole windows are
+analysed. With g = gcd(window, hop) every window is made of whole blocks of
+g frames, so the samples are reduced to per-block sums and maxima first.
+Window sums are then differences of a cumulative sum of the blocks and
+window maxima come from prefix/suffix maxima over runs of blocks (van Herk /
+Gil-Werman). Both are O(N) however much the windows overlap.
+
+Samples follow the `npaudioop` conventions, each channel is analysed
+separately and the results are (windows, channels) arrays.
+"""
+
+from math import gcd
+from typing import NamedTuple
+
+import numpy as np
+
+from audio_exp import npaudioop
+
+
+class Envelope(NamedTuple):
+    """Per-window features, window i starts at frame i * hop."""
+
+    rms: np.ndarray
+    peak: np.ndarray
+    # RMS relative to full scale, -inf for digital silence
+    dbfs: np.ndarray
+    # fraction of consecutive sample pairs that change sign
+    zcr: np.ndarray
+
+
+def window_count(n_frames, window, hop):
+    if window < 1 or hop < 1:
+        raise ValueError("window and hop must be at least one frame")
+    return 0 if n_frames < window else 1 + (n_frames - window) // hop
+
+
+def _blocks(values, window, hop, count):
+    # (blocks, block length, channels) view covering every window
+    g = gcd(window, hop)
+    n_blocks = (count - 1) * hop // g + window // g
+    return values[: n_blocks * g].reshape(n_blocks, g, values.shape[1]), g
+
+
+def _window_sums(values, window, hop, count):
+    blocks, g = _blocks(values, window, hop, count)
+    sums = np.zeros((len(blocks) + 1, values.shape[1]), dtype=values.dtype)
+    np.cumsum(blocks.sum(axis=1), axis=0, out=sums[1:])
+    starts = np.arange(count) * (hop // g)
+    return sums[starts + window // g] - sums[starts]
+
+
+def _window_max(values, window, hop, count):
+    blocks, g = _blocks(values, window, hop, count)
+    maxima = blocks.max(axis=1)
+    k = window // g
+    # runs of k blocks, padded with the lowest value so they fill whole runs
+    padding = np.full((-len(maxima) % k, values.shape[1]), maxima.min())
+    runs = np.concatenate([maxima, padding]).reshape(-1, k, values.shape[1])
+    prefix = np.maximum.accumulate(runs, axis=1).reshape(-1, values.shape[1])
+    suffix = np.maximum.accumulate(runs[:, ::-1], axis=1)[:, ::-1]
+    suffix = suffix.reshape(-1, values.shape[1])
+    # a window spans at most two runs: the end of the run it starts in and
+    # the beginning of the next one
+    starts = np.arange(count) * (hop // g)
+    return np.maximum(suffix[starts], prefix[starts + k - 1])
+
+
+def windowed_envelope(fragment, width, channels, window, hop=None):
+    """
+    Analyse `fragment` (1-d interleaved or 2-d (frames, channels)) in
+    windows of `window` frames every `hop` frames (`window` by default),
+    returns an `Envelope`.
+    """
+    hop = window if hop is None else hop
+    frames = fragment.reshape(-1, channels)
+    count = window_count(len(frames), window, hop)
+    if count == 0:
+        empty = np.zeros((0, channels))
+        return Envelope(empty, empty, empty, empty)
+
+    if frames.dtype.kind == "f":
+        values = frames.astype(np.float64)
+        full_scale = 1.0
+    else:
+        npaudioop._check_fragment(frames, width)
+        values = npaudioop._centred(frames, width, np.float64)
+        full_scale = float(1 << (8 * width - 1))
+
+    rms = np.sqrt(_window_sums(values * values, window, hop, count) / window)
+    peak = _window_max(np.abs(values), window, hop, count)
+    with np.errstate(divide="ignore"):
+        dbfs = 20 * np.log10(rms / full_scale)
+
+    # `changes[i]`: sign change between frames i - 1 and i, like `audioop.cross`
+    negative = values < 0
+    changes = np.zeros(values.shape, dtype=np.int64)
+    changes[1:] = negative[1:] != negative[:-1]
+    starts = np.arange(count) * hop
+    # the change at a window's first frame pairs it with the previous window
+    crossings = _window_sums(changes, window, hop, count) - changes[starts]
+    zcr = crossings / max(window - 1, 1)
+
+    return Envelope(rms=rms, peak=peak, dbfs=dbfs, zcr=zcr)
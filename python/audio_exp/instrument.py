@@ -0,0 +1,132 @@
+"""
+Counters and logging of the extension and the `AudioSegment` operations.
+
+The extension forwards its `log` records to the `audio_exp._lowlevel`
+Python loggers. Records below the level of that logger when the extension
+is imported are dropped on the Rust side without taking the GIL, call
+`sync_log_level()` after changing it.
+
+With `enable_stats()` (or `AUDIO_EXP_STATS=1` in the environment) every
+instrumented function counts its calls, the bytes it read from or wrote to
+files, the samples it produced and its wall time. `stats()` returns them
+keyed by function name: the extension functions under their own name
+(`read_wav_frames`, `WavStreamReader.read`...) and the Python ones under
+their qualified name (`AudioSegment.from_file`...). Calls nest, the time of
+`AudioSegment.from_file` includes the one of `read_wav_frames`.
+
+While disabled an instrumented function costs one flag check per call.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from audio_exp._lowlevel import reset_stats as _reset_lowlevel_stats
+from audio_exp._lowlevel import set_log_level as _set_lowlevel_log_level
+from audio_exp._lowlevel import set_stats_enabled as _set_lowlevel_stats_enabled
+from audio_exp._lowlevel import stats_snapshot as _lowlevel_stats
+
+FIELDS = ("calls", "bytes_read", "bytes_written", "samples", "seconds")
+
+_enabled = False
+_counters = {}
+_lock = threading.Lock()
+
+
+def enable_stats(enabled=True):
+    """Turns counting on (or off) in the extension and in Python."""
+    global _enabled
+    _set_lowlevel_stats_enabled(enabled)
+    _enabled = bool(enabled)
+
+
+def stats_enabled():
+    return _enabled
+
+
+def stats(reset=False):
+    """
+    Snapshot of the counters, `{name: {"calls", "bytes_read",
+    "bytes_written", "samples", "seconds"}}`, sorted by name. Only
+    functions called while counting was on are listed. With `reset=True`
+    the counters restart from zero.
+    """
+    with _lock:
+        snapshot = _lowlevel_stats()
+        snapshot.update((name, dict(c)) for name, c in _counters.items())
+        if reset:
+            _reset_lowlevel_stats()
+            _counters.clear()
+    return dict(sorted(snapshot.items()))
+
+
+def reset_stats():
+    with _lock:
+        _reset_lowlevel_stats()
+        _counters.clear()
+
+
+def sync_log_level():
+    """
+    Lets through the extension records that the `audio_exp._lowlevel`
+    logger would now emit.
+    """
+    level = logging.getLogger("audio_exp._lowlevel").getEffectiveLevel()
+    _set_lowlevel_log_level(level)
+
+
+def record(name, seconds, bytes_read=0, bytes_written=0, samples=0):
+    """Adds one call of `name` to its counters."""
+    with _lock:
+        c = _counters.get(name)
+        if c is None:
+            c = _counters[name] = dict.fromkeys(FIELDS, 0)
+            c["seconds"] = 0.0
+        c["calls"] += 1
+        c["bytes_read"] += bytes_read
+        c["bytes_written"] += bytes_written
+        c["samples"] += samples
+        c["seconds"] += seconds
+
+
+def result_samples(result, *args, **kwargs):
+    """
+    Samples in the result of a call: the size of an array, or of the
+    samples of a segment. A lazy segment only has its source samples, so
+    nothing is counted for it; the work is counted when its plan runs.
+    """
+    samples = getattr(result, "_samples", result)
+    plan = getattr(result, "_plan", None)
+    if plan is not None and plan.steps:
+        return {}
+    size = getattr(samples, "size", None)
+    return {} if size is None else {"samples": int(size)}
+
+
+def counted(name, io=result_samples):
+    """
+    Decorator counting the calls of a function under `name`. `io(result,
+    *args, **kwargs)` returns the `bytes_read`, `bytes_written` and
+    `samples` of a call as a dict.
+    """
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            record(name, seconds, **io(result, *args, **kwargs))
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+if os.environ.get("AUDIO_EXP_STATS", "") not in ("", "0"):
+    enable_stats()
@@ -0,0 +1,187 @@
+"""
+Deferred, fused execution of chains of AudioSegment transforms.
+
+A `TransformPlan` records gain changes, channel mixes, sample width
+conversions and resampling instead of applying them. Running the plan
+streams the source through every step in blocks of `BLOCK_FRAMES` frames:
+each block is converted to float64 once, goes through all the steps while
+it is still in cache (resamplers keep their state from one block to the
+next), and is quantized once into the preallocated output. The signal is
+read once and written once however long the chain is. Gains and downmixes
+are linear like resampling, so they are moved ahead of it and fewer
+channels go through the filter.
+
+Only the final result is rounded and clipped. A plan with a single step
+gives exactly the eager result. Longer plans skip the intermediate
+quantization, so they can differ from the eager chain by rounding, and
+they don't clip between steps.
+"""
+
+import copy
+
+from typing import NamedTuple
+
+import numpy as np
+
+from audio_exp import npaudioop
+from audio_exp.instrument import counted
+from audio_exp.resample import QUALITIES, Resampler
+
+BLOCK_FRAMES = 1 << 14
+
+
+class _Gain(NamedTuple):
+    factor: float
+
+
+class _Mix(NamedTuple):
+    # (input channels, output channels) weights
+    matrix: np.ndarray
+
+
+class _Scale(NamedTuple):
+    # sample width conversion, a power of two
+    factor: float
+
+
+class _Resample(NamedTuple):
+    inrate: int
+    outrate: int
+    quality: str
+
+
+class TransformPlan:
+    """
+    Immutable list of steps applied to samples of the given format, every
+    method returns a new plan with one more step.
+    """
+
+    def __init__(self, channels, sample_width, frame_rate):
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_rate = frame_rate
+        self.steps = ()
+        # format of the result
+        self.out_channels = channels
+        self.out_sample_width = sample_width
+        self.out_frame_rate = frame_rate
+        # rounding of the last step when applied eagerly: `npaudioop` floors,
+        # the resampler rounds to nearest
+        self._rounding = "floor"
+
+    def _add(self, step, rounding="floor", **out_format):
+        plan = copy.copy(self)
+        plan.steps = self.steps + (step,)
+        plan._rounding = rounding
+        for name, value in out_format.items():
+            setattr(plan, "out_" + name, value)
+        return plan
+
+    def gain(self, factor):
+        return self._add(_Gain(float(factor)))
+
+    def mix(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if matrix.shape[0] != self.out_channels:
+            raise ValueError(
+                "mix matrix expects {} channels, got {}".format(
+                    matrix.shape[0], self.out_channels
+                )
+            )
+        return self._add(_Mix(matrix), channels=matrix.shape[1])
+
+    def convert_width(self, sample_width):
+        npaudioop._check_size(sample_width)
+        factor = 2.0 ** (8 * (sample_width - self.out_sample_width))
+        return self._add(_Scale(factor), sample_width=sample_width)
+
+    def resample(self, frame_rate, quality):
+        if quality not in QUALITIES:
+            raise ValueError("unknown quality {!r}".format(quality))
+        step = _Resample(self.out_frame_rate, frame_rate, quality)
+        return self._add(step, rounding="rint", frame_rate=frame_rate)
+
+    def _ordered_steps(self):
+        steps = list(self.steps)
+        for i in range(1, len(steps)):
+            step = steps[i]
+            hoist = isinstance(step, _Gain) or (
+                isinstance(step, _Mix) and step.matrix.shape[1] < step.matrix.shape[0]
+            )
+            j = i
+            while hoist and j > 0 and isinstance(steps[j - 1], _Resample):
+                steps[j - 1], steps[j] = step, steps[j - 1]
+                j -= 1
+        return steps
+
+    @counted("TransformPlan.run")
+    def run(self, source):
+        """Apply every step to `source` (1-d interleaved), returns 1-d samples."""
+        frames = source.reshape(-1, self.channels)
+        is_float = source.dtype.kind == "f"
+        if is_float:
+            out_dtype = source.dtype
+        elif self.out_sample_width != self.sample_width:
+            out_dtype = npaudioop._DTYPES[self.out_sample_width]
+        else:
+            out_dtype = source.dtype
+        out_like = np.empty(0, dtype=out_dtype)
+
+        # steps between resamplers are elementwise, the resamplers cut the
+        # plan into stages
+        stages = [[]]
+        resamplers = []
+        channels = self.channels
+        n_frames = len(frames)
+        for step in self._ordered_steps():
+            if isinstance(step, _Resample):
+                resamplers.append(
+                    Resampler(step.inrate, step.outrate, channels, quality=step.quality)
+                )
+                stages.append([])
+                n_frames = -(-n_frames * step.outrate // step.inrate)
+            else:
+                if isinstance(step, _Mix):
+                    channels = step.matrix.shape[1]
+                elif isinstance(step, _Scale) and is_float:
+                    raise npaudioop.error("can't change the width of float samples")
+                stages[-1].append(step)
+
+        out = np.empty((n_frames, self.out_channels), dtype=out_dtype)
+        written = 0
+
+        def push(values, first_stage):
+            nonlocal written
+            if len(values) == 0:
+                return
+            for i in range(first_stage, len(stages)):
+                for step in stages[i]:
+                    if isinstance(step, _Mix):
+                        values = values @ step.matrix
+                    else:
+                        values *= step.factor
+                if i < len(resamplers):
+                    values = resamplers[i].process(values)
+            if is_float:
+                block = values.astype(out_dtype)
+            else:
+                if self._rounding == "rint":
+                    np.rint(values, out=values)
+                block = npaudioop._saturate(
+                    values, self.out_sample_width, out_like, floor=True
+                )
+            out[written : written + len(block)] = block
+            written += len(block)
+
+        for start in range(0, len(frames), BLOCK_FRAMES):
+            block = frames[start : start + BLOCK_FRAMES]
+            if is_float:
+                values = block.astype(np.float64)
+            else:
+                values = npaudioop._centred(block, self.sample_width, np.float64)
+            push(values, 0)
+        # the tail of each resampler still goes through the stages after it
+        for i, resampler in enumerate(resamplers):
+            push(resampler.flush(), i + 1)
+
+        return out.reshape(-1)
@@ -10,6 +10,10 @@ except ImportError:  # Python 3.9+
     from math import gcd
 from ctypes import create_string_buffer
 
+import numpy as np
+
+from audio_exp import npaudioop
+
 
 class error(Exception):
     pass
@@ -27,7 +31,7 @@ def _check_params(length, size):
 
 
 def _sample_count(cp, size):
-    return len(cp) / size
+    return len(cp) // size
 
 
 def _get_samples(cp, size, signed=True):
@@ -134,7 +138,7 @@ def avg(cp, size):
     sample_count = _sample_count(cp, size)
     if sample_count == 0:
         return 0
-    return sum(_get_samples(cp, size)) / sample_count
+    return sum(_get_samples(cp, size)) // sample_count
 
 
 def rms(cp, size):
@@ -276,7 +280,7 @@ def avgpp(cp, size):
     if nextreme == 0:
         return 0
 
-    return avg / nextreme
+    return avg // nextreme
 
 
 def maxpp(cp, size):
@@ -331,7 +335,7 @@ def mul(cp, size, factor):
     result = create_string_buffer(len(cp))
 
     for i, sample in enumerate(_get_samples(cp, size)):
-        sample = clip(int(sample * factor))
+        sample = clip(math.floor(sample * factor))
         _put_sample(result, size, i, sample)
 
     return result.raw
@@ -343,16 +347,16 @@ def tomono(cp, size, fac1, fac2):
 
     sample_count = _sample_count(cp, size)
 
-    result = create_string_buffer(len(cp) / 2)
+    result = create_string_buffer(len(cp) // 2)
 
     for i in range(0, sample_count, 2):
         l_sample = getsample(cp, size, i)
         r_sample = getsample(cp, size, i + 1)
 
         sample = (l_sample * fac1) + (r_sample * fac2)
-        sample = clip(sample)
+        sample = clip(math.floor(sample))
 
-        _put_sample(result, size, i / 2, sample)
+        _put_sample(result, size, i // 2, sample)
 
     return result.raw
 
@@ -368,8 +372,8 @@ def tostereo(cp, size, fac1, fac2):
     for i in range(sample_count):
         sample = _get_sample(cp, size, i)
 
-        l_sample = clip(sample * fac1)
-        r_sample = clip(sample * fac2)
+        l_sample = clip(math.floor(sample * fac1))
+        r_sample = clip(math.floor(sample * fac2))
 
         _put_sample(result, size, i * 2, l_sample)
         _put_sample(result, size, i * 2 + 1, r_sample)
@@ -428,16 +432,16 @@ def lin2lin(cp, size, size2):
     if size == size2:
         return cp
 
-    new_len = (len(cp) / size) * size2
+    new_len = (len(cp) // size) * size2
 
     result = create_string_buffer(new_len)
 
     for i in range(_sample_count(cp, size)):
         sample = _get_sample(cp, size, i)
         if size < size2:
-            sample = sample << (4 * size2 / size)
+            sample = sample << (8 * (size2 - size))
         elif size > size2:
-            sample = sample >> (4 * size / size2)
+            sample = sample >> (8 * (size - size2))
 
         sample = _overflow(sample, size2)
 
@@ -452,9 +456,9 @@ def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
         raise error("# of channels should be >= 1")
 
     bytes_per_frame = size * nchannels
-    frame_count = len(cp) / bytes_per_frame
+    frame_count = len(cp) // bytes_per_frame
 
-    if bytes_per_frame / nchannels != size:
+    if bytes_per_frame // nchannels != size:
         raise OverflowError("width * nchannels too big for a C int")
 
     if weightA < 1 or weightB < 0:
@@ -467,8 +471,15 @@ def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
         raise error("sampling rate not > 0")
 
     d = gcd(inrate, outrate)
-    inrate /= d
-    outrate /= d
+    inrate //= d
+    outrate //= d
+    d = gcd(weightA, weightB)
+    weightA //= d
+    weightB //= d
+
+    # like `audioop`, samples are scaled to 32 bits and the filter and the
+    # interpolation are computed in doubles, truncated toward zero
+    shift = 32 - 8 * size
 
     prev_i = [0] * nchannels
     cur_i = [0] * nchannels
@@ -484,7 +495,7 @@ def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
         prev_i, cur_i = zip(*samps)
         prev_i, cur_i = list(prev_i), list(cur_i)
 
-    q = frame_count / inrate
+    q = frame_count // inrate
     ceiling = (q + 1) * outrate
     nbytes = ceiling * bytes_per_frame
 
@@ -496,20 +507,18 @@ def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
         while d < 0:
             if frame_count == 0:
                 samps = zip(prev_i, cur_i)
-                retval = result.raw
-
                 # slice off extra bytes
-                trim_index = (out_i * bytes_per_frame) - len(retval)
-                retval = memoryview(retval)[:trim_index]
+                retval = result.raw[: out_i * size]
 
                 return (retval, (d, tuple(samps)))
 
             for chan in range(nchannels):
                 prev_i[chan] = cur_i[chan]
-                cur_i[chan] = samples.next()
+                cur_i[chan] = next(samples) << shift
 
-                cur_i[chan] = (weightA * cur_i[chan] + weightB * prev_i[chan]) / (
-                    weightA + weightB
+                cur_i[chan] = int(
+                    (float(weightA) * cur_i[chan] + float(weightB) * prev_i[chan])
+                    / float(weightA + weightB)
                 )
 
             frame_count -= 1
@@ -517,31 +526,61 @@ def ratecv(cp, size, nchannels, inrate, outrate, state, weightA=1, weightB=0):
 
         while d >= 0:
             for chan in range(nchannels):
-                cur_o = (prev_i[chan] * d + cur_i[chan] * (outrate - d)) / outrate
-                _put_sample(result, size, out_i, _overflow(cur_o, size))
+                cur_o = int(
+                    (float(prev_i[chan]) * d + float(cur_i[chan]) * (outrate - d))
+                    / outrate
+                )
+                _put_sample(result, size, out_i, cur_o >> shift)
                 out_i += 1
             d -= inrate
 
 
+# the G.711 codecs are table driven in `npaudioop`, 8-bit fragments are
+# signed here like in `audioop`
+_SIGNED_DTYPES = {1: "i1", 2: "<i2", 4: "<i4"}
+
+
+def _g711_encode(encode, cp, size):
+    _check_params(len(cp), size)
+    return encode(np.frombuffer(cp, _SIGNED_DTYPES[size]), size).tobytes()
+
+
+def _g711_decode(decode, cp, size):
+    _check_size(size)
+    samples = decode(np.frombuffer(cp, "u1"), size)
+    if size == 1:
+        # offset binary to two's complement
+        samples = (samples ^ 0x80).view("i1")
+    return samples.tobytes()
+
+
 def lin2ulaw(cp, size):
-    raise NotImplementedError()
+    return _g711_encode(npaudioop.lin2ulaw, cp, size)
 
 
 def ulaw2lin(cp, size):
-    raise NotImplementedError()
+    return _g711_decode(npaudioop.ulaw2lin, cp, size)
 
 
 def lin2alaw(cp, size):
-    raise NotImplementedError()
+    return _g711_encode(npaudioop.lin2alaw, cp, size)
 
 
 def alaw2lin(cp, size):
-    raise NotImplementedError()
+    return _g711_decode(npaudioop.alaw2lin, cp, size)
 
 
 def lin2adpcm(cp, size, state):
-    raise NotImplementedError()
+    _check_params(len(cp), size)
+    codes, state = npaudioop.lin2adpcm(
+        np.frombuffer(cp, _SIGNED_DTYPES[size]), size, state
+    )
+    return codes.tobytes(), state
 
 
 def adpcm2lin(cp, size, state):
-    raise NotImplementedError()
+    _check_size(size)
+    samples, state = npaudioop.adpcm2lin(np.frombuffer(cp, "u1"), size, state)
+    if size == 1:
+        samples = (samples ^ 0x80).view("i1")
+    return samples.tobytes(), state
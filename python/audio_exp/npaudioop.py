@@ -1,9 +1,720 @@
-import numpy as np
+"""
+NumPy-vectorized counterparts of the `audioop` functions.
+
+Every function takes the samples as an ndarray together with the sample
+width in bytes, mirroring the `audioop` signatures, but never goes through
+`bytes` and never loops over samples in Python.
+
+Conventions:
+    - a 1-d array is a plain (possibly interleaved) sample stream, exactly
+      like an `audioop` fragment; a 2-d array is laid out as
+      (frames, channels)
+    - 24-bit samples live in an int32 container
+    - unsigned containers (8-bit WAV data is `uint8`) hold offset-binary
+      samples centred on 128; signed containers hold two's complement
+      samples. Results keep the container type of the input
+    - results are clipped (saturated) to the range of `width`, except for
+      `bias` which wraps around like `audioop.bias`
+    - float containers hold samples normalized to [-1, 1) (see `lin2float`).
+      `mul`, `add`, `bias`, `reverse`, `tomono`, `tostereo` and `mix`
+      accept them and keep them in float, neither floored nor clipped.
+      The analysis ops (`getsample`, `max`, `minmax`, `avg`, `rms`,
+      `cross` and the `find*` searches) accept them too and return
+      floats in the same normalized units. `lin2lin` and the encoders
+      quantize them to integer samples first, like `float2lin`
+    - `mul`, `mix`, `lin2lin`, `lin2float` and `float2lin` write their
+      result to `out` when it is given, an array of the exact shape and
+      dtype of the result. They then work block by block, so no other
+      array of the size of the result is allocated
+"""
 
+from builtins import max as builtin_max
+from builtins import min as builtin_min
+
+import numpy as np
 
-def mul(fragment, width, factor):
-    # check parameters
+from audio_exp._lowlevel import ima_adpcm_decode, ima_adpcm_encode
 
-    #
 
+class error(Exception):
     pass
+
+
+# canonical container for each sample width, same as `PCMEncoding.decode`
+_DTYPES = {
+    1: np.dtype("u1"),
+    2: np.dtype("<i2"),
+    3: np.dtype("<i4"),
+    4: np.dtype("<i4"),
+}
+
+
+def _check_size(size):
+    if size not in _DTYPES:
+        raise error("Size should be 1, 2, 3 or 4")
+
+
+def _check_fragment(fragment, size, allow_float=False):
+    _check_size(size)
+    if not isinstance(fragment, np.ndarray):
+        raise TypeError("expected an ndarray, got {}".format(type(fragment).__name__))
+    if allow_float and fragment.dtype.kind == "f":
+        return fragment
+    if fragment.dtype.kind not in "iu":
+        raise error("unsupported sample dtype {}".format(fragment.dtype))
+    if fragment.dtype.itemsize < _DTYPES[size].itemsize:
+        raise error(
+            "dtype {} is too narrow for {}-byte samples".format(fragment.dtype, size)
+        )
+    return fragment
+
+
+def _bounds(size):
+    # signed bounds of a `size` byte sample
+    half = 1 << (8 * size - 1)
+    return -half, half - 1
+
+
+def _offset(fragment, size):
+    # offset-binary containers (uint8) are centred on the middle of the range
+    return 1 << (8 * size - 1) if fragment.dtype.kind == "u" else 0
+
+
+def _centred(fragment, size, dtype):
+    # samples as signed values, converted to the working `dtype`
+    values = fragment.astype(dtype)
+    offset = _offset(fragment, size)
+    if offset:
+        values -= offset
+    return values
+
+
+def _saturate(values, size, like, floor=False, out=None):
+    # clip signed working values back into the container type of `like`,
+    # written to `out` when given
+    if out is None:
+        out = np.empty(values.shape, dtype=like.dtype)
+    if like.dtype.kind == "f":
+        np.copyto(out, values, casting="same_kind")
+        return out
+    if floor:
+        np.floor(values, out=values)
+    lo, hi = _bounds(size)
+    offset = _offset(like, size)
+    if offset:
+        values += offset
+    return np.clip(values, lo + offset, hi + offset, out=out, casting="unsafe")
+
+
+# ops writing to `out` convert this many samples at a time to their
+# working type, bounding the temporaries whatever the size of the result
+_BLOCK_SAMPLES = 1 << 14
+
+
+def _output(out, shape, dtype):
+    # `out` checked against the result, or a new array
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if not isinstance(out, np.ndarray):
+        raise TypeError("expected an ndarray, got {}".format(type(out).__name__))
+    if out.shape != tuple(shape) or out.dtype != dtype:
+        raise error(
+            "out should be a {} array of shape {}, got {} {}".format(
+                np.dtype(dtype), tuple(shape), out.dtype, out.shape
+            )
+        )
+    return out
+
+
+def _blocks(array):
+    # slices along the first axis of about `_BLOCK_SAMPLES` samples each
+    row = builtin_max(1, array[:1].size)
+    step = builtin_max(1, _BLOCK_SAMPLES // row)
+    for start in range(0, len(array), step):
+        yield slice(start, start + step)
+
+
+def _int_dtype(size):
+    # wide enough to hold the sum of two samples without overflow
+    return np.int32 if size <= 2 else np.int64
+
+
+def _stereo(fragment):
+    if fragment.ndim == 1:
+        if len(fragment) % 2:
+            raise error("not a whole number of frames")
+        return fragment.reshape(-1, 2)
+    if fragment.ndim != 2 or fragment.shape[1] != 2:
+        raise error("expected a stereo fragment")
+    return fragment
+
+
+def _scalar(fragment):
+    # Python number type of the results of the analysis ops
+    return float if fragment.dtype.kind == "f" else int
+
+
+def getsample(fragment, width, index):
+    _check_fragment(fragment, width, allow_float=True)
+    samples = fragment.reshape(-1)
+    if not (0 <= index < len(samples)):
+        raise error("Index out of range")
+    return _scalar(fragment)(samples[index]) - _offset(fragment, width)
+
+
+def max(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    scalar = _scalar(fragment)
+    if fragment.size == 0:
+        return scalar(0)
+    offset = _offset(fragment, width)
+    return builtin_max(
+        abs(scalar(fragment.min()) - offset), abs(scalar(fragment.max()) - offset)
+    )
+
+
+def minmax(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    scalar = _scalar(fragment)
+    if fragment.size == 0:
+        return scalar(0), scalar(0)
+    offset = _offset(fragment, width)
+    return scalar(fragment.min()) - offset, scalar(fragment.max()) - offset
+
+
+def avg(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    count = fragment.size
+    if fragment.dtype.kind == "f":
+        return float(fragment.mean(dtype=np.float64)) if count else 0.0
+    if count == 0:
+        return 0
+    total = int(fragment.sum(dtype=np.int64)) - _offset(fragment, width) * count
+    return total // count
+
+
+def rms(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    scalar = _scalar(fragment)
+    count = fragment.size
+    if count == 0:
+        return scalar(0)
+    values = _centred(fragment.reshape(-1), width, np.float64)
+    return scalar(np.sqrt(np.dot(values, values) / count))
+
+
+def cross(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    samples = fragment.reshape(-1)
+    if len(samples) < 2:
+        return 0
+    negative = samples < _offset(fragment, width)
+    return int(np.count_nonzero(negative[1:] != negative[:-1]))
+
+
+def mul(fragment, width, factor, out=None):
+    _check_fragment(fragment, width, allow_float=True)
+    out = _output(out, fragment.shape, fragment.dtype)
+    for block in _blocks(fragment):
+        values = _centred(fragment[block], width, np.float64)
+        values *= factor
+        _saturate(values, width, fragment, floor=True, out=out[block])
+    return out
+
+
+def add(fragment1, fragment2, width):
+    _check_fragment(fragment1, width, allow_float=True)
+    _check_fragment(fragment2, width, allow_float=True)
+    if fragment1.shape != fragment2.shape:
+        raise error("Lengths should be the same")
+
+    dtype = np.float64 if fragment1.dtype.kind == "f" else _int_dtype(width)
+    values = _centred(fragment1, width, dtype)
+    values += _centred(fragment2, width, dtype)
+    return _saturate(values, width, fragment1)
+
+
+def bias(fragment, width, bias):
+    _check_fragment(fragment, width, allow_float=True)
+    if fragment.dtype.kind == "f":
+        # an additive offset in normalized units, nothing to wrap around
+        return np.add(fragment, bias, dtype=fragment.dtype)
+    # wraps around on overflow, like `audioop.bias`
+    lo = 0 if _offset(fragment, width) else _bounds(width)[0]
+    values = fragment.astype(np.int64)
+    values += bias - lo
+    values %= 1 << (8 * width)
+    values += lo
+    return values.astype(fragment.dtype)
+
+
+def reverse(fragment, width):
+    _check_fragment(fragment, width, allow_float=True)
+    # along axis 0: samples for a 1-d stream, whole frames for a 2-d array
+    return np.ascontiguousarray(fragment[::-1])
+
+
+def tomono(fragment, width, lfactor, rfactor):
+    _check_fragment(fragment, width, allow_float=True)
+    frames = _stereo(fragment)
+    values = _centred(frames[:, 0], width, np.float64)
+    values *= lfactor
+    right = _centred(frames[:, 1], width, np.float64)
+    right *= rfactor
+    values += right
+    return _saturate(values, width, fragment, floor=True)
+
+
+def tostereo(fragment, width, lfactor, rfactor):
+    _check_fragment(fragment, width, allow_float=True)
+    if fragment.ndim == 2 and fragment.shape[1] != 1:
+        raise error("expected a mono fragment")
+    mono = _centred(fragment.reshape(-1), width, np.float64)
+
+    values = np.empty((len(mono), 2), dtype=mono.dtype)
+    np.multiply(mono, lfactor, out=values[:, 0])
+    np.multiply(mono, rfactor, out=values[:, 1])
+    converted = _saturate(values, width, fragment, floor=True)
+    return converted if fragment.ndim == 2 else converted.reshape(-1)
+
+
+# -3 dB, the weight of a centre or surround channel in a stereo downmix
+_HALF_POWER = 0.5**0.5
+
+# (left, right) weights of every channel of the standard WAV layouts
+# (WAVE_FORMAT_EXTENSIBLE channel order) in a stereo downmix, ITU-R BS.775
+# coefficients, the LFE channel is dropped
+_STEREO_DOWNMIX = {
+    # FL FR FC
+    3: [(1, 0), (0, 1), (_HALF_POWER, _HALF_POWER)],
+    # FL FR BL BR
+    4: [(1, 0), (0, 1), (_HALF_POWER, 0), (0, _HALF_POWER)],
+    # FL FR FC BL BR
+    5: [(1, 0), (0, 1), (_HALF_POWER, _HALF_POWER), (_HALF_POWER, 0), (0, _HALF_POWER)],
+    # 5.1: FL FR FC LFE BL BR
+    6: [
+        (1, 0),
+        (0, 1),
+        (_HALF_POWER, _HALF_POWER),
+        (0, 0),
+        (_HALF_POWER, 0),
+        (0, _HALF_POWER),
+    ],
+    # 7.1: FL FR FC LFE BL BR SL SR
+    8: [
+        (1, 0),
+        (0, 1),
+        (_HALF_POWER, _HALF_POWER),
+        (0, 0),
+        (_HALF_POWER, 0),
+        (0, _HALF_POWER),
+        (_HALF_POWER, 0),
+        (0, _HALF_POWER),
+    ],
+}
+
+
+def mixing_matrix(in_channels, out_channels):
+    """
+    Default (in_channels, out_channels) matrix of `mix`: mono is copied to
+    every channel, the standard layouts are downmixed to stereo with the
+    ITU coefficients and mono is the average of the stereo downmix (of the
+    channels, for other layouts).
+    """
+    if in_channels < 1 or out_channels < 1:
+        raise error("channels must be positive")
+    if in_channels == out_channels:
+        return np.eye(in_channels)
+    if in_channels == 1:
+        return np.ones((1, out_channels))
+    if out_channels == 2 and in_channels in _STEREO_DOWNMIX:
+        return np.array(_STEREO_DOWNMIX[in_channels], dtype=np.float64)
+    if out_channels == 1:
+        if in_channels in _STEREO_DOWNMIX:
+            return mixing_matrix(in_channels, 2) @ np.full((2, 1), 0.5)
+        return np.full((in_channels, 1), 1 / in_channels)
+    raise error(
+        "no default mix from {} to {} channels, pass a matrix".format(
+            in_channels, out_channels
+        )
+    )
+
+
+def mix(fragment, width, matrix, out=None):
+    """
+    Output channel j of every frame is `sum_i frame[i] * matrix[i, j]`, a
+    generalized `tomono`/`tostereo` for any (in_channels, out_channels)
+    matrix. A 1-d fragment is interleaved with `len(matrix)` channels, and
+    so is the result.
+    """
+    _check_fragment(fragment, width, allow_float=True)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if matrix.ndim != 2:
+        raise error("the mixing matrix should be 2-d")
+    frames = fragment
+    if fragment.ndim == 1:
+        if len(fragment) % matrix.shape[0]:
+            raise error("not a whole number of frames")
+        frames = fragment.reshape(-1, matrix.shape[0])
+    if frames.ndim != 2 or frames.shape[1] != matrix.shape[0]:
+        raise error("expected a fragment with {} channels".format(matrix.shape[0]))
+
+    shape = (len(frames), matrix.shape[1])
+    if fragment.ndim == 1:
+        shape = (shape[0] * shape[1],)
+    out = _output(out, shape, fragment.dtype)
+    out_frames = out.reshape(len(frames), matrix.shape[1])
+    if not np.may_share_memory(out_frames, out):
+        raise error("a 1-d out should be contiguous")
+
+    scratch = np.empty((builtin_min(len(frames), _BLOCK_SAMPLES), matrix.shape[1]))
+    for block in _blocks(frames):
+        values = _centred(frames[block], width, np.float64)
+        mixed = np.matmul(values, matrix, out=scratch[: len(values)])
+        _saturate(mixed, width, fragment, floor=True, out=out_frames[block])
+    return out
+
+
+def lin2lin(fragment, width, newwidth, out=None):
+    _check_fragment(fragment, width, allow_float=True)
+    _check_size(newwidth)
+    if fragment.dtype.kind == "f":
+        # float samples have no width to convert from
+        return float2lin(fragment, newwidth, out=out)
+    if width == newwidth:
+        if out is None:
+            return fragment
+        np.copyto(_output(out, fragment.shape, fragment.dtype), fragment)
+        return out
+
+    out = _output(out, fragment.shape, _DTYPES[newwidth])
+    # every width fits in int32 once centred, so shifting cannot overflow;
+    # the ufuncs cast their operands in small buffers, not whole copies
+    ufunc = dict(dtype=np.int32, casting="unsafe")
+    offset = _offset(fragment, width)
+    if newwidth > width:
+        if offset:
+            fragment = np.subtract(fragment, offset, out=out, **ufunc)
+        np.left_shift(fragment, 8 * (newwidth - width), out=out, **ufunc)
+    else:
+        np.right_shift(fragment, 8 * (width - newwidth), out=out, **ufunc)
+        if out.dtype.kind == "u":
+            # two's complement to offset binary: flipping the sign bit adds
+            # half the range modulo the range
+            out ^= 1 << (8 * newwidth - 1)
+    return out
+
+
+# G.711 codecs, bit exact with `audioop`. Decoding is a lookup in a
+# 256-entry table, encoding a lookup of the 14-bit (u-law) or 13-bit
+# (A-law) truncated sample in a table covering every such value.
+
+
+def _search(values, ends):
+    # segment of every value: index of the first segment end not below it
+    return np.searchsorted(np.asarray(ends), values, side="left")
+
+
+def _ulaw_encode_table():
+    pcm = np.arange(-(1 << 13), 1 << 13)
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + (0x84 >> 2)
+    seg = _search(magnitude, [0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | ((magnitude >> (seg + 1)) & 0xF))
+    return ((code ^ mask) & 0xFF).astype(np.uint8)
+
+
+def _ulaw_decode_table():
+    code = ~np.arange(256) & 0xFF
+    t = (((code & 0xF) << 3) + 0x84) << ((code & 0x70) >> 4)
+    return np.where(code & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+
+def _alaw_encode_table():
+    pcm = np.arange(-(1 << 12), 1 << 12)
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    magnitude = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = _search(magnitude, [0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+    quant = np.where(seg < 2, magnitude >> 1, magnitude >> np.maximum(seg, 1)) & 0xF
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | quant)
+    return ((code ^ mask) & 0xFF).astype(np.uint8)
+
+
+def _alaw_decode_table():
+    code = np.arange(256) ^ 0x55
+    seg = (code & 0x70) >> 4
+    t = ((code & 0xF) << 4) + np.where(seg == 0, 8, 0x108)
+    t <<= np.maximum(seg - 1, 0)
+    return np.where(code & 0x80, t, -t).astype(np.int16)
+
+
+_ULAW_ENCODE = _ulaw_encode_table()
+_ULAW_DECODE = _ulaw_decode_table()
+_ALAW_ENCODE = _alaw_encode_table()
+_ALAW_DECODE = _alaw_decode_table()
+
+
+def _truncate(fragment, width, bits):
+    # the top `bits` bits of every sample, as indices into an encode table
+    _check_fragment(fragment, width, allow_float=True)
+    if fragment.dtype.kind == "f":
+        # encoded from their 16-bit rounding
+        fragment, width = float2lin(fragment, 2), 2
+    values = _centred(fragment, width, np.int32)
+    shift = 8 * width - bits
+    if shift > 0:
+        values >>= shift
+    else:
+        values <<= -shift
+    values += 1 << (bits - 1)
+    return values
+
+
+def _expand(codes, table, width):
+    if not isinstance(codes, np.ndarray) or codes.dtype != np.uint8:
+        raise error("expected uint8 codes")
+    return lin2lin(table[codes], 2, width)
+
+
+def lin2ulaw(fragment, width):
+    """G.711 u-law codes (uint8, same shape) of `fragment`."""
+    return _ULAW_ENCODE[_truncate(fragment, width, 14)]
+
+
+def ulaw2lin(fragment, width):
+    """u-law codes (uint8) to samples of `width` bytes."""
+    return _expand(fragment, _ULAW_DECODE, width)
+
+
+def lin2alaw(fragment, width):
+    """G.711 A-law codes (uint8, same shape) of `fragment`."""
+    return _ALAW_ENCODE[_truncate(fragment, width, 13)]
+
+
+def alaw2lin(fragment, width):
+    """A-law codes (uint8) to samples of `width` bytes."""
+    return _expand(fragment, _ALAW_DECODE, width)
+
+
+# IMA ADPCM predicts every sample from the previous one, so it can't be
+# vectorized: the codec loop is native and releases the GIL. `state` is
+# the `(valpred, index)` pair returned by the previous call on the same
+# stream, `None` to start one, exactly like `audioop`.
+
+
+def lin2adpcm(fragment, width, state=None):
+    """
+    IMA ADPCM codes of `fragment` (any shape, read as one stream), two per
+    byte, and the state to carry into the next call.
+    """
+    samples = lin2lin(fragment, width, 2).reshape(-1)
+    samples = np.ascontiguousarray(samples, dtype=np.int16)
+    return ima_adpcm_encode(samples, state)
+
+
+def adpcm2lin(codes, width, state=None):
+    """Samples of `width` bytes of IMA ADPCM codes (uint8), and the new state."""
+    if not isinstance(codes, np.ndarray) or codes.dtype != np.uint8:
+        raise error("expected uint8 codes")
+    _check_size(width)
+    samples, state = ima_adpcm_decode(np.ascontiguousarray(codes.reshape(-1)), state)
+    return lin2lin(samples, 2, width), state
+
+
+def lin2float(fragment, width, dtype=np.float32, out=None):
+    """
+    Samples of `width` bytes as floats normalized to [-1, 1), full scale
+    being 1 << (8 * width - 1). Exact up to 24-bit in float32.
+    """
+    _check_fragment(fragment, width)
+    out = _output(out, fragment.shape, np.dtype(dtype))
+    scale = 1.0 / (1 << (8 * width - 1))
+    offset = _offset(fragment, width)
+    if offset:
+        # small integers, exact in any float
+        fragment = np.subtract(fragment, offset, out=out, dtype=np.float64)
+    np.multiply(fragment, scale, out=out, dtype=np.float64, casting="same_kind")
+    return out
+
+
+def float2lin(fragment, width, dither=False, rng=None, out=None):
+    """
+    Floats normalized to [-1, 1) back to samples of `width` bytes in their
+    canonical container, rounded to nearest and clipped. With `dither`,
+    triangular (TPDF) noise of +-1 LSB is added before rounding so the
+    quantization error is uncorrelated with the signal. `rng` is the
+    `numpy.random.Generator` of the noise.
+    """
+    _check_size(width)
+    if fragment.dtype.kind != "f":
+        raise error("expected float samples, got {}".format(fragment.dtype))
+    out = _output(out, fragment.shape, _DTYPES[width])
+    if dither:
+        rng = np.random.default_rng() if rng is None else rng
+    for block in _blocks(fragment):
+        values = fragment[block].astype(np.float64)
+        values *= 1 << (8 * width - 1)
+        if dither:
+            values += rng.random(values.shape)
+            values -= rng.random(values.shape)
+        np.rint(values, out=values)
+        _saturate(values, width, out, out=out[block])
+    return out
+
+
+# `findfit` and friends cross-correlate by overlap-save: the FFT length is
+# at least this many times the reference length
+_FFT_FACTOR = 4
+_MIN_FFT = 1 << 12
+# input frames converted and transformed at once, bounds the temporaries
+_BATCH_FRAMES = 1 << 20
+
+
+def _frames(fragment, width, channels=None):
+    # (frames, channels) view, 1-d fragments are a single channel like in
+    # `audioop`
+    _check_fragment(fragment, width, allow_float=True)
+    frames = fragment.reshape(-1, 1) if fragment.ndim == 1 else fragment
+    if frames.ndim != 2 or (channels is not None and frames.shape[1] != channels):
+        raise error("Fragments should have the same number of channels")
+    return frames
+
+
+def _energy_dtype(width):
+    # squares of up to 16-bit samples add up exactly in int64
+    return np.int64 if width <= 2 else np.float64
+
+
+def _batches(n_out, step=1):
+    # (start, stop) of the outputs computed per batch, a multiple of `step`
+    size = builtin_max(1, _BATCH_FRAMES // step) * step
+    for start in range(0, n_out, size):
+        yield start, builtin_max(start, builtin_min(start + size, n_out))
+
+
+def _window_energy(frames, width, length):
+    # energy of every window of `length` frames, all channels together
+    n_out = len(frames) - length + 1
+    dtype = np.float64 if frames.dtype.kind == "f" else _energy_dtype(width)
+    energy = np.empty(n_out, dtype=dtype)
+    for start, stop in _batches(n_out):
+        # the cumulative sum restarts every batch, so its rounding error
+        # doesn't grow with the length of the input
+        values = _centred(frames[start : stop + length - 1], width, dtype)
+        sums = np.zeros(len(values) + 1, dtype=dtype)
+        np.cumsum(np.einsum("ij,ij->i", values, values), out=sums[1:])
+        energy[start:stop] = sums[length:] - sums[: stop - start]
+    return energy
+
+
+def _correlate(frames, width, reference):
+    # valid cross-correlation `sum_j frames[i + j] . reference[j]`
+    length = len(reference)
+    n_out = len(frames) - length + 1
+    n_fft = 1 << (builtin_max(_FFT_FACTOR * length, _MIN_FFT) - 1).bit_length()
+    # a block of `n_fft` frames gives this many uncorrupted outputs
+    step = n_fft - length + 1
+    kernel = np.conj(np.fft.rfft(reference, n_fft, axis=0))
+
+    out = np.empty(n_out)
+    for start, stop in _batches(n_out, step):
+        n_blocks = -(-(stop - start) // step)
+        values = np.zeros(((n_blocks - 1) * step + n_fft, frames.shape[1]))
+        segment = frames[start : stop + length - 1]
+        values[: len(segment)] = _centred(segment, width, np.float64)
+        # (blocks, channels, n_fft) view of the overlapping blocks
+        blocks = np.lib.stride_tricks.sliding_window_view(values, n_fft, axis=0)
+        spectra = np.fft.rfft(blocks[::step], axis=-1)
+        # summing over channels in the frequency domain saves inverse FFTs
+        products = np.einsum("bcf,fc->bf", spectra, kernel)
+        correlation = np.fft.irfft(products, n_fft, axis=-1)[:, :step]
+        out[start:stop] = correlation.reshape(-1)[: stop - start]
+    return out
+
+
+def _fit_scores(fragment, reference, width):
+    # returns (frames, reference, correlations, scores): the offset with
+    # the highest score has the smallest residual energy once `reference`
+    # is scaled by its best factor, like `audioop.findfit`
+    reference = _frames(reference, width)
+    frames = _frames(fragment, width, reference.shape[1])
+    if len(frames) < len(reference):
+        raise error("First sample should be longer")
+    reference = _centred(reference, width, np.float64)
+    if len(reference) == 0:
+        raise error("Reference should not be empty")
+
+    correlations = _correlate(frames, width, reference)
+    energy = _window_energy(frames, width, len(reference)).astype(np.float64)
+    # minimizing `(sum_ri_2 * sum_aij_2 - sum_aij_ri ** 2) / sum_aij_2` is
+    # maximizing `sum_aij_ri ** 2 / sum_aij_2`, zero for silent windows
+    scores = np.zeros(len(correlations))
+    np.divide(correlations * correlations, energy, out=scores, where=energy > 0)
+    return reference, correlations, scores
+
+
+def _factor(correlation, reference):
+    energy = float(np.vdot(reference, reference))
+    return float(correlation) / energy if energy else float("nan")
+
+
+def findfit(fragment, reference, width=2):
+    """
+    Offset (in frames) of the window of `fragment` that `reference` fits
+    best, and the factor to multiply `reference` by to match it. Unlike
+    `audioop.findfit` any width and any number of channels (2-d fragments)
+    are accepted, and the search takes O(N log M) time.
+    """
+    reference, correlations, scores = _fit_scores(fragment, reference, width)
+    offset = int(np.argmax(scores))
+    return offset, _factor(correlations[offset], reference)
+
+
+def findfits(fragment, reference, count, width=2, min_distance=None):
+    """
+    The `count` best fits of `reference` in `fragment` as a list of
+    `(offset, factor)`, best first. Offsets are at least `min_distance`
+    frames apart (the length of `reference` by default), so the
+    neighbours of a match don't crowd out the other matches.
+    """
+    reference, correlations, scores = _fit_scores(fragment, reference, width)
+    if min_distance is None:
+        min_distance = len(reference)
+    min_distance = builtin_max(int(min_distance), 1)
+
+    fits = []
+    # best first, each pick rules out the offsets too close to it
+    while len(fits) < count:
+        offset = int(np.argmax(scores))
+        if scores[offset] == -np.inf:
+            break
+        fits.append((offset, _factor(correlations[offset], reference)))
+        scores[builtin_max(offset - min_distance + 1, 0) : offset + min_distance] = (
+            -np.inf
+        )
+    return fits
+
+
+def findfactor(fragment, reference, width=2):
+    """
+    Factor to multiply `reference` by to best match `fragment` (least
+    squares), both of the same shape.
+    """
+    reference = _frames(reference, width)
+    frames = _frames(fragment, width, reference.shape[1])
+    if frames.shape != reference.shape:
+        raise error("Samples should be same size")
+    reference = _centred(reference, width, np.float64)
+    return _factor(
+        float(np.vdot(_centred(frames, width, np.float64), reference)), reference
+    )
+
+
+def findmax(fragment, length, width=2):
+    """Offset (in frames) of the window of `length` frames with the most energy."""
+    frames = _frames(fragment, width)
+    if length < 0 or len(frames) < length:
+        raise error("Input sample should be longer")
+    if len(frames) == 0:
+        return 0
+    return int(np.argmax(_window_energy(frames, width, length)))
@@ -0,0 +1,225 @@
+"""
+Rational polyphase sample rate conversion with NumPy.
+
+Converting from `inrate` to `outrate` is done as upsampling by
+L = outrate / g and downsampling by M = inrate / g (g = gcd of the rates)
+without ever materializing the upsampled signal: output frame n sits at
+input time n * M / L, its integer part picks the input frames under the
+filter and its fractional part (one of L phases) picks a row of a
+precomputed table of filter taps.
+
+Outputs n and n + L share a phase and are M input frames apart, so all the
+outputs of one phase are a single matrix-vector product over a strided
+sliding-window view of the input: L products per call, no copy of the
+input. When a call produces fewer outputs than there are phases (tiny
+chunks, or rates with a huge L) the outputs are instead gathered in blocks.
+
+Samples follow the `npaudioop` conventions (1-d interleaved or 2-d
+(frames, channels) arrays, uint8 centred on 128, results saturated to
+the sample width). Float containers are resampled without clipping.
+"""
+
+from math import gcd
+
+import numpy as np
+
+from audio_exp import npaudioop
+
+# half-width of the filter in zero crossings of the sinc, `None` for linear
+# interpolation between the two neighbouring input frames
+QUALITIES = {
+    "linear": None,
+    "sinc_fast": 8,
+    "sinc_medium": 16,
+    "sinc_best": 32,
+}
+
+# passband edge relative to the lower of the two Nyquist frequencies
+_ROLLOFF = 0.95
+_KAISER_BETA = 8.6
+# outputs computed per gather, bounds the size of the (outputs, taps,
+# channels) temporary
+_BLOCK_FRAMES = 8192
+# per-phase products are used once every phase has this many outputs
+_MIN_PHASE_FRAMES = 4
+
+
+def _filter_table(up, down, quality):
+    """
+    Returns `(first_tap, taps)`: `taps[p]` are the weights of the input frames
+    `base + first_tap + k` for an output at phase p, i.e. at input time
+    `base + p / up`.
+    """
+    if quality not in QUALITIES:
+        raise ValueError(
+            "unknown quality {!r}, expected one of {}".format(
+                quality, ", ".join(QUALITIES)
+            )
+        )
+    zero_crossings = QUALITIES[quality]
+    frac = np.arange(up, dtype=np.float64)[:, None] / up
+
+    if zero_crossings is None:
+        return 0, np.hstack([1 - frac, frac])
+
+    # when downsampling the cutoff moves below the input Nyquist frequency
+    # and the filter gets wider to keep the same transition band
+    cutoff = _ROLLOFF * min(1.0, up / down)
+    half_width = int(np.ceil(zero_crossings / cutoff))
+    first_tap = 1 - half_width
+    offsets = np.arange(first_tap, half_width + 1, dtype=np.float64)
+
+    distance = offsets[None, :] - frac
+    window = np.i0(
+        _KAISER_BETA * np.sqrt(np.clip(1 - (distance / half_width) ** 2, 0, None))
+    ) / np.i0(_KAISER_BETA)
+    taps = cutoff * np.sinc(cutoff * distance) * window
+    # unity gain at DC for every phase
+    taps /= taps.sum(axis=1, keepdims=True)
+    return first_tap, taps
+
+
+class Resampler:
+    """
+    Streaming sample rate converter.
+
+    Feed consecutive chunks to `process`, then call `flush` once at the end of
+    the stream for the outputs that depend on the last frames. Chunks may
+    have any length, the concatenated output is the same as resampling the
+    whole stream at once.
+    """
+
+    def __init__(self, inrate, outrate, channels=1, width=2, quality="sinc_medium"):
+        if inrate <= 0 or outrate <= 0:
+            raise ValueError("sample rates must be positive")
+        if channels < 1:
+            raise ValueError("channels must be positive")
+        npaudioop._check_size(width)
+
+        g = gcd(inrate, outrate)
+        self._up = outrate // g
+        self._down = inrate // g
+        self.channels = channels
+        self.width = width
+        self._first_tap, self._taps = _filter_table(self._up, self._down, quality)
+        # container and layout of the output, taken from the last chunk
+        self._like = np.empty(0, dtype=npaudioop._DTYPES[width])
+        self._ndim = 1
+        self.reset()
+
+    def reset(self):
+        """Forget the stream seen so far, as if the resampler was new."""
+        # `_buffer[0]` is input frame `_start`, zero-padded before frame 0
+        self._start = self._first_tap
+        self._buffer = np.zeros((-self._first_tap, self.channels), dtype=np.float64)
+        self._frames_in = 0
+        self._frames_out = 0
+
+    def _frames(self, fragment):
+        if fragment.ndim == 1:
+            if len(fragment) % self.channels:
+                raise ValueError("not a whole number of frames")
+            return fragment.reshape(-1, self.channels)
+        if fragment.ndim != 2 or fragment.shape[1] != self.channels:
+            raise ValueError(
+                "expected a fragment with {} channels".format(self.channels)
+            )
+        return fragment
+
+    def _values(self, fragment):
+        if fragment.dtype.kind == "f":
+            return fragment.astype(np.float64)
+        npaudioop._check_fragment(fragment, self.width)
+        return npaudioop._centred(fragment, self.width, np.float64)
+
+    def _convert(self, values, like):
+        if like.dtype.kind == "f":
+            return values.astype(like.dtype)
+        np.rint(values, out=values)
+        return npaudioop._saturate(values, self.width, like)
+
+    def _emit_by_phase(self, out):
+        n_taps = self._taps.shape[1]
+        # (frames, channels, taps) view, row i holds the taps starting at i
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, n_taps, axis=0)
+        for i in range(min(self._up, len(out))):
+            base, phase = divmod((self._frames_out + i) * self._down, self._up)
+            first = base + self._first_tap - self._start
+            phase_out = out[i :: self._up]
+            rows = windows[first :: self._down][: len(phase_out)]
+            np.matmul(rows, self._taps[phase], out=phase_out)
+
+    def _emit_gathered(self, out):
+        tap_index = np.arange(self._taps.shape[1])
+        for offset in range(0, len(out), _BLOCK_FRAMES):
+            n = self._frames_out + np.arange(
+                offset, min(offset + _BLOCK_FRAMES, len(out))
+            )
+            base, phase = np.divmod(n * self._down, self._up)
+            first = base + self._first_tap - self._start
+            windows = self._buffer[first[:, None] + tap_index]
+            block_out = out[offset : offset + len(n)]
+            np.einsum("nk,nkc->nc", self._taps[phase], windows, out=block_out)
+
+    def _emit(self, stop):
+        # outputs `_frames_out` up to `stop` (exclusive), all of their taps
+        # must be in the buffer
+        out = np.empty((stop - self._frames_out, self.channels), dtype=np.float64)
+        if len(out) >= self._up * _MIN_PHASE_FRAMES:
+            self._emit_by_phase(out)
+        else:
+            self._emit_gathered(out)
+
+        self._frames_out = stop
+        # drop the input no later output will use
+        next_first = (stop * self._down) // self._up + self._first_tap
+        drop = max(0, next_first - self._start)
+        self._buffer = self._buffer[drop:]
+        self._start += drop
+        return out
+
+    @property
+    def _last_tap(self):
+        return self._first_tap + self._taps.shape[1] - 1
+
+    def _output(self, stop):
+        converted = self._convert(self._emit(stop), self._like)
+        return converted if self._ndim == 2 else converted.reshape(-1)
+
+    def process(self, fragment):
+        """Resample the next chunk of the stream, returns the outputs it completes."""
+        frames = self._frames(fragment)
+        self._like, self._ndim = fragment[:0], fragment.ndim
+        self._buffer = np.concatenate([self._buffer, self._values(frames)])
+        self._frames_in += len(frames)
+        # every output whose last tap has been read: floor(n * M / L) +
+        # last_tap < frames_in
+        ready = -(-(self._frames_in - self._last_tap) * self._up // self._down)
+        return self._output(max(ready, self._frames_out))
+
+    def flush(self):
+        """
+        Outputs the end of the stream, reading zeros past the last input
+        frame, then resets the resampler.
+        """
+        total = -(-self._frames_in * self._up // self._down)
+        needed = (max(total - 1, 0) * self._down) // self._up + self._last_tap + 1
+        padding = max(0, needed - (self._start + len(self._buffer)))
+        self._buffer = np.concatenate(
+            [self._buffer, np.zeros((padding, self.channels), dtype=np.float64)]
+        )
+        out = self._output(max(total, self._frames_out))
+        self.reset()
+        return out
+
+
+def resample(fragment, width, channels, inrate, outrate, quality="sinc_medium"):
+    """
+    Resample a whole fragment from `inrate` to `outrate`, returns
+    ceil(frames * outrate / inrate) frames in the layout and container of
+    `fragment`. `quality` is one of `QUALITIES`.
+    """
+    resampler = Resampler(inrate, outrate, channels, width, quality)
+    head = resampler.process(fragment)
+    tail = resampler.flush()
+    return np.concatenate([head, tail])
@@ -0,0 +1,274 @@
+"""
+Silence detection and splitting, pydub compatible.
+
+A window of `min_silence_len` ms is silent when the RMS of all its samples
+(every channel together) is at most `silence_thresh` dBFS. Windows start
+every `seek_step` ms, and overlapping or touching silent windows merge
+into one silent range. Like in `audio_exp.envelope`, the energy is summed
+over blocks of gcd(window, hop) frames and the window sums come from a
+cumulative sum, so the cost is O(N) for any step.
+
+`SilenceDetector` does this incrementally, chunk by chunk, which is what
+`detect_silence_in_file` and friends use to scan files of any length in
+bounded memory. Ranges are (n, 2) int64 arrays of [start, end) frames,
+the functions taking an `AudioSegment` return lists in ms like pydub.
+"""
+
+from math import gcd
+
+import numpy as np
+
+from audio_exp import AudioStreamReader, WavStreamReader, npaudioop
+
+# frames analysed at once when the whole signal is in memory
+_CHUNK_FRAMES = 1 << 20
+
+
+def _full_scale(dtype, width):
+    return 1.0 if dtype.kind == "f" else float(1 << (8 * width - 1))
+
+
+class SilenceDetector:
+    """
+    Incremental silence detection over consecutive chunks of a stream.
+
+    `window` and `hop` are in frames, `silence_thresh` in dBFS. Feed the
+    chunks to `process`, `finish` returns the silent ranges in frames.
+    """
+
+    def __init__(self, width, channels, window, hop, silence_thresh):
+        if window < 1 or hop < 1:
+            raise ValueError("window and hop must be at least one frame")
+        npaudioop._check_size(width)
+        self.width = width
+        self.channels = channels
+        self.window = window
+        self.hop = hop
+        self.silence_thresh = silence_thresh
+
+        self._g = gcd(window, hop)
+        # energy of the frames that don't fill a whole block yet
+        self._pending = np.zeros(0)
+        # energy of the blocks still needed, `_blocks[0]` is block `_first`
+        self._blocks = np.zeros(0)
+        self._first = 0
+        # block where the next window starts
+        self._next = 0
+        self._limit = None
+        self._closed = []
+        # (start, last window start) of the range still growing
+        self._open = None
+
+    def process(self, fragment):
+        frames = fragment.reshape(-1, self.channels)
+        if self._limit is None:
+            # silent iff the mean square over the window is below this
+            amplitude = 10 ** (self.silence_thresh / 20) * _full_scale(
+                frames.dtype, self.width
+            )
+            self._limit = amplitude * amplitude * self.window * self.channels
+        if frames.dtype.kind == "f":
+            values = frames.astype(np.float64)
+        else:
+            values = npaudioop._centred(frames, self.width, np.float64)
+        energy = np.concatenate([self._pending, np.einsum("ij,ij->i", values, values)])
+
+        g = self._g
+        n_blocks = len(energy) // g
+        self._pending = energy[n_blocks * g :]
+        blocks = np.concatenate(
+            [self._blocks, energy[: n_blocks * g].reshape(n_blocks, g).sum(axis=1)]
+        )
+
+        k = self.window // g
+        sums = np.zeros(len(blocks) + 1)
+        np.cumsum(blocks, out=sums[1:])
+        starts = np.arange(self._next, self._first + len(blocks) - k + 1, self.hop // g)
+        local = starts - self._first
+        silent = sums[local + k] - sums[local] <= self._limit
+        self._add(starts[silent] * g)
+
+        if len(starts):
+            self._next = starts[-1] + self.hop // g
+        drop = min(self._next - self._first, len(blocks))
+        self._blocks = blocks[drop:]
+        self._first += drop
+
+    def _add(self, starts):
+        if not len(starts):
+            return
+        # windows overlapping or touching the previous one extend its range
+        breaks = np.flatnonzero(np.diff(starts) > self.window)
+        firsts = starts[np.r_[0, breaks + 1]]
+        lasts = starts[np.r_[breaks, len(starts) - 1]]
+        if self._open is not None:
+            if firsts[0] <= self._open[1] + self.window:
+                firsts[0] = self._open[0]
+            else:
+                self._closed.append(
+                    np.array([[self._open[0], self._open[1] + self.window]])
+                )
+        self._closed.append(np.stack([firsts[:-1], lasts[:-1] + self.window], axis=1))
+        self._open = (firsts[-1], lasts[-1])
+
+    def finish(self):
+        """Silent ranges as an (n, 2) array of [start, end) frames."""
+        ranges = self._closed
+        if self._open is not None:
+            ranges = ranges + [np.array([[self._open[0], self._open[1] + self.window]])]
+        if not ranges:
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.concatenate(ranges).astype(np.int64)
+
+
+def invert_ranges(ranges, n_frames):
+    """The [start, end) ranges of `[0, n_frames)` not covered by `ranges`."""
+    bounds = np.concatenate([[0], np.asarray(ranges).reshape(-1), [n_frames]])
+    gaps = bounds.reshape(-1, 2)
+    return gaps[gaps[:, 0] < gaps[:, 1]].astype(np.int64)
+
+
+def pad_ranges(ranges, n_frames, keep):
+    """
+    Extend every range by `keep` frames on both sides. Where two padded
+    ranges would overlap they meet half way, like pydub's `keep_silence`.
+    """
+    padded = np.asarray(ranges, dtype=np.int64).copy()
+    padded[:, 0] -= keep
+    padded[:, 1] += keep
+    overlap = np.flatnonzero(padded[1:, 0] < padded[:-1, 1])
+    middle = (padded[overlap, 1] + padded[overlap + 1, 0]) // 2
+    padded[overlap, 1] = middle
+    padded[overlap + 1, 0] = middle
+    return np.clip(padded, 0, n_frames)
+
+
+def _segment_frames(audio_segment, ms):
+    return max(1, int(audio_segment.frame_count(ms=ms)))
+
+
+def silent_ranges(audio_segment, min_silence_len=1000, silence_thresh=-16, seek_step=1):
+    """Silent ranges of `audio_segment`, in frames."""
+    detector = SilenceDetector(
+        audio_segment.sample_width,
+        audio_segment.channels,
+        _segment_frames(audio_segment, min_silence_len),
+        _segment_frames(audio_segment, seek_step),
+        silence_thresh,
+    )
+    data = audio_segment._data
+    step = _CHUNK_FRAMES * audio_segment.channels
+    for start in range(0, len(data), step):
+        detector.process(data[start : start + step])
+    return detector.finish()
+
+
+def _to_ms(audio_segment, ranges):
+    return [
+        [
+            round(start * 1000 / audio_segment.frame_rate),
+            round(end * 1000 / audio_segment.frame_rate),
+        ]
+        for start, end in ranges.tolist()
+    ]
+
+
+def detect_silence(
+    audio_segment, min_silence_len=1000, silence_thresh=-16, seek_step=1
+):
+    """Returns a list of all silent sections [start, end] in milliseconds."""
+    ranges = silent_ranges(audio_segment, min_silence_len, silence_thresh, seek_step)
+    return _to_ms(audio_segment, ranges)
+
+
+def detect_nonsilent(
+    audio_segment, min_silence_len=1000, silence_thresh=-16, seek_step=1
+):
+    """Returns a list of all nonsilent sections [start, end] in milliseconds."""
+    ranges = silent_ranges(audio_segment, min_silence_len, silence_thresh, seek_step)
+    return _to_ms(
+        audio_segment, invert_ranges(ranges, int(audio_segment.frame_count()))
+    )
+
+
+def split_on_silence(
+    audio_segment,
+    min_silence_len=1000,
+    silence_thresh=-16,
+    keep_silence=100,
+    seek_step=1,
+):
+    """
+    Returns the nonsilent chunks of `audio_segment`, padded with up to
+    `keep_silence` ms of the surrounding silence (`True` keeps all of it,
+    `False` none). The chunks are views on the samples of `audio_segment`.
+    """
+    n_frames = int(audio_segment.frame_count())
+    if isinstance(keep_silence, bool):
+        keep = n_frames if keep_silence else 0
+    else:
+        keep = int(audio_segment.frame_count(ms=keep_silence))
+
+    silent = silent_ranges(audio_segment, min_silence_len, silence_thresh, seek_step)
+    ranges = pad_ranges(invert_ranges(silent, n_frames), n_frames, keep)
+    return [
+        audio_segment.get_sample_slice(start, end) for start, end in ranges.tolist()
+    ]
+
+
+def _file_reader(file_path):
+    with open(file_path, "rb") as f:
+        header = f.read(12)
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return WavStreamReader(file_path, block_frames=_CHUNK_FRAMES)
+    return AudioStreamReader(file_path)
+
+
+def _scan_file(file_path, min_silence_len, silence_thresh, seek_step):
+    reader = _file_reader(file_path)
+    metadata = reader.metadata
+    to_frames = metadata.sample_rate / 1000
+    detector = SilenceDetector(
+        metadata.bits_per_sample // 8,
+        metadata.channels,
+        max(1, int(min_silence_len * to_frames)),
+        max(1, int(seek_step * to_frames)),
+        silence_thresh,
+    )
+    n_samples = 0
+    for samples in reader:
+        detector.process(samples)
+        n_samples += len(samples)
+    return detector.finish(), n_samples // metadata.channels, metadata.sample_rate
+
+
+def detect_silence_in_file(
+    file_path, min_silence_len=1000, silence_thresh=-16, seek_step=1
+):
+    """
+    Silent ranges of a whole file as an (n, 2) array of frames, and the
+    number of frames of the file. The file is read block by block, memory
+    use doesn't depend on its length.
+    """
+    silent, n_frames, _ = _scan_file(
+        file_path, min_silence_len, silence_thresh, seek_step
+    )
+    return silent, n_frames
+
+
+def split_file_on_silence(
+    file_path, min_silence_len=1000, silence_thresh=-16, keep_silence=100, seek_step=1
+):
+    """
+    Streaming `split_on_silence`: the [start, end) frames of the chunks of
+    a file as an (n, 2) array, to be read with e.g.
+    `AudioSegment.from_file_frames(file_path, start, end - start)`.
+    """
+    silent, n_frames, sample_rate = _scan_file(
+        file_path, min_silence_len, silence_thresh, seek_step
+    )
+    if isinstance(keep_silence, bool):
+        keep = n_frames if keep_silence else 0
+    else:
+        keep = int(keep_silence * sample_rate / 1000)
+    return pad_ranges(invert_ranges(silent, n_frames), n_frames, keep)
@@ -0,0 +1,168 @@
+"""
+Columnar metadata for large collections of WAV files.
+
+Headers are read in parallel by the extension (`read_wav_files_metadata`),
+the results come back as one numpy array per field rather than one object
+per file. An optional SQLite cache keyed by (path, size, mtime) lets repeated
+scans of a mostly unchanged corpus skip every file it has already seen.
+"""
+
+import os
+import sqlite3
+
+from contextlib import closing
+from typing import NamedTuple
+
+import numpy as np
+
+from audio_exp._lowlevel import read_wav_files_metadata
+
+_DTYPES = {
+    "sample_rate": np.uint32,
+    "channels": np.uint16,
+    "bits_per_sample": np.uint16,
+    "sample_format_int": np.bool_,
+    "frames": np.uint32,
+    "duration_seconds": np.float64,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS wav_metadata (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    bits_per_sample INTEGER NOT NULL,
+    sample_format_int INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    duration_seconds REAL NOT NULL,
+    error TEXT
+)
+"""
+
+
+class WavMetadataTable(NamedTuple):
+    """
+    One row per scanned file. `error` is `None` for files read successfully,
+    otherwise it holds the reason and the numeric columns of the row are 0.
+    Use `pandas.DataFrame(table._asdict())` for a data frame.
+    """
+
+    path: np.ndarray
+    sample_rate: np.ndarray
+    channels: np.ndarray
+    bits_per_sample: np.ndarray
+    sample_format_int: np.ndarray
+    frames: np.ndarray
+    duration_seconds: np.ndarray
+    error: np.ndarray
+
+
+def list_wav_files(directory, extensions=(".wav",)):
+    """
+    Every file below `directory` whose name ends with one of `extensions`
+    (case-insensitive), sorted.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(
+            os.path.join(root, name)
+            for name in names
+            if name.lower().endswith(extensions)
+        )
+    paths.sort()
+    return paths
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def scan_wav_metadata(paths, cache_path=None, num_threads=None):
+    """
+    Read the metadata of many WAV files at once, returns a `WavMetadataTable`.
+
+    `paths` is a list of files or a directory, which is searched recursively
+    for `.wav` files. Unreadable files don't raise, see `WavMetadataTable`.
+
+    With `cache_path`, results are stored in a SQLite database at that path
+    and reused on the next scan for every file whose size and modification
+    time are unchanged. `num_threads` sizes the pool reading the headers,
+    one thread per core by default.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = list_wav_files(paths)
+    paths = [os.fspath(path) for path in paths]
+
+    columns = {name: np.zeros(len(paths), dtype) for name, dtype in _DTYPES.items()}
+    errors = np.full(len(paths), None, dtype=object)
+
+    keys = {}
+    for i, path in enumerate(paths):
+        try:
+            keys[i] = _stat_key(path)
+        except OSError as e:
+            errors[i] = str(e)
+    todo = sorted(keys)
+
+    if cache_path is not None:
+        with closing(sqlite3.connect(cache_path)) as db:
+            with db:
+                db.execute(_SCHEMA)
+            hits = _read_cache(db, [keys[i] for i in todo])
+            missing = []
+            for i in todo:
+                row = hits.get(keys[i])
+                if row is None:
+                    missing.append(i)
+                    continue
+                for name, value in zip(_DTYPES, row):
+                    columns[name][i] = value
+                errors[i] = row[-1]
+            todo = missing
+
+            _read_headers(paths, todo, columns, errors, num_threads)
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO wav_metadata VALUES (?,?,?,?,?,?,?,?,?,?)",
+                    (
+                        keys[i]
+                        + tuple(columns[name][i].item() for name in _DTYPES)
+                        + (errors[i],)
+                        for i in todo
+                    ),
+                )
+    else:
+        _read_headers(paths, todo, columns, errors, num_threads)
+
+    return WavMetadataTable(path=np.array(paths, dtype=object), error=errors, **columns)
+
+
+def _read_cache(db, keys):
+    # join against a temporary table so millions of keys take a single query
+    db.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS wanted "
+        "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)"
+    )
+    db.execute("DELETE FROM wanted")
+    db.executemany("INSERT OR REPLACE INTO wanted VALUES (?,?,?)", keys)
+    rows = db.execute(
+        "SELECT c.path, c.size, c.mtime_ns, {}, c.error FROM wanted w "
+        "JOIN wav_metadata c ON c.path = w.path "
+        "AND c.size = w.size AND c.mtime_ns = w.mtime_ns".format(
+            ", ".join("c." + name for name in _DTYPES)
+        )
+    )
+    return {tuple(row[:3]): row[3:] for row in rows}
+
+
+def _read_headers(paths, indices, columns, errors, num_threads):
+    if not indices:
+        return
+    result = read_wav_files_metadata([paths[i] for i in indices], num_threads)
+    for name in _DTYPES:
+        columns[name][indices] = result[name]
+    errors[indices] = result["error"]
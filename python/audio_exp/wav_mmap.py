@@ -0,0 +1,128 @@
+"""
+Zero-copy access to the sample data of PCM / IEEE float WAV files.
+
+The RIFF header is parsed in Python to locate the `data` chunk, the samples
+are then exposed as a read-only `np.memmap` over that chunk, so nothing is
+read from disk until it is actually touched and the page cache is shared
+between every process mapping the same file.
+"""
+
+import os
+import struct
+
+from typing import NamedTuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavHeader(NamedTuple):
+    format_tag: int
+    channels: int
+    sample_rate: int
+    bits_per_sample: int
+    block_align: int
+    data_offset: int
+    data_size: int
+
+    @property
+    def dtype(self):
+        # 24-bit has no numpy equivalent and cannot be viewed without a copy
+        if self.format_tag == WAVE_FORMAT_PCM:
+            dtypes = {8: "u1", 16: "<i2", 32: "<i4"}
+        elif self.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+            dtypes = {32: "<f4", 64: "<f8"}
+        else:
+            dtypes = {}
+
+        if self.bits_per_sample not in dtypes:
+            raise ValueError(
+                "{}-bit samples with format tag {:#06x} can't be memory-mapped".format(
+                    self.bits_per_sample, self.format_tag
+                )
+            )
+        return np.dtype(dtypes[self.bits_per_sample])
+
+    @property
+    def frame_count(self):
+        return self.data_size // self.block_align
+
+
+def read_wav_header(file_path):
+    """
+    Walk the RIFF chunks of a WAV file up to its `data` chunk.
+
+    Returns a `WavHeader`, the data size is clamped to what is actually on
+    disk so files left unfinalized by a streaming writer can still be read.
+    """
+    file_size = os.path.getsize(file_path)
+    fmt = None
+
+    with open(file_path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError("{} is not a RIFF/WAVE file".format(file_path))
+
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError("no data chunk found in {}".format(file_path))
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                # chunks are word aligned
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("data chunk precedes fmt chunk")
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    format_tag, channels, sample_rate, _, block_align, bits_per_sample = (
+        struct.unpack_from("<HHIIHH", fmt)
+    )
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        # the real format tag leads the sub-format GUID
+        (format_tag,) = struct.unpack_from("<H", fmt, 24)
+
+    data_size = min(chunk_size, file_size - data_offset)
+    data_size -= data_size % block_align
+
+    return WavHeader(
+        format_tag=format_tag,
+        channels=channels,
+        sample_rate=sample_rate,
+        bits_per_sample=bits_per_sample,
+        block_align=block_align,
+        data_offset=data_offset,
+        data_size=data_size,
+    )
+
+
+def memmap_wav_file(file_path, header=None):
+    """
+    Map the `data` chunk of a WAV file as a read-only 1-d array of
+    interleaved samples, returns `(samples, header)`.
+    """
+    if header is None:
+        header = read_wav_header(file_path)
+    dtype = header.dtype
+
+    if header.data_size == 0:
+        # mmap can't map an empty region
+        return np.empty(0, dtype=dtype), header
+
+    samples = np.memmap(
+        file_path,
+        dtype=dtype,
+        mode="r",
+        offset=header.data_offset,
+        shape=(header.data_size // dtype.itemsize,),
+    )
+    return samples, header
@@ -1,4 +1,10 @@
+import os
+import tempfile
+import tracemalloc
 import unittest
+
+import numpy as np
+
 from audio_exp.audio_segment import AudioSegment
 
 
@@ -71,4 +77,278 @@ class AudioSegmentTest(unittest.TestCase):
         assert result.frame_rate == 16000
         # Assert that the audio has the correct data and properties after applying gain
 
+    def test_frame_count(self):
+        audio = AudioSegment(
+            data=np.zeros(2 * 24000, dtype="<i2"),
+            channels=2,
+            sample_width=2,
+            frame_rate=16000,
+        )
+        assert audio.frame_count() == 24000
+        assert audio.frame_count(ms=10) == 160
+        assert audio.duration_seconds == 1.5
+        assert len(audio) == 1500
+
+    def test_slicing(self):
+        data = np.arange(2 * 16000, dtype="<i2")
+        audio = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=16000)
+        frames = data.reshape(-1, 2)
+
+        part = audio[100:250]
+        assert np.shares_memory(part._data, data)
+        assert part.frame_count() == 2400
+        assert (part._data == frames[1600:4000].reshape(-1)).all()
+
+        assert (audio[-100:]._data == frames[-1600:].reshape(-1)).all()
+        assert (audio[:-900]._data == frames[:1600].reshape(-1)).all()
+        assert len(audio[10]) == 1
+        assert len(audio[-1]) == 1
+        assert len(audio[900:2000]) == 100
+        assert len(audio[500:100]) == 0
+
+        chunks = list(audio[::300])
+        assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+        assert all(np.shares_memory(chunk._data, data) for chunk in chunks)
+
+        sample_slice = audio.get_sample_slice(-10, None)
+        assert (sample_slice._data == frames[-10:].reshape(-1)).all()
+        assert audio.get_sample_slice(5, 5).frame_count() == 0
+
+    def test_concat(self):
+        segs = [
+            AudioSegment(
+                data=np.full(2 * 1600, i, dtype="<i2"),
+                channels=2,
+                sample_width=2,
+                frame_rate=16000,
+            )
+            for i in range(1, 4)
+        ]
+        result = AudioSegment.concat(segs)
+        assert result.frame_count() == 4800
+        assert (result._data == np.repeat([1, 2, 3], 3200)).all()
+
+        appended = segs[0].append(segs[1])
+        assert (appended._data == np.repeat([1, 2], 3200)).all()
+        assert (segs[0] + segs[1])._data.tolist() == appended._data.tolist()
+
+    def test_concat_crossfade(self):
+        low = AudioSegment(
+            data=np.zeros(1600, dtype="<i2"),
+            channels=1,
+            sample_width=2,
+            frame_rate=16000,
+        )
+        high = AudioSegment(
+            data=np.full(1600, 1000, dtype="<i2"),
+            channels=1,
+            sample_width=2,
+            frame_rate=16000,
+        )
+        result = AudioSegment.concat([low, high, low], crossfade=10)
+        assert result.frame_count() == 3 * 1600 - 2 * 160
+        data = result._data
+        # linear ramp up over 10 ms, then down
+        assert (data[:1440] == 0).all()
+        assert (data[1440:1600] == np.arange(160) * 1000 // 160).all()
+        assert (data[1600:2880] == 1000).all()
+        assert (np.diff(data[2880:3040]) <= 0).all()
+        assert (data[3040:] == 0).all()
+
+        with self.assertRaises(ValueError):
+            low.append(high, crossfade=200)
+
+    def test_set_channels_matrix(self):
+        stereo = AudioSegment(
+            data=np.array([100, 300, -101, -300, 32767, 32767], dtype="<i2"),
+            channels=2,
+            sample_width=2,
+            frame_rate=8000,
+        )
+        mono = stereo.set_channels(1)
+        assert mono.channels == 1 and mono.frame_width == 2
+        assert mono._data.tolist() == [200, -201, 32767]
+        assert (
+            mono.set_channels(3)._data.tolist() == [200] * 3 + [-201] * 3 + [32767] * 3
+        )
+
+        # 5.1 to stereo drops the LFE and adds the centre at -3 dB
+        surround = AudioSegment(
+            data=np.array([1000, 2000, 1000, 30000, 0, 0], dtype="<i2"),
+            channels=6,
+            sample_width=2,
+            frame_rate=8000,
+        )
+        assert surround.set_channels(2)._data.tolist() == [1707, 2707]
+
+        swapped = stereo.set_channels(2, matrix=[[0, 1], [1, 0]])
+        assert swapped._data.tolist() == [300, 100, -300, -101, 32767, 32767]
+        # clipped to the sample width
+        doubled = stereo.set_channels(2, matrix=[[2, 0], [0, 1]])
+        assert doubled._data.tolist()[-2:] == [32767, 32767]
+        with self.assertRaises(ValueError):
+            stereo.set_channels(1, matrix=[[1, 0]])
+
+        lazy = surround.lazy().set_channels(2)
+        assert lazy._data.tolist() == [1707, 2707]
+
+    def test_split_to_mono(self):
+        frames = np.arange(12, dtype="<i2").reshape(4, 3)
+        seg = AudioSegment(
+            data=frames.reshape(-1), channels=3, sample_width=2, frame_rate=8000
+        )
+        channels = seg.split_to_mono()
+        assert [c._data.tolist() for c in channels] == frames.T.tolist()
+        assert all(np.shares_memory(c._data, seg._data) for c in channels)
+        assert channels[1].channels == 1 and channels[1].frame_width == 2
+
+        joined = AudioSegment.from_mono_audiosegments(*channels)
+        assert joined.channels == 3
+        assert joined._data.tolist() == seg._data.tolist()
+
+        # shorter segments are padded with silence
+        padded = AudioSegment.from_mono_audiosegments(
+            channels[0], channels[1].get_sample_slice(0, 2)
+        )
+        assert padded._data.tolist() == [0, 1, 3, 4, 6, 0, 9, 0]
+        with self.assertRaises(ValueError):
+            AudioSegment.from_mono_audiosegments(seg)
+
+    def test_float_mode(self):
+        data = np.array([0, 16384, -32768, 32767, -1], dtype="<i2")
+        seg = AudioSegment(data=data, channels=1, sample_width=2, frame_rate=8000)
+        as_float = seg.to_float()
+        assert as_float._data.dtype == np.float32
+        assert as_float.sample_width == 4 and as_float.frame_width == 4
+        assert as_float._data.tolist()[:3] == [0.0, 0.5, -1.0]
+        assert as_float.to_float() is as_float
+        assert as_float.to_int(2)._data.tolist() == data.tolist()
+
+        # no clipping nor rounding between steps
+        chained = as_float.apply_gain(12).apply_gain(-12)
+        assert chained._data.dtype == np.float32
+        assert np.allclose(chained._data, as_float._data, atol=1e-6)
+        assert chained.to_int(2)._data.tolist() == data.tolist()
+        assert seg.apply_gain(12).apply_gain(-12)._data.tolist() != data.tolist()
+
+        stereo = as_float.set_channels(2).set_frame_rate(16000)
+        assert stereo._data.dtype == np.float32 and stereo.frame_count() == 10
+        with self.assertRaises(ValueError):
+            as_float.set_sample_width(2)
+        # integer segments joining float ones are normalized
+        joined = seg + as_float
+        assert joined._data.dtype == np.float32
+        assert joined._data.tolist() == as_float._data.tolist() * 2
+
+    def test_float_export_dither(self):
+        quiet = np.sin(np.arange(8000) / 10) * 0.4 / 32768
+        seg = AudioSegment(
+            data=quiet.astype(np.float32), channels=1, sample_width=4, frame_rate=8000
+        )
+        # below 1 LSB the signal rounds away without dither, survives as noise with it
+        assert not seg.to_int(2)._data.any()
+        dithered = seg.to_int(2, dither=True)._data
+        assert set(np.unique(dithered)) <= {-2, -1, 0, 1, 2}
+        assert np.corrcoef(dithered, quiet)[0, 1] > 0.1
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "out.wav")
+            seg.apply_gain(60).export(file_path, sample_width=2, dither=True)
+            back = AudioSegment.from_file(file_path)
+            assert back.sample_width == 2 and back._data.dtype == np.int16
+            assert np.abs(back._data - quiet * 1000 * 32768).max() <= 2
+
+    def test_int_export_sample_width(self):
+        data = np.array([0, 1000, -1000, 32767, -32768, 5], dtype="<i2")
+        seg = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=8000)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "out.wav")
+            seg.export(file_path, sample_width=3)
+            back = AudioSegment.from_file(file_path)
+            assert back.sample_width == 3 and back.channels == 2
+            assert (back._data == data.astype(np.int32) << 8).all()
+
+            seg.export(file_path, sample_width=1)
+            back = AudioSegment.from_file(file_path)
+            assert back.sample_width == 1
+            assert (back._data == seg.set_sample_width(1)._data).all()
+
+            with self.assertRaises(ValueError):
+                seg.export(file_path, sample_width=5)
+
+    def test_g711(self):
+        data = np.array([0, 1000, -1000, 32767, -32768, 5], dtype="<i2")
+        seg = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=8000)
+        ulaw = seg.to_ulaw()
+        assert ulaw.dtype == np.uint8 and len(ulaw) == 6
+        decoded = AudioSegment.from_ulaw(ulaw.tobytes(), channels=2)
+        assert decoded.channels == 2 and decoded.frame_count() == 3
+        # companding keeps about 3 significant bits of the mantissa
+        assert np.allclose(decoded._data, data, rtol=1 / 16, atol=8)
+
+        alaw = seg.to_alaw()
+        assert (seg.to_float().to_alaw() == alaw).all()
+        decoded = AudioSegment.from_alaw(alaw, sample_width=4)
+        assert decoded._data.dtype == np.int32
+        assert np.allclose(decoded._data >> 16, data, rtol=1 / 16, atol=8)
+
+    def test_out_buffers(self):
+        data = np.array([0, 1000, -1000, 32767, -32768, 5], dtype="<i2")
+        seg = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=8000)
+
+        out = np.empty(6, dtype=np.int16)
+        louder = seg.apply_gain(6, out=out)
+        assert louder._data is out
+        assert (out == seg.apply_gain(6)._data).all()
+
+        floats = np.empty(6, dtype=np.float32)
+        assert seg.to_float(out=floats)._data is floats
+        assert (floats == seg.to_float()._data).all()
+        back = np.empty(6, dtype=np.int16)
+        assert (seg.to_float(out=floats).to_int(2, out=back)._data == data).all()
+
+        mono = np.empty(3, dtype=np.int16)
+        assert (seg.set_channels(1, out=mono)._data == seg.set_channels(1)._data).all()
+        wide = np.empty(6, dtype=np.int32)
+        assert seg.set_sample_width(4, out=wide)._data is wide
+        assert (wide == data.astype(np.int32) << 16).all()
+
+        # unsigned 8-bit goes through npaudioop, which writes to `out` too
+        seg8 = seg.set_sample_width(1)
+        out8 = np.empty(6, dtype=np.uint8)
+        assert (seg8.apply_gain(-6, out=out8)._data == seg8.apply_gain(-6)._data).all()
+
+        # ops leaving the samples unchanged still fill `out`
+        same = np.empty(6, dtype=np.int16)
+        assert (seg.set_channels(2, out=same)._data == data).all()
+
+        with self.assertRaises(ValueError):
+            seg.apply_gain(6, out=np.empty(6, dtype=np.int32))
+        with self.assertRaises(ValueError):
+            seg.set_channels(1, out=np.empty(6, dtype=np.int16))
+        with self.assertRaises(ValueError):
+            seg.lazy().apply_gain(6, out=out)
+
+    def test_out_allocates_no_result_sized_array(self):
+        rng = np.random.default_rng(0)
+        data = rng.integers(-32768, 32767, size=1 << 20).astype("<i2")
+        seg = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=8000)
+        seg8 = seg.set_sample_width(1)
+        floats = seg.to_float()
+        ops = [
+            (lambda out: seg.set_channels(1, out=out), np.empty(1 << 19, np.int16)),
+            (lambda out: seg.set_sample_width(1, out=out), np.empty(1 << 20, np.uint8)),
+            (lambda out: seg8.apply_gain(-3, out=out), np.empty(1 << 20, np.uint8)),
+            (lambda out: seg8.to_float(out=out), np.empty(1 << 20, np.float32)),
+            (lambda out: floats.to_int(2, True, out=out), np.empty(1 << 20, np.int16)),
+        ]
+        for op, out in ops:
+            tracemalloc.start()
+            try:
+                self.assertIs(op(out)._data, out)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            self.assertLess(peak, out.nbytes / 2)
+
     # Add more tests as needed
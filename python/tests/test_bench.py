@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from audio_exp import bench
+
+from .common import TEST_DIR
+
+
+def _run(tmp_path, name, *args):
+    out = tmp_path / name
+    argv = ["--seconds", "0.01", "--widths", "1", "2", "--channels", "1", "2"]
+    argv += ["--min-time", "0", "--repeat", "1", "--slow-samples", "64"]
+    argv += ["--out", str(out), *args]
+    return bench.main(argv), out
+
+
+def test_bench_writes_results(tmp_path):
+    status, out = _run(
+        tmp_path, "run.json", "--ops", "read", "gain", "downmix", "--sounds", TEST_DIR
+    )
+    assert status == 0
+    report = json.loads(out.read_text())
+    assert report["metadata"]["numpy"]
+    results = report["results"]
+    cases = {(r["op"], r["backend"], r["width"], r["channels"]) for r in results}
+    assert ("gain", "numpy", 1, 2) in cases
+    assert ("gain", "native", 2, 2) in cases
+    # the in-place kernels only take signed containers
+    assert ("gain", "native", 1, 2) not in cases
+    assert ("read", "native", 2, 1) in cases
+    # `tomono` only takes stereo
+    assert ("downmix", "numpy", 2, 1) not in cases
+    assert any(r["source"].startswith("sounds/") for r in results)
+    for result in results:
+        assert result["samples"] > 0
+        assert result["samples_per_sec"] > 0
+        assert result["peak_bytes"] >= 0
+    # the pure Python backend only gets the first samples
+    assert all(r["samples"] <= 64 for r in results if r["backend"] == "pyaudioop")
+
+
+def test_bench_compare(tmp_path):
+    status, baseline = _run(
+        tmp_path, "base.json", "--ops", "rms", "--backends", "numpy"
+    )
+    assert status == 0
+    report = json.loads(baseline.read_text())
+    ratios, regressed = bench.compare(report["results"], report["results"])
+    assert len(ratios) == len(report["results"]) == 4
+    assert not regressed
+
+    for result in report["results"]:
+        result["samples_per_sec"] *= 100
+    baseline.write_text(json.dumps(report))
+    status, _ = _run(
+        tmp_path,
+        "new.json",
+        "--ops",
+        "rms",
+        "--backends",
+        "numpy",
+        "--compare",
+        str(baseline),
+    )
+    assert status == 1
+
+    with pytest.raises(SystemExit):
+        bench.main(["--ops", "nonexistent"])
+
+
+def test_bench_mix_cases(tmp_path):
+    status, out = _run(tmp_path, "mix.json", "--ops", "mix", "upmix")
+    assert status == 0
+    cases = {
+        (r["op"], r["backend"], r["width"], r["channels"])
+        for r in json.loads(out.read_text())["results"]
+    }
+    for backend in ("numpy", "pyaudioop"):
+        assert ("mix", backend, 2, 2) in cases
+        assert ("upmix", backend, 1, 1) in cases
+    # only mono sources are upmixed
+    assert ("upmix", "numpy", 2, 2) not in cases
+
+
+def test_bench_without_fixtures(tmp_path):
+    status, out = _run(
+        tmp_path, "run.json", "--ops", "rms", "--sounds", str(tmp_path / "missing")
+    )
+    assert status == 0
+    results = json.loads(out.read_text())["results"]
+    assert results
+    assert not any(r["source"].startswith("sounds/") for r in results)
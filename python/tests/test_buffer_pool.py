@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from audio_exp import BufferPool
+from audio_exp.audio_segment import AudioSegment
+
+
+def test_buffers_are_reused():
+    pool = BufferPool()
+    a = pool.acquire((1000, 2), np.int16)
+    assert a.shape == (1000, 2) and a.dtype == np.int16
+    pool.release(a)
+    # same size bucket, other shape and dtype
+    b = pool.acquire(900, np.float32)
+    assert b.shape == (900,) and b.dtype == np.float32
+    assert np.shares_memory(a, b)
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["leased_bytes"] == 4096 and stats["free_bytes"] == 0
+
+    # views of an acquired array release it too
+    pool.release(b[10:20])
+    assert pool.stats()["free_bytes"] == 4096
+
+
+def test_release_checks_ownership():
+    pool = BufferPool()
+    with pytest.raises(ValueError):
+        pool.release(np.empty(10))
+    a = pool.acquire(10, np.int16)
+    pool.release(a)
+    with pytest.raises(ValueError):
+        pool.release(a)
+
+
+def test_lru_trimming():
+    pool = BufferPool(max_bytes=3 * 8192)
+    buffers = [pool.acquire(8192, np.uint8) for _ in range(4)]
+    for buffer in buffers:
+        pool.release(buffer)
+    stats = pool.stats()
+    assert stats["trimmed"] == 1 and stats["free_bytes"] == 3 * 8192
+    # the least recently released buffer was freed
+    assert not any(
+        np.shares_memory(buffers[0], pool.acquire(8192, np.uint8)) for _ in range(3)
+    )
+
+    pool.clear()
+    assert pool.stats()["free_bytes"] == 0
+
+
+def test_chunked_pipeline_allocates_once():
+    pool = BufferPool()
+    rng = np.random.default_rng(0)
+    data = rng.integers(-20000, 20000, size=47000, dtype=np.int16)
+    sound = AudioSegment(data=data, channels=2, sample_width=2, frame_rate=8000)
+    chunks = []
+    for chunk in sound[::500]:
+        out = pool.acquire(chunk._data.shape, np.float32)
+        chunks.append(chunk.apply_gain(-6).to_float(out=out)._data.copy())
+        pool.release(out)
+    # one buffer is enough, the shorter last chunk fits in it too
+    assert pool.stats()["misses"] == 1
+    expected = sound.apply_gain(-6).to_float()._data
+    assert (np.concatenate(chunks) == expected).all()
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from audio_exp import (
+    add_inplace,
+    bias_inplace,
+    clip_inplace,
+    deinterleave,
+    float_to_int,
+    gain_inplace,
+    int_to_float,
+    interleave,
+    npaudioop,
+)
+
+# (container, sample width) pairs the kernels take
+CONTAINERS = [(np.int16, 2), (np.int32, 3), (np.int32, 4)]
+
+
+def _signal(dtype, width, shape=(1000, 2), seed=0):
+    rng = np.random.default_rng(seed)
+    lo, hi = npaudioop._bounds(width)
+    return rng.integers(lo, hi, size=shape, endpoint=True).astype(dtype)
+
+
+@pytest.mark.parametrize("dtype,width", CONTAINERS)
+@pytest.mark.parametrize("factor", [0.3, 1.7, -2.0])
+def test_gain_matches_npaudioop(dtype, width, factor):
+    samples = _signal(dtype, width)
+    expected = npaudioop.mul(samples, width, factor)
+    gain_inplace(samples, width, factor)
+    assert samples.dtype == dtype
+    np.testing.assert_array_equal(samples, expected)
+
+
+@pytest.mark.parametrize("dtype,width", CONTAINERS)
+def test_add_and_bias_match_npaudioop(dtype, width):
+    samples = _signal(dtype, width)
+    other = _signal(dtype, width, seed=1)
+    expected = npaudioop.add(samples, other, width)
+    add_inplace(samples, other, width)
+    np.testing.assert_array_equal(samples, expected)
+
+    expected = npaudioop.bias(samples, width, 12345)
+    bias_inplace(samples, width, 12345)
+    np.testing.assert_array_equal(samples, expected)
+
+
+def test_float_kernels_are_not_clipped():
+    samples = np.array([0.5, -0.75, 0.25], dtype=np.float32)
+    gain_inplace(samples, 4, 2.0)
+    add_inplace(samples, np.full(3, 0.5, dtype=np.float32), 4)
+    bias_inplace(samples, 4, -0.25)
+    np.testing.assert_array_equal(samples, [1.25, -1.25, 0.75])
+    clip_inplace(samples, -1.0, 1.0)
+    np.testing.assert_array_equal(samples, [1.0, -1.0, 0.75])
+
+
+def test_kernels_work_on_views():
+    samples = _signal(np.int16, 2, shape=(1000, 2))
+    expected = samples.copy()
+    expected[:, 0] = npaudioop.mul(samples[:, 0], 2, 0.5)
+    gain_inplace(samples[:, 0], 2, 0.5)
+    np.testing.assert_array_equal(samples, expected)
+
+
+def test_interleave_roundtrip():
+    left = np.arange(5, dtype=np.int16)
+    right = -np.arange(3, dtype=np.int16)
+    frames = np.zeros((5, 2), dtype=np.int16)
+    interleave([left, right], frames)
+    assert frames.tolist() == [[0, 0], [1, -1], [2, -2], [3, 0], [4, 0]]
+
+    outs = [np.empty(5, dtype=np.int16), np.zeros(5, dtype=np.int16)]
+    deinterleave(frames, outs)
+    np.testing.assert_array_equal(outs[0], left)
+    assert outs[1].tolist() == [0, -1, -2, 0, 0]
+
+
+@pytest.mark.parametrize("dtype,width", CONTAINERS)
+def test_float_conversions_match_npaudioop(dtype, width):
+    samples = _signal(dtype, width)
+    floats = np.empty(samples.shape, dtype=np.float32)
+    int_to_float(samples, width, floats)
+    np.testing.assert_array_equal(floats, npaudioop.lin2float(samples, width))
+
+    floats *= 1.5
+    out = np.empty(samples.shape, dtype=dtype)
+    float_to_int(floats, width, out)
+    np.testing.assert_array_equal(out, npaudioop.float2lin(floats, width))
+
+
+def test_kernel_errors():
+    samples = np.zeros(4, dtype=np.int16)
+    with pytest.raises(ValueError):
+        gain_inplace(samples, 4, 2.0)
+    with pytest.raises(ValueError):
+        add_inplace(samples, np.zeros(3, dtype=np.int16), 2)
+    with pytest.raises(ValueError):
+        clip_inplace(samples, 1.0, -1.0)
+    with pytest.raises(ValueError):
+        float_to_int(np.zeros(4, dtype=np.float32), 4, np.zeros(4, dtype=np.float32))
+    with pytest.raises(ValueError):
+        interleave([samples], np.zeros((4, 2), dtype=np.int16))
+    # an array read by a kernel may not overlap the one it writes
+    with pytest.raises(ValueError):
+        add_inplace(samples, samples, 2)
+    with pytest.raises(ValueError):
+        add_inplace(samples, samples[::-1], 2)
+    frames = np.zeros((4, 2), dtype=np.int16)
+    with pytest.raises(ValueError):
+        interleave([frames[:, 1], frames[:, 0]], frames)
+    # unsigned 8-bit and read-only arrays are not taken
+    with pytest.raises(TypeError):
+        gain_inplace(np.zeros(4, dtype=np.uint8), 1, 2.0)
+    samples.flags.writeable = False
+    with pytest.raises(TypeError):
+        gain_inplace(samples, 2, 2.0)
+    with pytest.raises(TypeError):
+        float_to_int(np.zeros(4, dtype=np.float32), 2, samples)
+    floats = np.zeros(4, dtype=np.float32)
+    floats.flags.writeable = False
+    with pytest.raises(TypeError):
+        int_to_float(np.zeros(4, dtype=np.int16), 2, floats)
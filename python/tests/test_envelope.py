@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from audio_exp import npaudioop
+from audio_exp.audio_segment import AudioSegment
+from audio_exp.envelope import window_count, windowed_envelope
+
+
+def _naive(values, window, hop):
+    rms, peak, zcr = [], [], []
+    for start in range(0, len(values) - window + 1, hop):
+        chunk = values[start : start + window]
+        rms.append(np.sqrt((chunk * chunk).mean(axis=0)))
+        peak.append(np.abs(chunk).max(axis=0))
+        negative = chunk < 0
+        zcr.append((negative[1:] != negative[:-1]).sum(axis=0) / (window - 1))
+    return np.array(rms), np.array(peak), np.array(zcr)
+
+
+@pytest.mark.parametrize("window,hop", [(160, 160), (400, 160), (441, 160), (7, 3)])
+def test_matches_naive(window, hop):
+    rng = np.random.default_rng(window)
+    data = rng.integers(-(2**15), 2**15, size=(5003, 2)).astype("<i2")
+    envelope = windowed_envelope(data, 2, 2, window, hop)
+
+    rms, peak, zcr = _naive(data.astype(np.float64), window, hop)
+    assert envelope.rms.shape == (window_count(5003, window, hop), 2)
+    assert np.allclose(envelope.rms, rms)
+    assert (envelope.peak == peak).all()
+    assert np.allclose(envelope.zcr, zcr)
+    assert np.allclose(envelope.dbfs, 20 * np.log10(rms / 32768))
+
+
+def test_unsigned_and_silence():
+    data = np.full(1000, 128, dtype="u1")
+    data[500:] = 255
+    envelope = windowed_envelope(data, 1, 1, 250)
+    assert envelope.rms[:, 0].tolist() == [0, 0, 127, 127]
+    assert envelope.dbfs[0, 0] == -np.inf
+    assert envelope.peak[-1, 0] == 127
+
+
+def test_audio_segment_envelope():
+    t = np.arange(16000) / 16000
+    tone = np.round(16384 * np.sin(2 * np.pi * 100 * t)).astype("<i2")
+    seg = AudioSegment(tone, channels=1, sample_width=2, frame_rate=16000)
+    envelope = seg.envelope(window_ms=100, hop_ms=50)
+    assert envelope.rms.shape == (19, 1)
+    assert np.allclose(envelope.rms, 16384 / np.sqrt(2), rtol=1e-3)
+    assert np.allclose(envelope.dbfs, 20 * np.log10(0.5 / np.sqrt(2)), atol=0.01)
+    # 100 Hz crosses zero 20 times per 100 ms
+    assert np.allclose(envelope.zcr * 1599, 20, atol=1)
+    assert envelope.peak.max() == npaudioop.max(tone, 2)
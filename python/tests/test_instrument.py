@@ -0,0 +1,115 @@
+import logging
+import os
+
+import numpy as np
+import pytest
+
+import audio_exp
+from audio_exp import instrument
+from audio_exp.audio_segment import AudioSegment
+
+from .common import TEST_DIR
+
+SOUND = os.path.join(TEST_DIR, "44100_pcm16_stereo.wav")
+
+
+@pytest.fixture
+def counting():
+    audio_exp.reset_stats()
+    audio_exp.enable_stats()
+    yield
+    audio_exp.enable_stats(False)
+    audio_exp.reset_stats()
+
+
+def test_disabled_by_default():
+    audio_exp.reset_stats()
+    AudioSegment.from_file(SOUND).apply_gain(-3)
+    assert audio_exp.stats() == {}
+
+
+def test_segment_ops_are_counted(counting, tmp_path):
+    sound = AudioSegment.from_file(SOUND)
+    quieter = sound.apply_gain(-3)
+    quieter.export(str(tmp_path / "out.wav"))
+    quieter.export(str(tmp_path / "out.wav"))
+
+    stats = audio_exp.stats()
+    assert stats["AudioSegment.from_file"]["calls"] == 1
+    assert stats["AudioSegment.from_file"]["samples"] == sound._data.size
+    assert stats["AudioSegment.apply_gain"]["samples"] == sound._data.size
+    export = stats["AudioSegment.export"]
+    assert export["calls"] == 2
+    assert export["bytes_written"] == 2 * 2 * sound._data.size
+    assert export["seconds"] >= 0
+    assert set(export) == set(instrument.FIELDS)
+    # the extension counts its own calls, under the name of the function
+    # `from_file` calls
+    assert stats["read_wav_file"]["calls"] == 1
+    assert stats["read_wav_file"]["samples"] == sound._data.size
+
+
+def test_frame_reads_are_counted(counting):
+    sound = AudioSegment.from_file_frames(SOUND, start_frame=100, n_frames=1000)
+    stats = audio_exp.stats()
+    assert stats["AudioSegment.from_file_frames"]["calls"] == 1
+    assert stats["read_wav_frames"]["calls"] == 1
+    assert stats["read_wav_frames"]["samples"] == sound._data.size == 2000
+
+
+def test_float_export_counts_written_width(counting, tmp_path):
+    sound = AudioSegment.from_file(SOUND).to_float()
+    sound.export(str(tmp_path / "out.wav"), sample_width=2)
+    stats = audio_exp.stats()
+    # converting back to int is counted, but not as a second export
+    assert stats["AudioSegment.to_int"]["calls"] == 1
+    assert stats["AudioSegment.export"]["calls"] == 1
+    assert stats["AudioSegment.export"]["bytes_written"] == 2 * sound._data.size
+
+
+def test_lazy_work_is_counted_when_run(counting):
+    sound = AudioSegment.from_file(SOUND)
+    lazy = sound.lazy().apply_gain(-3).set_channels(1)
+    stats = audio_exp.stats()
+    # recording a transform does no work on the samples
+    assert stats["AudioSegment.set_channels"]["samples"] == 0
+    assert "TransformPlan.run" not in stats
+
+    lazy._data
+    stats = audio_exp.stats()
+    assert stats["TransformPlan.run"]["calls"] == 1
+    assert stats["TransformPlan.run"]["samples"] == sound.frame_count()
+
+
+def test_stats_reset(counting):
+    AudioSegment.from_file(SOUND)
+    assert audio_exp.stats(reset=True)
+    assert audio_exp.stats() == {}
+    AudioSegment.from_file(SOUND)
+    audio_exp.reset_stats()
+    assert audio_exp.stats() == {}
+
+
+def test_counted_decorator(counting):
+    @instrument.counted("test.double", io=lambda result, x: {"bytes_read": x.nbytes})
+    def double(x):
+        return x * 2
+
+    x = np.arange(10, dtype=np.int16)
+    assert np.array_equal(double(x), x * 2)
+    assert double.__name__ == "double"
+    entry = audio_exp.stats()["test.double"]
+    assert (entry["calls"], entry["bytes_read"], entry["samples"]) == (1, 20, 0)
+
+
+def test_sync_log_level(monkeypatch):
+    levels = []
+    monkeypatch.setattr(instrument, "_set_lowlevel_log_level", levels.append)
+    logger = logging.getLogger("audio_exp._lowlevel")
+    previous = logger.level
+    try:
+        logger.setLevel(logging.DEBUG)
+        instrument.sync_log_level()
+    finally:
+        logger.setLevel(previous)
+    assert levels == [logging.DEBUG]
@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+
+from audio_exp import lazy
+from audio_exp.audio_segment import AudioSegment
+
+
+def _stereo(n_frames=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.integers(-20000, 20000, size=2 * n_frames).astype("<i2")
+    return AudioSegment(data, channels=2, sample_width=2, frame_rate=44100)
+
+
+@pytest.mark.parametrize(
+    "transform",
+    [
+        lambda seg: seg.apply_gain(-3),
+        lambda seg: seg.apply_gain(12),
+        lambda seg: seg.set_channels(1),
+        lambda seg: seg.set_sample_width(1),
+        lambda seg: seg.set_sample_width(4),
+        lambda seg: seg.set_frame_rate(16000),
+    ],
+)
+def test_single_step_matches_eager(transform):
+    seg = _stereo()
+    eager = transform(seg)
+    result = transform(seg.lazy())
+    assert result._plan.steps
+    assert (result.channels, result.sample_width, result.frame_rate) == (
+        eager.channels,
+        eager.sample_width,
+        eager.frame_rate,
+    )
+    assert result._data.dtype == eager._data.dtype
+    assert np.array_equal(result._data, eager._data)
+
+
+def test_chain_is_deferred_and_fused(monkeypatch):
+    seg = _stereo()
+    runs = []
+    run = lazy.TransformPlan.run
+
+    def counting(plan, source):
+        runs.append(len(plan.steps))
+        return run(plan, source)
+
+    monkeypatch.setattr(lazy.TransformPlan, "run", counting)
+    # several blocks, so the resampler state crosses block boundaries
+    monkeypatch.setattr(lazy, "BLOCK_FRAMES", 4096)
+
+    chained = seg.lazy().set_frame_rate(16000).set_channels(1).apply_gain(-3)
+    assert runs == []
+    assert chained.channels == 1 and chained.frame_rate == 16000
+
+    eager = seg.set_frame_rate(16000).set_channels(1).apply_gain(-3)
+    assert len(chained._data) == len(eager._data)
+    assert runs == [3]
+    # only the intermediate rounding differs
+    assert np.abs(chained._data.astype(int) - eager._data).max() <= 1
+
+    # materialized once, later transforms start from the result
+    chained.apply_gain(0)._data
+    assert runs == [3, 1]
+
+
+def test_lazy_export():
+    seg = _stereo(100)
+    out = io.BytesIO()
+    seg.lazy().set_sample_width(1).export(out)
+    out.seek(0)
+    assert len(out.getvalue()) == 44 + 200
@@ -0,0 +1,457 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from audio_exp import npaudioop
+
+
+def _signal(width, n=4096, seed=0):
+    rng = np.random.default_rng(seed)
+    lo, hi = npaudioop._bounds(width)
+    return rng.integers(lo, hi, size=n, endpoint=True).astype(
+        "<i2" if width == 2 else "<i4" if width == 4 else "i1"
+    )
+
+
+def test_mul_saturates():
+    data = np.array([0, 1000, -1000, 30000, -30000], dtype="<i2")
+    result = npaudioop.mul(data, 2, 2.0)
+    assert result.dtype == data.dtype
+    assert result.tolist() == [0, 2000, -2000, 32767, -32768]
+
+
+def test_mul_unsigned_8bit_is_centred():
+    data = np.array([128, 138, 118, 255, 0], dtype="u1")
+    result = npaudioop.mul(data, 1, 2.0)
+    assert result.dtype == np.uint8
+    assert result.tolist() == [128, 148, 108, 255, 0]
+
+
+def test_mul_24bit_clips_to_24bit_range():
+    data = np.array([2**22, -(2**22), 5], dtype="<i4")
+    result = npaudioop.mul(data, 3, 4.0)
+    assert result.tolist() == [2**23 - 1, -(2**23), 20]
+
+
+def test_add_and_bias():
+    a = np.array([32000, -32000, 5], dtype="<i2")
+    b = np.array([1000, -1000, 5], dtype="<i2")
+    assert npaudioop.add(a, b, 2).tolist() == [32767, -32768, 10]
+    # bias wraps around instead of clipping
+    assert npaudioop.bias(a, 2, 1000).tolist() == [-32536, -31000, 1005]
+
+    with pytest.raises(npaudioop.error):
+        npaudioop.add(a, b[:2], 2)
+
+
+def test_channel_conversion():
+    stereo = np.array([100, 300, -100, -300], dtype="<i2")
+    assert npaudioop.tomono(stereo, 2, 0.5, 0.5).tolist() == [200, -200]
+
+    mono = np.array([1, -2], dtype="<i2")
+    assert npaudioop.tostereo(mono, 2, 1, 1).tolist() == [1, 1, -2, -2]
+    assert npaudioop.tostereo(mono.reshape(-1, 1), 2, 1, 1).shape == (2, 2)
+
+
+def test_mix():
+    frames = np.array([[100, 200, 300], [-100, 0, 100]], dtype="<i2")
+    matrix = [[1, 0], [0, 1], [0.5, 0.5]]
+    assert npaudioop.mix(frames, 2, matrix).tolist() == [[250, 350], [-50, 50]]
+    assert npaudioop.mix(frames.reshape(-1), 2, matrix).tolist() == [250, 350, -50, 50]
+    with pytest.raises(npaudioop.error):
+        npaudioop.mix(frames.reshape(-1)[:5], 2, matrix)
+
+    # same as tomono/tostereo, 8-bit stays centred on 128
+    data = _signal(2)
+    assert (
+        npaudioop.mix(data, 2, [[0.5], [0.5]]).tolist()
+        == npaudioop.tomono(data, 2, 0.5, 0.5).tolist()
+    )
+    unsigned = np.array([128, 138, 0], dtype="u1")
+    assert npaudioop.mix(unsigned, 1, [[1, 2]]).tolist() == [128, 128, 138, 148, 0, 0]
+
+
+def test_mixing_matrix():
+    assert npaudioop.mixing_matrix(2, 2).tolist() == [[1, 0], [0, 1]]
+    assert npaudioop.mixing_matrix(1, 3).tolist() == [[1, 1, 1]]
+    assert npaudioop.mixing_matrix(2, 1).tolist() == [[0.5], [0.5]]
+    assert npaudioop.mixing_matrix(7, 1).shape == (7, 1)
+    surround = npaudioop.mixing_matrix(6, 2)
+    assert surround[3].tolist() == [0, 0]
+    assert surround[2] == pytest.approx([0.5**0.5] * 2)
+    assert npaudioop.mixing_matrix(6, 1)[:, 0] == pytest.approx(surround.mean(axis=1))
+    with pytest.raises(npaudioop.error):
+        npaudioop.mixing_matrix(2, 6)
+
+
+def test_float_conversion():
+    data = np.array([0, 255, 128, 64], dtype="u1")
+    as_float = npaudioop.lin2float(data, 1)
+    assert as_float.dtype == np.float32
+    assert as_float.tolist() == [-1.0, 127 / 128, 0.0, -0.5]
+    assert npaudioop.float2lin(as_float, 1).tolist() == data.tolist()
+    assert npaudioop.float2lin(np.array([1.5, -2.0, 0.49 / 128]), 1).tolist() == [
+        255,
+        0,
+        128,
+    ]
+    wide = _signal(4, n=16)
+    restored = npaudioop.float2lin(npaudioop.lin2float(wide, 4, np.float64), 4)
+    assert restored.tolist() == wide.tolist()
+    with pytest.raises(npaudioop.error):
+        npaudioop.float2lin(data, 1)
+
+    # float samples are kept in float, without clipping
+    values = np.array([0.75, -0.5], dtype=np.float32)
+    assert npaudioop.mul(values, 4, 2.0).tolist() == [1.5, -1.0]
+    assert npaudioop.add(values, values, 4).dtype == np.float32
+    assert npaudioop.tomono(values, 4, 1, 1).tolist() == [0.25]
+    assert npaudioop.bias(values, 4, 0.5).tolist() == [1.25, 0.0]
+    # float samples have no width, they are quantized like `float2lin`
+    assert npaudioop.lin2lin(values, 4, 2).tolist() == [24576, -16384]
+    with pytest.raises(npaudioop.error):
+        npaudioop.lin2float(values, 4)
+
+
+def test_reverse_frames():
+    frames = np.arange(6, dtype="<i2").reshape(3, 2)
+    assert npaudioop.reverse(frames, 2).tolist() == [[4, 5], [2, 3], [0, 1]]
+
+
+def test_lin2lin():
+    data = np.array([0, 255, 128], dtype="u1")
+    wide = npaudioop.lin2lin(data, 1, 2)
+    assert wide.dtype == np.int16
+    assert wide.tolist() == [-32768, 32512, 0]
+    assert npaudioop.lin2lin(wide, 2, 1).tolist() == data.tolist()
+
+    assert npaudioop.lin2lin(np.array([-1, 1 << 8], dtype="<i4"), 3, 2).tolist() == [
+        -1,
+        1,
+    ]
+
+
+# (op, fragment, width, args) of the ops taking `out=`
+_OUT_CASES = [
+    ("mul", "<i2", 2, (0.7,)),
+    ("mul", "u1", 1, (1.3,)),
+    ("mix", "<i2", 2, ([[0.5], [0.5]],)),
+    ("mix", "<f4", 4, ([[1.0, 0.5], [0.0, 0.5]],)),
+    ("lin2lin", "<i2", 2, (4,)),
+    ("lin2lin", "<i4", 4, (1,)),
+    ("lin2lin", "u1", 1, (3,)),
+    ("lin2float", "<i4", 3, ()),
+    ("lin2float", "u1", 1, ()),
+    ("float2lin", "<f4", 2, ()),
+]
+
+
+def _out_fragment(dtype, width, n):
+    if np.dtype(dtype).kind == "f":
+        return np.random.default_rng(0).uniform(-1.2, 1.2, size=n).astype(dtype)
+    lo, hi = npaudioop._bounds(width)
+    values = np.random.default_rng(0).integers(lo, hi, size=n, endpoint=True)
+    return (values + npaudioop._offset(np.empty(0, dtype), width)).astype(dtype)
+
+
+@pytest.mark.parametrize("op,dtype,width,args", _OUT_CASES)
+def test_out_matches_result(op, dtype, width, args):
+    fragment = _out_fragment(dtype, width, 3 * npaudioop._BLOCK_SAMPLES + 10)
+    func = getattr(npaudioop, op)
+    expected = func(fragment, width, *args)
+    out = np.empty_like(expected)
+    assert func(fragment, width, *args, out=out) is out
+    np.testing.assert_array_equal(out, expected)
+    with pytest.raises(npaudioop.error):
+        func(fragment, width, *args, out=np.empty(expected.shape, np.float64))
+
+
+@pytest.mark.parametrize("op,dtype,width,args", _OUT_CASES)
+def test_out_allocates_no_result_sized_array(op, dtype, width, args):
+    fragment = _out_fragment(dtype, width, 1 << 20)
+    func = getattr(npaudioop, op)
+    # the result of the first two samples, one frame for `mix`
+    head = func(fragment[:2], width, *args)
+    out = np.empty(head.size * (len(fragment) // 2), head.dtype)
+    tracemalloc.start()
+    try:
+        func(fragment, width, *args, out=out)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < out.nbytes / 2
+
+
+def test_analysis():
+    data = np.array([3, -4, 0, 5, -2], dtype="<i2")
+    assert npaudioop.max(data, 2) == 5
+    assert npaudioop.minmax(data, 2) == (-4, 5)
+    assert npaudioop.avg(data, 2) == 0
+    assert npaudioop.rms(data, 2) == 3
+    assert npaudioop.cross(data, 2) == 3
+
+
+def test_float_analysis():
+    data = np.array([3, -4, 0, 5, -2, 7, -1, 2], dtype="<i2")
+    values = npaudioop.lin2float(data, 2)
+    scale = 1 / 32768
+    assert npaudioop.getsample(values, 4, 1) == -4 * scale
+    assert npaudioop.max(values, 4) == 7 * scale
+    assert npaudioop.minmax(values, 4) == (-4 * scale, 7 * scale)
+    assert npaudioop.avg(values, 4) == pytest.approx(data.mean() * scale)
+    assert npaudioop.rms(values, 4) == pytest.approx(
+        np.sqrt(np.mean(data.astype(float) ** 2)) * scale
+    )
+    assert npaudioop.cross(values, 4) == npaudioop.cross(data, 2)
+    for op in (npaudioop.max, npaudioop.avg, npaudioop.rms):
+        assert isinstance(op(values, 4), float)
+        assert op(values[:0], 4) == 0.0
+
+    signal = _signal(2, n=400)
+    assert npaudioop.findmax(npaudioop.lin2float(signal, 2), 30) == npaudioop.findmax(
+        signal, 30
+    )
+    offset, factor = npaudioop.findfit(
+        npaudioop.lin2float(signal, 2), npaudioop.lin2float(signal[100:150], 2)
+    )
+    assert (offset, factor) == (100, pytest.approx(1.0))
+
+    # encoded from their 16-bit rounding
+    assert (
+        npaudioop.lin2ulaw(values, 4).tolist() == npaudioop.lin2ulaw(data, 2).tolist()
+    )
+    assert (
+        npaudioop.lin2alaw(values, 4).tolist() == npaudioop.lin2alaw(data, 2).tolist()
+    )
+
+
+def test_rejects_narrow_containers():
+    with pytest.raises(npaudioop.error):
+        npaudioop.mul(np.zeros(4, dtype="<i2"), 3, 1.0)
+
+
+@pytest.mark.parametrize("width", [1, 2, 4])
+def test_matches_audioop(width):
+    audioop = pytest.importorskip("audioop")
+    data = _signal(width)
+    raw = data.tobytes()
+
+    def same(result, expected):
+        return result.tobytes() == expected
+
+    assert same(npaudioop.mul(data, width, 0.7), audioop.mul(raw, width, 0.7))
+    assert same(npaudioop.mul(data, width, 3.0), audioop.mul(raw, width, 3.0))
+    assert same(
+        npaudioop.add(data, data[::-1], width),
+        audioop.add(raw, data[::-1].tobytes(), width),
+    )
+    assert same(npaudioop.bias(data, width, 1000), audioop.bias(raw, width, 1000))
+    assert same(npaudioop.reverse(data, width), audioop.reverse(raw, width))
+    assert same(
+        npaudioop.tomono(data, width, 0.5, 0.5), audioop.tomono(raw, width, 0.5, 0.5)
+    )
+    assert same(
+        npaudioop.tostereo(data, width, 1, 0.3), audioop.tostereo(raw, width, 1, 0.3)
+    )
+    for newwidth in {1, 2, 4} - {width}:
+        if newwidth == 1:
+            # 8-bit output is unsigned like WAV data, audioop keeps it signed
+            expected = audioop.bias(audioop.lin2lin(raw, width, 1), 1, 128)
+        else:
+            expected = audioop.lin2lin(raw, width, newwidth)
+        assert same(npaudioop.lin2lin(data, width, newwidth), expected)
+
+    assert npaudioop.max(data, width) == audioop.max(raw, width)
+    assert npaudioop.minmax(data, width) == audioop.minmax(raw, width)
+    assert npaudioop.avg(data, width) == audioop.avg(raw, width)
+    assert npaudioop.rms(data, width) == audioop.rms(raw, width)
+    assert npaudioop.cross(data, width) == audioop.cross(raw, width)
+
+
+def _naive_findfit(frames, reference):
+    # `audioop.findfit` over (frames, channels) arrays
+    a = frames.astype(np.float64)
+    r = reference.astype(np.float64)
+    sum_ri_2 = np.sum(r * r)
+    best = None
+    for i in range(len(a) - len(r) + 1):
+        window = a[i : i + len(r)]
+        sum_aij_2 = np.sum(window * window)
+        sum_aij_ri = np.sum(window * r)
+        result = (sum_ri_2 * sum_aij_2 - sum_aij_ri**2) / sum_aij_2
+        if best is None or result < best[0]:
+            best = result, i, sum_aij_ri / sum_ri_2
+    return best[1], best[2]
+
+
+@pytest.mark.parametrize("width,channels", [(1, 1), (2, 1), (2, 2), (4, 1), (3, 3)])
+def test_findfit_matches_naive(width, channels):
+    rng = np.random.default_rng(width * 10 + channels)
+    lo, hi = npaudioop._bounds(width)
+    dtype = npaudioop._DTYPES[width]
+    offset = npaudioop._offset(np.empty(0, dtype=dtype), width)
+    signal = rng.integers(lo // 4, hi // 4, size=(500, channels)) + offset
+    frames = signal.astype(dtype)
+    reference = (signal[321:361] - offset) // 2 + offset
+    reference = reference.astype(dtype)
+
+    result = npaudioop.findfit(frames, reference, width)
+    assert result[0] == 321
+    assert result == pytest.approx(
+        _naive_findfit(frames.astype(float) - offset, reference.astype(float) - offset)
+    )
+    if channels == 1:
+        assert (
+            npaudioop.findfit(frames.reshape(-1), reference.reshape(-1), width)[0]
+            == 321
+        )
+
+
+def test_findfit_overlap_save_blocks(monkeypatch):
+    # force many FFT blocks and several batches
+    monkeypatch.setattr(npaudioop, "_MIN_FFT", 64)
+    monkeypatch.setattr(npaudioop, "_BATCH_FRAMES", 100)
+    rng = np.random.default_rng(1)
+    frames = rng.integers(-1000, 1000, size=(3000, 2)).astype("<i2")
+    reference = frames[2047:2077] * 3
+    offset, factor = npaudioop.findfit(frames, reference, 2)
+    assert offset == 2047
+    assert factor == pytest.approx(1 / 3)
+    assert (offset, factor) == pytest.approx(_naive_findfit(frames, reference))
+
+
+def test_findfits_top_k():
+    rng = np.random.default_rng(2)
+    frames = rng.integers(-50, 50, size=4000).astype("<i2")
+    pattern = rng.integers(-10000, 10000, size=100)
+    for start, gain in [(300, 1.0), (2500, 0.5), (3700, 0.8)]:
+        frames[start : start + 100] = (pattern * gain).astype("<i2")
+
+    fits = npaudioop.findfits(frames, pattern.astype("<i2"), 3)
+    assert [offset for offset, _ in fits] == [300, 3700, 2500]
+    assert [factor for _, factor in fits] == pytest.approx([1.0, 0.8, 0.5], abs=1e-3)
+    assert fits[0] == npaudioop.findfit(frames, pattern.astype("<i2"))
+    # neighbours of a match are ruled out up to `min_distance`
+    assert len(npaudioop.findfits(frames[:500], pattern.astype("<i2"), 10)) == 4
+    close = npaudioop.findfits(frames, pattern.astype("<i2"), 2, min_distance=1)
+    assert [offset for offset, _ in close][0] == 300
+
+
+def test_findfactor_and_findmax():
+    data = np.array([10, -20, 30, 0], dtype="<i2")
+    assert npaudioop.findfactor(data * 2, data) == pytest.approx(2.0)
+    assert npaudioop.findfactor(
+        np.array([[1, 2], [3, 4]], dtype="<i4"), np.array([[2, 4], [6, 8]], "<i4"), 4
+    ) == pytest.approx(0.5)
+    with pytest.raises(npaudioop.error):
+        npaudioop.findfactor(data, data[:2])
+
+    loud = np.array([1, 1, 5, -6, 1, 7, -7, 0], dtype="<i2")
+    assert npaudioop.findmax(loud, 2) == 5
+    assert npaudioop.findmax(loud.reshape(-1, 2), 1) == 1
+    assert npaudioop.findmax(loud, 0) == 0
+    with pytest.raises(npaudioop.error):
+        npaudioop.findmax(loud, 9)
+    with pytest.raises(npaudioop.error):
+        npaudioop.findfit(loud[:2], loud)
+
+
+def test_find_matches_audioop():
+    audioop = pytest.importorskip("audioop")
+    data = _signal(2, n=600)
+    reference = data[100:140] // 3
+    assert npaudioop.findfit(data, reference) == pytest.approx(
+        audioop.findfit(data.tobytes(), reference.tobytes())
+    )
+    assert npaudioop.findfactor(data[:40], reference) == pytest.approx(
+        audioop.findfactor(data[:40].tobytes(), reference.tobytes())
+    )
+    assert npaudioop.findmax(data, 40) == audioop.findmax(data.tobytes(), 40)
+
+
+def test_g711_known_codes():
+    data = np.array([0, -1, 32767, -32768, 1000], dtype="<i2")
+    assert npaudioop.lin2ulaw(data, 2).tolist() == [255, 126, 128, 0, 206]
+    assert npaudioop.lin2alaw(data, 2).tolist() == [213, 85, 170, 42, 250]
+    assert npaudioop.ulaw2lin(np.array([255, 128, 0], dtype="u1"), 2).tolist() == [
+        0,
+        32124,
+        -32124,
+    ]
+    # 8-bit output is centred on 128, 2-d layouts are kept
+    codes = npaudioop.lin2ulaw(data[:4].reshape(2, 2), 2)
+    assert codes.shape == (2, 2)
+    assert npaudioop.ulaw2lin(codes, 1).dtype == np.uint8
+    with pytest.raises(npaudioop.error):
+        npaudioop.alaw2lin(data, 2)
+
+
+@pytest.mark.parametrize("width", [1, 2, 4])
+def test_g711_matches_audioop(width):
+    audioop = pytest.importorskip("audioop")
+    from audio_exp.legacy_compatible import pyaudioop
+
+    data = _signal(width, n=65536)
+    raw = data.tobytes()
+    codes = np.arange(256, dtype="u1")
+    for encode, decode in [("lin2ulaw", "ulaw2lin"), ("lin2alaw", "alaw2lin")]:
+        expected = getattr(audioop, encode)(raw, width)
+        assert getattr(npaudioop, encode)(data, width).tobytes() == expected
+        assert getattr(pyaudioop, encode)(raw, width) == expected
+
+        expected = getattr(audioop, decode)(codes.tobytes(), width)
+        assert getattr(pyaudioop, decode)(codes.tobytes(), width) == expected
+        if width == 1:
+            # 8-bit output is unsigned like WAV data, audioop keeps it signed
+            expected = audioop.bias(expected, 1, 128)
+        assert getattr(npaudioop, decode)(codes, width).tobytes() == expected
+
+
+@pytest.mark.parametrize("width", [1, 2, 4])
+def test_adpcm_matches_audioop(width):
+    audioop = pytest.importorskip("audioop")
+    from audio_exp.legacy_compatible import pyaudioop
+
+    data = _signal(width, n=5001)
+    expected, expected_state = audioop.lin2adpcm(data.tobytes(), width, None)
+    assert pyaudioop.lin2adpcm(data.tobytes(), width, None) == (
+        expected,
+        expected_state,
+    )
+
+    # the state carried from chunk to chunk continues the stream
+    state = None
+    chunks = []
+    for start in range(0, len(data), 1000):
+        codes, state = npaudioop.lin2adpcm(data[start : start + 1000], width, state)
+        chunks.append(codes)
+    assert np.concatenate(chunks).tobytes() == expected
+    assert state == expected_state
+
+    decoded, decoded_state = audioop.adpcm2lin(expected, width, None)
+    assert pyaudioop.adpcm2lin(expected, width, None) == (decoded, decoded_state)
+    if width == 1:
+        decoded = audioop.bias(decoded, 1, 128)
+    codes = np.frombuffer(expected, "u1")
+    first, state = npaudioop.adpcm2lin(codes[:999], width)
+    rest, state = npaudioop.adpcm2lin(codes[999:], width, state)
+    assert np.concatenate([first, rest]).tobytes() == decoded
+    assert state == decoded_state
+
+
+def test_adpcm_state_and_layout():
+    data = np.array([[0, 100], [2000, -3000], [30000, -32768]], dtype="<i2")
+    codes, state = npaudioop.lin2adpcm(data, 2)
+    assert codes.dtype == np.uint8 and len(codes) == 3
+    # 2-d fragments are read as the interleaved stream
+    flat_codes, flat_state = npaudioop.lin2adpcm(data.reshape(-1), 2)
+    assert (flat_codes == codes).all() and flat_state == state
+    decoded, _ = npaudioop.adpcm2lin(codes, 1)
+    assert decoded.dtype == np.uint8 and len(decoded) == 6
+    with pytest.raises(ValueError):
+        npaudioop.lin2adpcm(data, 2, (0, 89))
+    with pytest.raises(ValueError):
+        npaudioop.adpcm2lin(codes, 2, (40000, 0))
+    with pytest.raises(npaudioop.error):
+        npaudioop.adpcm2lin(data, 2)
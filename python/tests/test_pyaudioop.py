@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from audio_exp.legacy_compatible import pyaudioop
+
+audioop = pytest.importorskip("audioop")
+
+# 24-bit samples are not handled by `pyaudioop`
+WIDTHS = [1, 2, 4]
+
+
+def _fragment(width, n=999, seed=0):
+    # signed samples of `width` bytes covering the whole range, as bytes
+    rng = np.random.default_rng(seed)
+    half = 1 << (8 * width - 1)
+    values = rng.integers(-half, half, size=n)
+    values[:2] = -half, half - 1
+    return values.astype("<i{}".format(width)).tobytes()
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("newwidth", WIDTHS)
+def test_lin2lin_matches_audioop(width, newwidth):
+    fragment = _fragment(width)
+    assert pyaudioop.lin2lin(fragment, width, newwidth) == audioop.lin2lin(
+        fragment, width, newwidth
+    )
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("factors", [(0.5, 0.5), (1.0, -0.3), (0.7, 1.6)])
+def test_tomono_tostereo_match_audioop(width, factors):
+    stereo = _fragment(width, n=1000)
+    assert pyaudioop.tomono(stereo, width, *factors) == audioop.tomono(
+        stereo, width, *factors
+    )
+    mono = _fragment(width, n=500, seed=1)
+    assert pyaudioop.tostereo(mono, width, *factors) == audioop.tostereo(
+        mono, width, *factors
+    )
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("channels", [1, 2])
+@pytest.mark.parametrize("rates", [(48000, 16000), (8000, 44100), (44100, 48000)])
+def test_ratecv_matches_audioop(width, channels, rates):
+    fragment = _fragment(width, n=channels * 600)
+    expected = audioop.ratecv(fragment, width, channels, *rates, None)
+    assert pyaudioop.ratecv(fragment, width, channels, *rates, None) == expected
+
+    # the state carried from chunk to chunk continues the stream
+    frame_size = width * channels
+    split = 217 * frame_size
+    first, state = pyaudioop.ratecv(fragment[:split], width, channels, *rates, None)
+    second, state = pyaudioop.ratecv(fragment[split:], width, channels, *rates, state)
+    assert first + second == expected[0]
+    assert state == expected[1]
+
+
+def test_ratecv_weights_match_audioop():
+    fragment = _fragment(2, n=800)
+    args = (2, 2, 16000, 8000, None, 3, 1)
+    assert pyaudioop.ratecv(fragment, *args) == audioop.ratecv(fragment, *args)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from audio_exp.audio_segment import AudioSegment
+from audio_exp.resample import QUALITIES, Resampler, resample
+
+
+def _tone(freq, rate, seconds=0.5, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return np.round(amplitude * np.sin(2 * np.pi * freq * t)).astype("<i2")
+
+
+@pytest.mark.parametrize("quality", list(QUALITIES))
+@pytest.mark.parametrize("inrate,outrate", [(44100, 16000), (8000, 22050)])
+def test_resample_tone(quality, inrate, outrate):
+    tone = _tone(440, inrate)
+    result = resample(tone, 2, 1, inrate, outrate, quality)
+    assert result.dtype == tone.dtype
+    assert len(result) == -(-len(tone) * outrate // inrate)
+
+    expected = _tone(440, outrate)[: len(result)]
+    # linear interpolation is off by up to A * (2 pi f / rate) ** 2 / 8
+    tolerance = 200 if quality == "linear" else 5
+    # the edges see the zero padding around the fragment
+    error = result[100:-100].astype(int) - expected[100:-100]
+    assert np.abs(error).max() <= tolerance
+
+
+def test_resample_removes_aliases():
+    # 12 kHz is above the 8 kHz Nyquist frequency of the output
+    result = resample(_tone(12000, 44100), 2, 1, 44100, 16000, "sinc_medium")
+    assert np.abs(result[100:-100]).max() <= 2
+
+
+def test_resample_keeps_layout():
+    stereo = np.stack([_tone(440, 8000), -_tone(440, 8000)], axis=1)
+    frames = resample(stereo, 2, 2, 8000, 16000)
+    assert frames.shape == (8000, 2)
+    assert (frames[:, 0] == -frames[:, 1]).all()
+    assert (resample(stereo.reshape(-1), 2, 2, 8000, 16000) == frames.reshape(-1)).all()
+
+    unsigned = resample(np.full(100, 128, dtype="u1"), 1, 1, 8000, 16000)
+    assert unsigned.dtype == np.uint8
+    assert (unsigned == 128).all()
+
+
+@pytest.mark.parametrize("chunk", [1, 37, 4096])
+def test_streaming_matches_one_shot(chunk):
+    stereo = np.stack([_tone(440, 44100), _tone(1000, 44100)], axis=1)
+    resampler = Resampler(44100, 16000, channels=2)
+    parts = [
+        resampler.process(stereo[start : start + chunk])
+        for start in range(0, len(stereo), chunk)
+    ]
+    parts.append(resampler.flush())
+    assert np.array_equal(np.concatenate(parts), resample(stereo, 2, 2, 44100, 16000))
+
+
+def test_set_frame_rate():
+    tone = _tone(440, 44100)
+    seg = AudioSegment(tone, channels=1, sample_width=2, frame_rate=44100)
+    converted = seg.set_frame_rate(16000)
+    assert converted.frame_rate == 16000
+    assert len(converted._data) == 8000
+    assert seg.set_frame_rate(44100) is seg
+
+    empty = AudioSegment(tone[:0], channels=1, sample_width=2, frame_rate=44100)
+    assert len(empty.set_frame_rate(16000)._data) == 0
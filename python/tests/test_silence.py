@@ -0,0 +1,96 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from audio_exp.audio_segment import AudioSegment
+from audio_exp.silence import (
+    SilenceDetector,
+    detect_nonsilent,
+    detect_silence,
+    detect_silence_in_file,
+    split_file_on_silence,
+    split_on_silence,
+)
+
+
+def _speech_like(rate=8000):
+    # 1 s silence, 0.5 s noise, 2 s silence, 0.3 s noise, 0.6 s silence
+    rng = np.random.default_rng(0)
+    parts = []
+    for seconds, loud in [
+        (1, False),
+        (0.5, True),
+        (2, False),
+        (0.3, True),
+        (0.6, False),
+    ]:
+        n = int(seconds * rate)
+        parts.append(rng.integers(-8000, 8000, n) if loud else rng.integers(-3, 3, n))
+    data = np.concatenate(parts).astype("<i2")
+    return AudioSegment(data, channels=1, sample_width=2, frame_rate=rate)
+
+
+def _naive_silence(seg, min_silence_len, silence_thresh, seek_step):
+    # pydub's loop, without its extra window aligned on the end
+    data = seg._data.astype(np.float64)
+    limit = 10 ** (silence_thresh / 20) * 32768
+    window = int(seg.frame_count(ms=min_silence_len))
+    hop = int(seg.frame_count(ms=seek_step))
+    ranges = []
+    for start in range(0, len(data) - window + 1, hop):
+        if np.sqrt(np.mean(data[start : start + window] ** 2)) <= limit:
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = start + window
+            else:
+                ranges.append([start, start + window])
+    return ranges
+
+
+@pytest.mark.parametrize("min_silence_len,seek_step", [(500, 1), (300, 7), (1000, 10)])
+def test_matches_naive(min_silence_len, seek_step):
+    seg = _speech_like()
+    expected = _naive_silence(seg, min_silence_len, -40, seek_step)
+    to_ms = lambda frames: round(frames * 1000 / seg.frame_rate)
+    assert detect_silence(seg, min_silence_len, -40, seek_step) == [
+        [to_ms(start), to_ms(end)] for start, end in expected
+    ]
+
+
+def test_streaming_detector_chunks():
+    seg = _speech_like()
+    whole = SilenceDetector(2, 1, 800, 8, -40)
+    whole.process(seg._data)
+    chunked = SilenceDetector(2, 1, 800, 8, -40)
+    for start in range(0, len(seg._data), 777):
+        chunked.process(seg._data[start : start + 777])
+    assert np.array_equal(whole.finish(), chunked.finish())
+
+
+def test_detect_and_split():
+    seg = _speech_like()
+    assert detect_silence(seg, 500, -40, 10) == [[0, 1000], [1500, 3500], [3800, 4400]]
+    assert detect_nonsilent(seg, 500, -40, 10) == [[1000, 1500], [3500, 3800]]
+
+    chunks = split_on_silence(seg, 500, -40, keep_silence=100, seek_step=10)
+    assert [len(chunk) for chunk in chunks] == [700, 500]
+    assert np.shares_memory(chunks[0]._data, seg._data)
+    # padding meets half way between close chunks
+    wide = split_on_silence(seg, 500, -40, keep_silence=1500, seek_step=10)
+    assert [len(chunk) for chunk in wide] == [2500, 1900]
+
+
+def test_split_file_on_silence():
+    seg = _speech_like()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, "speech.wav")
+        seg.export(file_path)
+        silent, n_frames = detect_silence_in_file(file_path, 500, -40, 10)
+        assert n_frames == seg.frame_count()
+        assert (silent // 8).tolist() == [[0, 1000], [1500, 3500], [3800, 4400]]
+
+        ranges = split_file_on_silence(
+            file_path, 500, -40, keep_silence=100, seek_step=10
+        )
+        assert (ranges // 8).tolist() == [[900, 1600], [3400, 3900]]
@@ -1,10 +1,25 @@
 import os
+import struct
 
+import numpy as np
+import pytest
+
+from audio_exp import (
+    AudioStreamReader,
+    WavStreamReader,
+    npaudioop,
+    read_audio_file,
+    read_audio_file_metadata,
+    read_wav_files,
+    read_wav_frames,
+)
 from audio_exp.audio_segment import (
     AudioSegment,
+    PCMEncoding,
     read_wav_file_metadata,
     read_wav_file,
 )
+from audio_exp.wav_mmap import read_wav_header
 
 from .common import TEST_DIR
 
@@ -35,6 +50,248 @@ def test_read_wav_file_stereo_channel():
     assert len(as1._data) == len(as2)
 
 
-# TODO
-# surround sound
-# pcm08, pcm24, pcm32
+@pytest.mark.parametrize(
+    "bits, dtype", [(8, np.uint8), (16, np.int16), (24, np.int32), (32, np.int32)]
+)
+@pytest.mark.parametrize("layout, channels", [("mono", 1), ("surround", 3)])
+def test_read_wav_file_native_dtype(bits, dtype, layout, channels):
+    file_path = os.path.join(TEST_DIR, "8000_pcm{:02d}_{}.wav".format(bits, layout))
+    as1 = AudioSegment.from_file(file_path)
+    assert as1._data.dtype == dtype
+    assert as1.channels == channels
+    assert as1.sample_width == bits // 8
+    assert len(as1._data) == 20000 * channels
+
+    with open(file_path, "rb") as f:
+        raw = f.read()[44:]
+    assert (as1._data == PCMEncoding(bits // 8).decode(raw)).all()
+
+
+def test_stream_reader_blocks():
+    file_path = os.path.join(TEST_DIR, "44100_pcm16_stereo.wav")
+    whole = read_wav_file(file_path, 0)
+
+    reader = WavStreamReader(file_path, block_frames=1000)
+    assert reader.metadata.channels == 2
+    blocks = list(reader)
+    assert all(len(block) == 2000 for block in blocks[:-1])
+    assert reader.position == reader.metadata.duration
+    assert (np.concatenate(blocks) == whole).all()
+
+    reader.seek(10)
+    out = np.zeros(7, dtype=np.int16)
+    # only whole frames are written
+    assert reader.read_into(out) == 3
+    assert (out[:6] == whole[20:26]).all()
+    assert reader.position == 13
+
+
+def test_iter_chunks():
+    file_path = os.path.join(TEST_DIR, "8000_pcm16_mono.wav")
+    whole = read_wav_file(file_path, 0)
+
+    chunks = list(AudioSegment.iter_chunks(file_path, 300))
+    assert [len(chunk._data) for chunk in chunks[:2]] == [2400, 2400]
+    assert chunks[0].frame_rate == 8000
+    assert (np.concatenate([chunk._data for chunk in chunks]) == whole).all()
+
+    total = 0
+    for chunk in AudioSegment.iter_chunks(file_path, 300, reuse_buffer=True):
+        assert (chunk._data == whole[total : total + len(chunk._data)]).all()
+        total += len(chunk._data)
+    assert total == len(whole)
+
+
+def test_from_file_mmap():
+    file_path = os.path.join(TEST_DIR, "44100_pcm16_stereo.wav")
+    as1 = AudioSegment.from_file(file_path)
+    as2 = AudioSegment.from_file(file_path, mmap=True)
+    assert isinstance(as2._data, np.memmap)
+    assert not as2._data.flags.writeable
+    assert (as2.channels, as2.sample_width, as2.frame_rate) == (2, 2, 44100)
+    assert (as1._data == as2._data).all()
+
+    as3 = AudioSegment.from_file(file_path, start_time=500, mmap=True)
+    assert (as3._data == as2._data[44100:]).all()
+
+
+def test_from_file_mmap_skips_extra_chunks():
+    # Bongo_sound.wav carries a `bext` chunk before `fmt `
+    file_path = os.path.join(TEST_DIR, "Bongo_sound.wav")
+    header = read_wav_header(file_path)
+    assert header.channels == 1
+    assert header.frame_count == 212419
+
+    as1 = AudioSegment.from_file(file_path, mmap=True)
+    assert (as1._data == read_wav_file(file_path, 0)).all()
+
+
+def test_from_file_mmap_8bit_is_unsigned():
+    file_path = os.path.join(TEST_DIR, "8000_pcm08_mono.wav")
+    as1 = AudioSegment.from_file(file_path, mmap=True)
+    assert as1._data.dtype == np.uint8
+    assert (as1._data == read_wav_file(file_path, 0)).all()
+
+
+def test_from_file_mmap_rejects_24bit():
+    file_path = os.path.join(TEST_DIR, "8000_pcm24_mono.wav")
+    with pytest.raises(ValueError):
+        AudioSegment.from_file(file_path, mmap=True)
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_from_file_range(mmap):
+    file_path = os.path.join(TEST_DIR, "8000_pcm16_stereo.wav")
+    whole = read_wav_file(file_path)
+
+    # 1250ms at 8 kHz is frame 10000, not a whole second
+    as1 = AudioSegment.from_file(file_path, 1250, 500, mmap=mmap)
+    assert (as1._data == whole[20000:28000]).all()
+
+    as2 = AudioSegment.from_file_frames(file_path, 10000, 4000, mmap=mmap)
+    assert (as2._data == as1._data).all()
+
+    # consecutive ranges tile the file exactly
+    parts = [
+        AudioSegment.from_file(file_path, start, 333, mmap=mmap)._data
+        for start in range(0, 2500, 333)
+    ]
+    assert (np.concatenate(parts) == whole).all()
+
+    tail = AudioSegment.from_file_frames(file_path, 19990, 100, mmap=mmap)
+    assert len(tail._data) == 20
+
+    with pytest.raises(ValueError):
+        AudioSegment.from_file_frames(file_path, 20001, mmap=mmap)
+
+
+def test_read_wav_frames():
+    file_path = os.path.join(TEST_DIR, "44100_pcm24_stereo.wav")
+    whole = read_wav_file(file_path)
+    assert (read_wav_frames(file_path, 5, 3) == whole[10:16]).all()
+    assert (read_wav_file(file_path, 1000) == whole[88200:]).all()
+
+
+def test_read_wav_files():
+    file_paths = [
+        os.path.join(TEST_DIR, name)
+        for name in ["44100_pcm16_mono.wav", "44100_pcm24_stereo.wav"]
+    ]
+    batch = read_wav_files(file_paths, 10, 100, num_threads=2)
+    assert len(batch) == 2
+    for file_path, samples in zip(file_paths, batch):
+        expected = read_wav_frames(file_path, 10, 100)
+        assert samples.dtype == expected.dtype
+        assert (samples == expected).all()
+
+    with pytest.raises(Exception, match="missing.wav"):
+        read_wav_files([file_paths[0], os.path.join(TEST_DIR, "missing.wav")])
+
+
+def test_read_audio_file():
+    # symphonia decodes WAV too, which gives a reference for its output
+    file_path = os.path.join(TEST_DIR, "44100_pcm16_stereo.wav")
+    expected = read_wav_file(file_path)
+
+    samples = read_audio_file(file_path)
+    assert samples.dtype == np.int16
+    assert (samples == expected).all()
+    assert (read_audio_file(file_path, 10, 5) == expected[20:30]).all()
+    floats = read_audio_file(file_path, float=True)
+    assert floats.dtype == np.float32
+    assert np.allclose(floats * 32768, expected)
+
+    metadata = read_audio_file_metadata(file_path)
+    assert (metadata.sample_rate, metadata.channels) == (44100, 2)
+
+    reader = AudioStreamReader(file_path)
+    assert reader.dtype == "int16"
+    assert (np.concatenate(list(reader)) == expected).all()
+
+
+def test_from_file_probes_content(tmp_path):
+    # a WAV file is recognised whatever its name
+    wav_path = tmp_path / "renamed.mp3"
+    wav_path.write_bytes(
+        open(os.path.join(TEST_DIR, "8000_pcm16_mono.wav"), "rb").read()
+    )
+    seg = AudioSegment.from_file(str(wav_path), mmap=True)
+    assert seg.frame_rate == 8000
+
+    other_path = tmp_path / "sound.wav"
+    other_path.write_bytes(b"ID3" + bytes(64))
+    with pytest.raises(ValueError):
+        AudioSegment.from_file(str(other_path), mmap=True)
+
+
+def _write_ima_adpcm_wav(file_path, frames, block_groups=4):
+    # blocks of a header per channel, then `block_groups` words of 8 codes
+    # per channel, low nibble first; returns the frames a decoder gives back
+    n_frames, channels = frames.shape
+    block_frames = 8 * block_groups + 1
+    block_align = 4 * channels * (block_groups + 1)
+    blocks = []
+    expected = []
+    state = [(0, 0)] * channels
+    for start in range(0, n_frames, block_frames):
+        block = frames[start : start + block_frames]
+        block = np.concatenate([block, np.zeros((block_frames - len(block), channels))])
+        block = block.astype("<i2")
+        headers, words, decoded = [], [], []
+        for c in range(channels):
+            first = (int(block[0, c]), state[c][1])
+            headers.append(struct.pack("<hBx", *first))
+            codes, state[c] = npaudioop.lin2adpcm(block[1:, c], 2, first)
+            samples, _ = npaudioop.adpcm2lin(codes, 2, first)
+            decoded.append(np.concatenate([block[:1, c], samples]))
+            words.append(((codes & 0xF) << 4 | codes >> 4).reshape(-1, 4))
+        blocks.append(b"".join(headers) + np.stack(words, axis=1).tobytes())
+        expected.append(np.stack(decoded, axis=1))
+    data = b"".join(blocks)
+    fmt = struct.pack(
+        "<HHIIHHHH",
+        0x11,
+        channels,
+        8000,
+        4000 * channels,
+        block_align,
+        4,
+        2,
+        block_frames,
+    )
+    chunks = [
+        (b"fmt ", fmt),
+        (b"fact", struct.pack("<I", n_frames)),
+        (b"data", data),
+    ]
+    body = b"WAVE" + b"".join(
+        cid + struct.pack("<I", len(c)) + c + b"\0" * (len(c) % 2) for cid, c in chunks
+    )
+    with open(file_path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+    return np.concatenate(expected)[:n_frames]
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_read_ima_adpcm_wav(tmp_path, channels):
+    file_path = str(tmp_path / "adpcm.wav")
+    t = np.arange(1000)[:, None]
+    frames = 12000 * np.sin(2 * np.pi * t * (0.01 + 0.005 * np.arange(channels)))
+    expected = _write_ima_adpcm_wav(file_path, frames.astype("<i2"))
+    # the predictor adapts within the first block
+    assert np.abs(expected[100:] - frames[100:]).max() < 500
+
+    metadata = read_wav_file_metadata(file_path)
+    assert metadata.bits_per_sample == 16
+    assert metadata.channels == channels
+    # the `fact` chunk drops the padding of the last block
+    assert metadata.duration == 1000
+
+    whole = AudioSegment.from_file(file_path)
+    assert (whole._data == expected.reshape(-1)).all()
+    # a range across blocks decodes only the blocks it covers
+    part = AudioSegment.from_file_frames(file_path, 30, 50)
+    assert (part._data == expected[30:80].reshape(-1)).all()
+    assert len(read_wav_frames(file_path, 990)) == 10 * channels
+    with pytest.raises(ValueError):
+        read_wav_frames(file_path, 1001)
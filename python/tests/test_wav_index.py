@@ -0,0 +1,64 @@
+import os
+import shutil
+
+import pytest
+
+from audio_exp import read_wav_file_metadata, scan_wav_metadata
+from audio_exp import wav_index
+
+from .common import TEST_DIR
+
+
+def _corpus(directory):
+    directory.mkdir()
+    for name in ["8000_pcm16_mono.wav", "44100_pcm24_stereo.wav"]:
+        shutil.copy(os.path.join(TEST_DIR, name), directory / name)
+    (directory / "broken.wav").write_bytes(b"RIFF\x00\x00")
+    (directory / "notes.txt").write_text("not audio")
+    return directory
+
+
+def test_scan_directory(tmp_path):
+    table = scan_wav_metadata(str(_corpus(tmp_path / "corpus")))
+    names = [os.path.basename(path) for path in table.path]
+    assert names == ["44100_pcm24_stereo.wav", "8000_pcm16_mono.wav", "broken.wav"]
+
+    for i, path in enumerate(table.path[:2]):
+        meta = read_wav_file_metadata(path)
+        assert table.error[i] is None
+        assert table.sample_rate[i] == meta.sample_rate
+        assert table.channels[i] == meta.channels
+        assert table.bits_per_sample[i] == meta.bits_per_sample
+        assert table.frames[i] == meta.duration
+        assert table.duration_seconds[i] == pytest.approx(
+            meta.duration / meta.sample_rate
+        )
+
+    assert table.error[2] is not None
+    assert table.sample_rate[2] == 0
+
+
+def test_scan_reuses_cache(tmp_path, monkeypatch):
+    corpus = _corpus(tmp_path / "corpus")
+    cache_path = str(tmp_path / "metadata.sqlite")
+    first = scan_wav_metadata(str(corpus), cache_path=cache_path)
+
+    scanned = []
+    read_headers = wav_index.read_wav_files_metadata
+
+    def counting(file_paths, num_threads=None):
+        scanned.extend(file_paths)
+        return read_headers(file_paths, num_threads)
+
+    monkeypatch.setattr(wav_index, "read_wav_files_metadata", counting)
+    second = scan_wav_metadata(str(corpus), cache_path=cache_path)
+    assert scanned == []
+    for a, b in zip(first, second):
+        assert a.tolist() == b.tolist()
+
+    # a modified file is read again
+    shutil.copy(os.path.join(TEST_DIR, "8000_pcm08_mono.wav"), corpus / "broken.wav")
+    third = scan_wav_metadata(str(corpus), cache_path=cache_path)
+    assert [os.path.basename(path) for path in scanned] == ["broken.wav"]
+    assert third.error[2] is None
+    assert third.bits_per_sample[2] == 8
@@ -1,12 +1,19 @@
+import io
 import os
+import struct
 
 import tempfile
 
+import numpy as np
+import pytest
+
 from audio_exp._lowlevel import (
+    WavFileMeta,
     read_wav_file_metadata,
     read_wav_file,
     write_wav_file,
 )
+from audio_exp.audio_segment import AudioSegment, PCMEncoding
 
 from .common import TEST_DIR
 
@@ -45,3 +52,153 @@ def test_write_stereo():
         nda_stereo_readback = read_wav_file(tmp_file.name, 0)
         assert len(nda_stereo) == len(nda_stereo_readback)
         assert (nda_stereo == nda_stereo_readback).all()
+
+
+@pytest.mark.parametrize("bits", [8, 16, 24, 32])
+def test_write_native_dtype_surround(bits):
+    file_path = os.path.join(TEST_DIR, "8000_pcm{:02d}_surround.wav".format(bits))
+
+    tmeta = read_wav_file_metadata(file_path)
+    nda = read_wav_file(file_path)
+    with tempfile.NamedTemporaryFile() as tmp_file:
+        write_wav_file(tmp_file.name, tmeta, nda)
+
+        meta = read_wav_file_metadata(tmp_file.name)
+        assert (meta.bits_per_sample, meta.channels) == (bits, tmeta.channels)
+        assert (read_wav_file(tmp_file.name) == nda).all()
+        with open(file_path, "rb") as f1, open(tmp_file.name, "rb") as f2:
+            # the fixtures have a 44-byte header, surround files are written
+            # with a WAVE_FORMAT_EXTENSIBLE one
+            original, written = f1.read(), f2.read()
+        assert written[20:22] == struct.pack("<H", 0xFFFE)
+        assert written[68:] == original[44:]
+
+
+def _chunks(blob):
+    # {id: payload} of the chunks of a RIFF/WAVE file
+    assert blob[:4] == b"RIFF" and blob[8:12] == b"WAVE"
+    assert struct.unpack("<I", blob[4:8])[0] == len(blob) - 8
+    chunks, pos = {}, 12
+    while pos < len(blob):
+        chunk_id, size = struct.unpack("<4sI", blob[pos : pos + 8])
+        chunks[chunk_id] = blob[pos + 8 : pos + 8 + size]
+        pos += 8 + size + size % 2
+    return chunks
+
+
+def test_write_header_bytes():
+    with tempfile.NamedTemporaryFile() as tmp_file:
+        # stereo 16-bit keeps the plain PCM fmt chunk
+        write_wav_file(tmp_file.name, WavFileMeta(16, 2, 8000), np.zeros(4, "i2"))
+        fmt = _chunks(open(tmp_file.name, "rb").read())[b"fmt "]
+        assert struct.unpack("<HHIIHH", fmt) == (1, 2, 8000, 32000, 4, 16)
+
+        # more than 2 channels or 16 bits: WAVE_FORMAT_EXTENSIBLE
+        write_wav_file(tmp_file.name, WavFileMeta(24, 6, 8000), np.zeros(12, "i4"))
+        chunks = _chunks(open(tmp_file.name, "rb").read())
+        fmt = chunks[b"fmt "]
+        assert len(fmt) == 40
+        tag, channels, rate, byte_rate, align, bits, ext_size, valid, mask = (
+            struct.unpack("<HHIIHHHHI", fmt[:24])
+        )
+        assert (tag, channels, rate, byte_rate, align) == (0xFFFE, 6, 8000, 144000, 18)
+        assert (bits, ext_size, valid, mask) == (24, 22, 24, 0x3F)
+        # KSDATAFORMAT_SUBTYPE_PCM
+        assert fmt[24:] == bytes.fromhex("0100000000001000800000aa00389b71")
+        assert len(chunks[b"data"]) == 36
+
+        # float: IEEE float subformat and a fact chunk with the frame count
+        write_wav_file(
+            tmp_file.name,
+            WavFileMeta(32, 1, 8000, sample_format_int=False),
+            np.zeros(5, "f4"),
+        )
+        chunks = _chunks(open(tmp_file.name, "rb").read())
+        assert chunks[b"fmt "][24:26] == struct.pack("<H", 3)
+        assert struct.unpack("<I", chunks[b"fact"]) == (5,)
+        assert list(chunks) == [b"fmt ", b"fact", b"data"]
+
+
+def test_write_float():
+    data = np.linspace(-1, 1, 101, dtype=np.float32)
+    spec = WavFileMeta(32, 1, 16000, sample_format_int=False)
+    with tempfile.NamedTemporaryFile() as tmp_file:
+        write_wav_file(tmp_file.name, spec, data)
+        as1 = AudioSegment.from_file(tmp_file.name, mmap=True)
+        assert as1._data.dtype == np.float32
+        assert (as1._data == data).all()
+
+
+def test_write_rejects_mismatched_spec():
+    with tempfile.NamedTemporaryFile() as tmp_file:
+        with pytest.raises(ValueError):
+            write_wav_file(tmp_file.name, WavFileMeta(16, 1, 8000), np.zeros(4, "f4"))
+        with pytest.raises(ValueError):
+            write_wav_file(tmp_file.name, WavFileMeta(16, 2, 8000), np.zeros(3, "i2"))
+
+
+@pytest.mark.parametrize("name", ["44100_pcm24_stereo.wav", "8000_pcm08_mono.wav"])
+def test_export_roundtrip(name):
+    file_path = os.path.join(TEST_DIR, name)
+    as1 = AudioSegment.from_file(file_path)
+
+    with tempfile.NamedTemporaryFile(suffix=".wav") as tmp_file:
+        as1.export(tmp_file.name)
+        as2 = AudioSegment.from_file(tmp_file.name)
+    assert (as2.channels, as2.sample_width, as2.frame_rate) == (
+        as1.channels,
+        as1.sample_width,
+        as1.frame_rate,
+    )
+    assert (as1._data == as2._data).all()
+
+
+def test_export_to_open_file():
+    file_path = os.path.join(TEST_DIR, "8000_pcm16_stereo.wav")
+    as1 = AudioSegment.from_file(file_path)
+
+    with tempfile.TemporaryFile() as tmp_file:
+        as1.export(tmp_file)
+        tmp_file.seek(0)
+        with open(file_path, "rb") as f:
+            assert tmp_file.read() == f.read()
+
+
+@pytest.mark.parametrize("layout", ["mono", "stereo", "surround"])
+def test_pcm24_codec_roundtrip(layout):
+    file_path = os.path.join(TEST_DIR, "44100_pcm24_{}.wav".format(layout))
+    with open(file_path, "rb") as f:
+        raw = f.read()[44:]
+
+    samples = PCMEncoding.SIGNED_24.decode(raw)
+    assert samples.dtype == np.int32
+    assert (samples == read_wav_file(file_path)).all()
+    assert samples.min() < 0 < samples.max() < 2**23
+    assert PCMEncoding.SIGNED_24.encode(samples).tobytes() == raw
+
+    as_float = PCMEncoding.SIGNED_24.decode(raw, as_float=True)
+    assert as_float.dtype == np.float32
+    assert (as_float == samples / 2**23).all()
+    assert PCMEncoding.SIGNED_24.encode(as_float).tobytes() == raw
+
+    # in-memory files go through `wave`, which gets 3-byte samples too
+    as1 = AudioSegment.from_file(file_path)
+    buffer = io.BytesIO()
+    as1.export(buffer)
+    with open(file_path, "rb") as f:
+        assert buffer.getvalue() == f.read()
+
+
+def test_pcm24_codec_extremes():
+    samples = np.array([0, 1, -1, 2**23 - 1, -(2**23), 12345], dtype="<i4")
+    encoded = PCMEncoding.SIGNED_24.encode(samples[::2])
+    assert encoded.tobytes() == b"\x00\x00\x00\xff\xff\xff\x00\x00\x80"
+    assert (PCMEncoding.SIGNED_24.decode(encoded) == samples[::2]).all()
+    assert PCMEncoding.SIGNED_24.decode(b"").shape == (0,)
+
+    seg = AudioSegment(data=samples, channels=1, sample_width=3, frame_rate=8000)
+    with pytest.raises(ValueError):
+        seg.to_float().export(io.BytesIO())
+    buffer = io.BytesIO()
+    seg.to_float().export(buffer, sample_width=3)
+    assert buffer.getvalue()[44:] == PCMEncoding.SIGNED_24.encode(samples).tobytes()
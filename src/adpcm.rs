@@ -0,0 +1,346 @@
+//! IMA ADPCM, both the raw 4-bit stream of `audioop.lin2adpcm` and the
+//! blocks of WAV files tagged `WAVE_FORMAT_IMA_ADPCM`.
+//!
+//! Every code depends on the predictor state left by the previous one, so
+//! the codec is a tight sequential loop. The `(valpred, index)` state is
+//! passed in and out so a stream can be processed in chunks.
+
+use std::fs::File;
+use std::io::{self, BufReader, Read, Seek, SeekFrom};
+
+const INDEX_TABLE: [i32; 16] = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8];
+
+const STEPSIZE_TABLE: [i32; 89] = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45, 50, 55, 60, 66,
+    73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230, 253, 279, 307, 337, 371, 408, 449,
+    494, 544, 598, 658, 724, 796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493,
+    10442, 11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+];
+
+pub const WAVE_FORMAT_IMA_ADPCM: u16 = 0x0011;
+
+/// Predictor state carried from one code to the next.
+#[derive(Clone, Copy, Debug, Default, PartialEq)]
+pub struct AdpcmState {
+    pub valpred: i32,
+    pub index: i32,
+}
+
+impl AdpcmState {
+    /// The state given by the caller, `None` when it is out of range.
+    pub fn new(valpred: i32, index: i32) -> Option<AdpcmState> {
+        let valid = (-0x8000..0x8000).contains(&valpred) && (0..89).contains(&index);
+        valid.then_some(AdpcmState { valpred, index })
+    }
+
+    fn advance(&mut self, code: u8) {
+        self.index = (self.index + INDEX_TABLE[code as usize]).clamp(0, 88);
+    }
+
+    /// Decodes one 4-bit code, returns the new sample.
+    fn decode(&mut self, code: u8) -> i16 {
+        let step = STEPSIZE_TABLE[self.index as usize];
+        let mut vpdiff = step >> 3;
+        if code & 4 != 0 {
+            vpdiff += step;
+        }
+        if code & 2 != 0 {
+            vpdiff += step >> 1;
+        }
+        if code & 1 != 0 {
+            vpdiff += step >> 2;
+        }
+        if code & 8 != 0 {
+            self.valpred -= vpdiff;
+        } else {
+            self.valpred += vpdiff;
+        }
+        self.valpred = self.valpred.clamp(-32768, 32767);
+        self.advance(code);
+        self.valpred as i16
+    }
+
+    /// Encodes one sample, returns its 4-bit code.
+    fn encode(&mut self, sample: i16) -> u8 {
+        let mut step = STEPSIZE_TABLE[self.index as usize];
+        let val = sample as i32;
+        let (mut diff, sign) = if val < self.valpred {
+            (self.valpred - val, 8)
+        } else {
+            (val - self.valpred, 0)
+        };
+
+        let mut code = 0;
+        let mut vpdiff = step >> 3;
+        if diff >= step {
+            code = 4;
+            diff -= step;
+            vpdiff += step;
+        }
+        step >>= 1;
+        if diff >= step {
+            code |= 2;
+            diff -= step;
+            vpdiff += step;
+        }
+        step >>= 1;
+        if diff >= step {
+            code |= 1;
+            vpdiff += step;
+        }
+
+        if sign != 0 {
+            self.valpred -= vpdiff;
+        } else {
+            self.valpred += vpdiff;
+        }
+        self.valpred = self.valpred.clamp(-32768, 32767);
+        code |= sign;
+        self.advance(code);
+        code
+    }
+}
+
+/// Encodes 16-bit samples like `audioop.lin2adpcm`: two codes per byte, the
+/// first one in the high nibble. The code of an odd last sample updates the
+/// state but isn't output.
+pub fn encode(samples: &[i16], state: &mut AdpcmState) -> Vec<u8> {
+    let mut codes = Vec::with_capacity(samples.len() / 2);
+    for pair in samples.chunks(2) {
+        let high = state.encode(pair[0]);
+        if let Some(&second) = pair.get(1) {
+            codes.push(high << 4 | state.encode(second));
+        }
+    }
+    codes
+}
+
+/// Decodes codes packed like `encode` output, two samples per byte.
+pub fn decode(codes: &[u8], state: &mut AdpcmState) -> Vec<i16> {
+    let mut samples = Vec::with_capacity(codes.len() * 2);
+    for &byte in codes {
+        samples.push(state.decode(byte >> 4));
+        samples.push(state.decode(byte & 0xf));
+    }
+    samples
+}
+
+/// Layout of a WAV file tagged IMA ADPCM.
+#[derive(Clone, Copy, Debug)]
+pub struct ImaWavInfo {
+    pub channels: u16,
+    pub sample_rate: u32,
+    pub block_align: u16,
+    /// Frames in the file: the `fact` chunk when there is one, otherwise
+    /// every frame of the blocks.
+    pub n_frames: u64,
+    data_offset: u64,
+    data_size: u64,
+}
+
+impl ImaWavInfo {
+    fn frames_per_block(&self) -> u64 {
+        // a 4-byte header per channel holding the first sample, then 2
+        // frames per byte of each channel
+        let channels = self.channels as u64;
+        (self.block_align as u64 - 4 * channels) * 2 / channels + 1
+    }
+}
+
+fn invalid(message: &str) -> io::Error {
+    io::Error::new(io::ErrorKind::InvalidData, message.to_string())
+}
+
+fn read_u16(bytes: &[u8], offset: usize) -> u16 {
+    u16::from_le_bytes([bytes[offset], bytes[offset + 1]])
+}
+
+fn read_u32(bytes: &[u8], offset: usize) -> u32 {
+    u32::from_le_bytes(bytes[offset..offset + 4].try_into().unwrap())
+}
+
+/// Walks the RIFF chunks of `file_path`, returns `None` when the file is a
+/// WAV file of another format.
+pub fn read_ima_wav_info(file_path: &str) -> io::Result<Option<ImaWavInfo>> {
+    let mut file = BufReader::new(File::open(file_path)?);
+    let file_size = file.get_ref().metadata()?.len();
+
+    let mut riff = [0u8; 12];
+    file.read_exact(&mut riff)?;
+    if &riff[..4] != b"RIFF" || &riff[8..] != b"WAVE" {
+        return Err(invalid("not a RIFF/WAVE file"));
+    }
+
+    let mut fmt = None;
+    let mut fact = None;
+    loop {
+        let mut header = [0u8; 8];
+        file.read_exact(&mut header)
+            .map_err(|_| invalid("no data chunk found"))?;
+        let size = read_u32(&header, 4) as u64;
+        match &header[..4] {
+            b"fmt " | b"fact" => {
+                let mut chunk = vec![0u8; size as usize];
+                file.read_exact(&mut chunk)?;
+                file.seek(SeekFrom::Current((size % 2) as i64))?;
+                if &header[..4] == b"fmt " {
+                    fmt = Some(chunk);
+                } else if chunk.len() >= 4 {
+                    fact = Some(read_u32(&chunk, 0) as u64);
+                }
+            }
+            b"data" => {
+                let fmt = fmt.ok_or_else(|| invalid("data chunk precedes fmt chunk"))?;
+                if fmt.len() < 16 || read_u16(&fmt, 0) != WAVE_FORMAT_IMA_ADPCM {
+                    return Ok(None);
+                }
+                let data_offset = file.stream_position()?;
+                let mut info = ImaWavInfo {
+                    channels: read_u16(&fmt, 2),
+                    sample_rate: read_u32(&fmt, 4),
+                    block_align: read_u16(&fmt, 12),
+                    n_frames: 0,
+                    data_offset,
+                    // clamped for files left unfinalized by their writer
+                    data_size: size.min(file_size.saturating_sub(data_offset)),
+                };
+                let channels = info.channels as u64;
+                if channels == 0
+                    || info.block_align as u64 <= 4 * channels
+                    || info.block_align as u64 % (4 * channels) != 0
+                {
+                    return Err(invalid("invalid IMA ADPCM block layout"));
+                }
+                let block_frames = info.frames_per_block();
+                let full_blocks = info.data_size / info.block_align as u64;
+                let partial = info.data_size % info.block_align as u64;
+                // a truncated last block still holds its header and every
+                // whole group of 8 frames
+                let partial_frames = if partial >= 4 * channels {
+                    (partial - 4 * channels) / (4 * channels) * 8 + 1
+                } else {
+                    0
+                };
+                let available = full_blocks * block_frames + partial_frames;
+                info.n_frames = fact.map_or(available, |fact| fact.min(available));
+                return Ok(Some(info));
+            }
+            _ => {
+                file.seek(SeekFrom::Current((size + size % 2) as i64))?;
+            }
+        }
+    }
+}
+
+/// Decodes one block (or the truncated last one) of interleaved channels
+/// into `out`: every channel starts with a header holding its first sample
+/// and predictor index, then 4-byte words of 8 codes per channel in turn,
+/// low nibble first.
+fn decode_block(block: &[u8], channels: usize, out: &mut Vec<i16>) -> io::Result<()> {
+    let mut states = Vec::with_capacity(channels);
+    for header in block[..4 * channels].chunks_exact(4) {
+        let valpred = i16::from_le_bytes([header[0], header[1]]) as i32;
+        let state = AdpcmState::new(valpred, header[2] as i32)
+            .ok_or_else(|| invalid("invalid IMA ADPCM block header"))?;
+        out.push(valpred as i16);
+        states.push(state);
+    }
+
+    let words = &block[4 * channels..];
+    let group_bytes = 4 * channels;
+    let start = out.len();
+    let n_groups = words.len() / group_bytes;
+    out.resize(start + n_groups * 8 * channels, 0);
+    for (group, frames) in words
+        .chunks_exact(group_bytes)
+        .zip(out[start..].chunks_exact_mut(8 * channels))
+    {
+        for (channel, (word, state)) in group.chunks_exact(4).zip(&mut states).enumerate() {
+            for (i, &byte) in word.iter().enumerate() {
+                frames[(2 * i) * channels + channel] = state.decode(byte & 0xf);
+                frames[(2 * i + 1) * channels + channel] = state.decode(byte >> 4);
+            }
+        }
+    }
+    Ok(())
+}
+
+/// Decodes frames `start_frame..start_frame + n_frames` (up to the end when
+/// `n_frames` is `None`) of an IMA ADPCM WAV file to interleaved 16-bit
+/// samples. Only the blocks covering the range are read.
+pub fn read_ima_wav_range(
+    file_path: &str,
+    info: &ImaWavInfo,
+    start_frame: u64,
+    n_frames: Option<u64>,
+) -> io::Result<Vec<i16>> {
+    let channels = info.channels as usize;
+    let block_frames = info.frames_per_block();
+    let end_frame = n_frames.map_or(info.n_frames, |n| (start_frame + n).min(info.n_frames));
+    if start_frame >= end_frame {
+        return Ok(Vec::new());
+    }
+
+    let first_block = start_frame / block_frames;
+    let last_block = (end_frame - 1) / block_frames;
+    let offset = first_block * info.block_align as u64;
+    let size = ((last_block + 1) * info.block_align as u64).min(info.data_size) - offset;
+
+    let mut file = File::open(file_path)?;
+    file.seek(SeekFrom::Start(info.data_offset + offset))?;
+    let mut data = vec![0u8; size as usize];
+    file.read_exact(&mut data)?;
+
+    let mut samples =
+        Vec::with_capacity(((last_block - first_block + 1) * block_frames) as usize * channels);
+    for block in data.chunks(info.block_align as usize) {
+        if block.len() >= 4 * channels {
+            decode_block(block, channels, &mut samples)?;
+        }
+    }
+
+    let skip = (start_frame - first_block * block_frames) as usize * channels;
+    let keep = (end_frame - start_frame) as usize * channels;
+    samples.truncate(skip + keep);
+    samples.drain(..skip);
+    Ok(samples)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{decode, encode, AdpcmState};
+
+    #[test]
+    fn test_roundtrip_in_chunks() {
+        let samples: Vec<i16> = (0..1000)
+            .map(|i| ((i as f64 / 10.0).sin() * 20000.0) as i16)
+            .collect();
+
+        let mut state = AdpcmState::default();
+        let whole = encode(&samples, &mut state);
+        let mut chunked_state = AdpcmState::default();
+        let mut chunked = encode(&samples[..500], &mut chunked_state);
+        chunked.extend(encode(&samples[500..], &mut chunked_state));
+        assert_eq!(whole, chunked);
+        assert_eq!(state, chunked_state);
+
+        let decoded = decode(&whole, &mut AdpcmState::default());
+        assert_eq!(decoded.len(), samples.len());
+        let error = samples
+            .iter()
+            .zip(&decoded)
+            .skip(50)
+            .map(|(a, b)| (*a as i32 - *b as i32).abs())
+            .max()
+            .unwrap();
+        assert!(error < 2000);
+    }
+
+    #[test]
+    fn test_state_bounds() {
+        assert!(AdpcmState::new(32767, 88).is_some());
+        assert!(AdpcmState::new(32768, 0).is_none());
+        assert!(AdpcmState::new(0, 89).is_none());
+    }
+}
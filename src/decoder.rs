@@ -0,0 +1,270 @@
+//! Decoding of compressed formats (MP3 and whatever else symphonia is built
+//! with) into the same interleaved containers as the WAV readers.
+//!
+//! Samples are converted by symphonia to i16, or to f32 when asked for, so
+//! the result can go through the same code paths as 16-bit or float WAV data.
+
+use std::fs::File;
+use std::io;
+use std::path::Path;
+
+use log::warn;
+use symphonia::core::audio::{SampleBuffer, SignalSpec};
+use symphonia::core::codecs::{Decoder, DecoderOptions, CODEC_TYPE_NULL};
+use symphonia::core::conv::ConvertibleSample;
+use symphonia::core::errors::{Error, SeekErrorKind};
+use symphonia::core::formats::{FormatOptions, FormatReader, SeekMode, SeekTo};
+use symphonia::core::io::MediaSourceStream;
+use symphonia::core::meta::MetadataOptions;
+use symphonia::core::probe::Hint;
+use symphonia::core::sample::Sample;
+use symphonia::core::units::{Time, TimeBase};
+
+use crate::samples::Samples;
+
+/// Conversion buffers of the decoded packets, one per output type, kept
+/// from packet to packet.
+#[derive(Default)]
+struct Buffers {
+    i16: Option<SampleBuffer<i16>>,
+    f32: Option<SampleBuffer<f32>>,
+}
+
+/// A sample type the decoder converts to.
+trait DecodedSample: Sample + ConvertibleSample {
+    fn buffer(buffers: &mut Buffers) -> &mut Option<SampleBuffer<Self>>;
+}
+
+impl DecodedSample for i16 {
+    fn buffer(buffers: &mut Buffers) -> &mut Option<SampleBuffer<Self>> {
+        &mut buffers.i16
+    }
+}
+
+impl DecodedSample for f32 {
+    fn buffer(buffers: &mut Buffers) -> &mut Option<SampleBuffer<Self>> {
+        &mut buffers.f32
+    }
+}
+
+/// Decoder for the first audio track of a file.
+pub struct MediaDecoder {
+    format: Box<dyn FormatReader>,
+    decoder: Box<dyn Decoder>,
+    buffers: Buffers,
+    track_id: u32,
+    /// Unit of the packet timestamps, frames when `None`.
+    time_base: Option<TimeBase>,
+    pub sample_rate: u32,
+    pub channels: u16,
+    /// Length of the track when the container states it.
+    pub n_frames: Option<u64>,
+    /// Bytes of the packets of the track decoded so far.
+    pub bytes_read: u64,
+}
+
+impl MediaDecoder {
+    /// Probes the container of `file_path` (the extension is only a hint)
+    /// and sets up the decoder of its first audio track.
+    pub fn open(file_path: &str) -> Result<MediaDecoder, Error> {
+        let file = File::open(file_path)?;
+        let stream = MediaSourceStream::new(Box::new(file), Default::default());
+
+        let mut hint = Hint::new();
+        if let Some(extension) = Path::new(file_path).extension().and_then(|e| e.to_str()) {
+            hint.with_extension(extension);
+        }
+        // gapless drops the encoder delay and padding, so frame positions
+        // match the ones of the source material
+        let format_options = FormatOptions {
+            enable_gapless: true,
+            ..Default::default()
+        };
+        let probed = symphonia::default::get_probe().format(
+            &hint,
+            stream,
+            &format_options,
+            &MetadataOptions::default(),
+        )?;
+        let format = probed.format;
+
+        let track = format
+            .tracks()
+            .iter()
+            .find(|track| track.codec_params.codec != CODEC_TYPE_NULL)
+            .ok_or(Error::Unsupported("no audio track"))?;
+        let params = &track.codec_params;
+        let sample_rate = params
+            .sample_rate
+            .ok_or(Error::Unsupported("unknown sample rate"))?;
+        let channels = params
+            .channels
+            .ok_or(Error::Unsupported("unknown channel layout"))?
+            .count() as u16;
+        let decoder = symphonia::default::get_codecs().make(params, &DecoderOptions::default())?;
+
+        Ok(MediaDecoder {
+            track_id: track.id,
+            time_base: params.time_base,
+            buffers: Buffers::default(),
+            sample_rate,
+            channels,
+            n_frames: params.n_frames,
+            bytes_read: 0,
+            decoder,
+            format,
+        })
+    }
+
+    /// Decodes the next packet of the track and appends its interleaved
+    /// samples to `out`. Returns the frame of the stream its first sample
+    /// is at, `None` at the end of the stream.
+    fn decode_next<S: DecodedSample>(&mut self, out: &mut Vec<S>) -> Result<Option<u64>, Error> {
+        loop {
+            let packet = match self.format.next_packet() {
+                Ok(packet) => packet,
+                // symphonia reports the end of the stream as an unexpected EOF
+                Err(Error::IoError(e)) if e.kind() == io::ErrorKind::UnexpectedEof => {
+                    return Ok(None)
+                }
+                Err(e) => return Err(e),
+            };
+            if packet.track_id() != self.track_id {
+                continue;
+            }
+            self.bytes_read += packet.buf().len() as u64;
+
+            match self.decoder.decode(&packet) {
+                Ok(decoded) => {
+                    let spec: SignalSpec = *decoded.spec();
+                    let needed = decoded.capacity() * spec.channels.count();
+                    let buffer = S::buffer(&mut self.buffers);
+                    if buffer.as_ref().map_or(true, |b| b.capacity() < needed) {
+                        *buffer = Some(SampleBuffer::new(decoded.capacity() as u64, spec));
+                    }
+                    let buffer = buffer.as_mut().unwrap();
+                    buffer.copy_interleaved_ref(decoded);
+                    out.extend_from_slice(buffer.samples());
+                    return Ok(Some(self.ts_to_frame(packet.ts())));
+                }
+                // a corrupt packet only loses its own frames
+                Err(Error::DecodeError(msg)) => warn!("skipping undecodable packet: {}", msg),
+                Err(e) => return Err(e),
+            }
+        }
+    }
+
+    /// Decodes the next packet as i16 samples, or f32 ones when `float` is
+    /// set, `None` at the end of the stream.
+    pub fn decode_packet(&mut self, float: bool) -> Result<Option<Samples>, Error> {
+        Ok(if float {
+            let mut packet = Vec::new();
+            self.decode_next(&mut packet)?.map(|_| Samples::F32(packet))
+        } else {
+            let mut packet = Vec::new();
+            self.decode_next(&mut packet)?.map(|_| Samples::I16(packet))
+        })
+    }
+
+    fn ts_to_frame(&self, ts: u64) -> u64 {
+        match self.time_base {
+            Some(tb) if (tb.numer, tb.denom) != (1, self.sample_rate) => {
+                let time = tb.calc_time(ts);
+                let rate = self.sample_rate as u64;
+                time.seconds * rate + (time.frac * rate as f64).round() as u64
+            }
+            _ => ts,
+        }
+    }
+
+    fn frame_to_ts(&self, frame: u64) -> u64 {
+        match self.time_base {
+            Some(tb) if (tb.numer, tb.denom) != (1, self.sample_rate) => {
+                let rate = self.sample_rate as u64;
+                let frac = (frame % rate) as f64 / rate as f64;
+                tb.calc_timestamp(Time::new(frame / rate, frac))
+            }
+            _ => frame,
+        }
+    }
+
+    /// Moves to the packet holding `frame`, returns `false` when the
+    /// stream can't seek and has to be decoded from where it is.
+    fn seek(&mut self, frame: u64) -> Result<bool, Error> {
+        let to = SeekTo::TimeStamp {
+            ts: self.frame_to_ts(frame),
+            track_id: self.track_id,
+        };
+        match self.format.seek(SeekMode::Accurate, to) {
+            Ok(_) => {
+                self.decoder.reset();
+                Ok(true)
+            }
+            Err(Error::SeekError(SeekErrorKind::Unseekable))
+            | Err(Error::SeekError(SeekErrorKind::ForwardOnly)) => Ok(false),
+            Err(e) => Err(e),
+        }
+    }
+
+    fn decode_range_as<S: DecodedSample>(
+        &mut self,
+        start_frame: u64,
+        n_frames: Option<u64>,
+    ) -> Result<Vec<S>, Error> {
+        let channels = self.channels as usize;
+        let limit = n_frames.map(|n_frames| n_frames as usize * channels);
+        // an accurate seek lands on a packet at or before `start_frame`,
+        // the frames before it are trimmed using the packet timestamps;
+        // an unseekable stream is decoded from the start and counted
+        let seeked = start_frame > 0 && self.seek(start_frame)?;
+        let mut skip = if seeked {
+            0
+        } else {
+            start_frame as usize * channels
+        };
+
+        let mut samples = Vec::new();
+        let mut packet = Vec::new();
+        while limit.map_or(true, |limit| samples.len() < limit) {
+            packet.clear();
+            let Some(first_frame) = self.decode_next(&mut packet)? else {
+                break;
+            };
+            let before = if seeked {
+                start_frame.saturating_sub(first_frame) as usize * channels
+            } else {
+                skip
+            };
+            let skipped = before.min(packet.len());
+            if !seeked {
+                skip -= skipped;
+            }
+            samples.extend_from_slice(&packet[skipped..]);
+        }
+
+        if skip > 0 {
+            return Err(Error::SeekError(SeekErrorKind::OutOfRange));
+        }
+        if let Some(limit) = limit {
+            samples.truncate(limit);
+        }
+        Ok(samples)
+    }
+
+    /// Decodes `n_frames` frames from `start_frame` on, or up to the end of
+    /// the stream when `n_frames` is `None`. The reader seeks to the packet
+    /// holding `start_frame`, only the frames of that packet before it are
+    /// decoded and dropped.
+    pub fn decode_range(
+        &mut self,
+        start_frame: u64,
+        n_frames: Option<u64>,
+        float: bool,
+    ) -> Result<Samples, Error> {
+        Ok(if float {
+            Samples::F32(self.decode_range_as(start_frame, n_frames)?)
+        } else {
+            Samples::I16(self.decode_range_as(start_frame, n_frames)?)
+        })
+    }
+}
@@ -0,0 +1,243 @@
+//! Sample-level kernels working in place on the buffers of numpy arrays.
+//!
+//! Every kernel is generic over the sample containers of `Sample` and
+//! follows the conventions of `npaudioop`: `width` is the sample width in
+//! bytes (24-bit samples live in i32), integer results are saturated to
+//! that width, float samples are normalized to [-1, 1) and neither rounded
+//! nor clipped. The arrays can have any shape and strides.
+
+use numpy::ndarray::{
+    s, ArrayView1, ArrayView2, ArrayViewD, ArrayViewMut1, ArrayViewMut2, ArrayViewMutD, Zip,
+};
+
+/// A sample container the kernels work on.
+pub trait Sample: Copy + Send + Sync + 'static {
+    const FLOAT: bool;
+    /// Size of the container in bytes, the widest samples it holds.
+    const WIDTH: u32;
+
+    fn to_f64(self) -> f64;
+    /// `value` in the container, saturating at its bounds.
+    fn from_f64(value: f64) -> Self;
+    fn to_i64(self) -> i64;
+    /// `value` in the container, which must hold it.
+    fn from_i64(value: i64) -> Self;
+}
+
+macro_rules! int_sample {
+    ($t:ty) => {
+        impl Sample for $t {
+            const FLOAT: bool = false;
+            const WIDTH: u32 = std::mem::size_of::<$t>() as u32;
+
+            fn to_f64(self) -> f64 {
+                self as f64
+            }
+
+            fn from_f64(value: f64) -> Self {
+                value as $t
+            }
+
+            fn to_i64(self) -> i64 {
+                self as i64
+            }
+
+            fn from_i64(value: i64) -> Self {
+                value as $t
+            }
+        }
+    };
+}
+
+int_sample!(i16);
+int_sample!(i32);
+
+impl Sample for f32 {
+    const FLOAT: bool = true;
+    const WIDTH: u32 = 4;
+
+    fn to_f64(self) -> f64 {
+        self as f64
+    }
+
+    fn from_f64(value: f64) -> Self {
+        value as f32
+    }
+
+    fn to_i64(self) -> i64 {
+        self as i64
+    }
+
+    fn from_i64(value: i64) -> Self {
+        value as f32
+    }
+}
+
+/// Signed bounds of a `width` byte sample.
+pub fn bounds(width: u32) -> (i64, i64) {
+    let half = 1i64 << (8 * width - 1);
+    (-half, half - 1)
+}
+
+/// Multiplies by `factor`, integer results are floored and saturated like
+/// `audioop.mul`.
+pub fn gain<T: Sample>(mut samples: ArrayViewMutD<'_, T>, width: u32, factor: f64) {
+    if T::FLOAT {
+        samples.mapv_inplace(|x| T::from_f64(x.to_f64() * factor));
+        return;
+    }
+    let (lo, hi) = bounds(width);
+    let (lo, hi) = (lo as f64, hi as f64);
+    samples.mapv_inplace(|x| T::from_f64((x.to_f64() * factor).floor().clamp(lo, hi)));
+}
+
+/// Adds `other`, of the same shape, saturating like `audioop.add`.
+pub fn add<T: Sample>(mut samples: ArrayViewMutD<'_, T>, other: ArrayViewD<'_, T>, width: u32) {
+    let zip = Zip::from(&mut samples).and(&other);
+    if T::FLOAT {
+        zip.for_each(|x, &y| *x = T::from_f64(x.to_f64() + y.to_f64()));
+        return;
+    }
+    let (lo, hi) = bounds(width);
+    zip.for_each(|x, &y| *x = T::from_i64((x.to_i64() + y.to_i64()).clamp(lo, hi)));
+}
+
+/// Adds a DC offset. Integer samples wrap around on overflow like
+/// `audioop.bias`, and `bias` is truncated to an integer for them.
+pub fn bias<T: Sample>(mut samples: ArrayViewMutD<'_, T>, width: u32, bias: f64) {
+    if T::FLOAT {
+        samples.mapv_inplace(|x| T::from_f64(x.to_f64() + bias));
+        return;
+    }
+    let (lo, _) = bounds(width);
+    let modulus = 1i64 << (8 * width);
+    let bias = bias as i64;
+    samples.mapv_inplace(|x| T::from_i64((x.to_i64() - lo + bias).rem_euclid(modulus) + lo));
+}
+
+/// Limits the samples to `[lo, hi]`, `lo <= hi`.
+pub fn clip<T: Sample>(mut samples: ArrayViewMutD<'_, T>, lo: f64, hi: f64) {
+    samples.mapv_inplace(|x| T::from_f64(x.to_f64().clamp(lo, hi)));
+}
+
+/// Writes channel `i` to column `i` of `out`, laid out as (frames,
+/// channels). A channel shorter than `out` leaves the frames after its end
+/// untouched, a longer one is truncated.
+pub fn interleave<T: Sample>(channels: &[ArrayView1<'_, T>], mut out: ArrayViewMut2<'_, T>) {
+    for (channel, mut column) in channels.iter().zip(out.columns_mut()) {
+        let n = channel.len().min(column.len());
+        column.slice_mut(s![..n]).assign(&channel.slice(s![..n]));
+    }
+}
+
+/// Writes column `i` of `samples`, laid out as (frames, channels), to
+/// `outs[i]`, the inverse of `interleave`.
+pub fn deinterleave<T: Sample>(samples: ArrayView2<'_, T>, outs: Vec<ArrayViewMut1<'_, T>>) {
+    for (column, mut out) in samples.columns().into_iter().zip(outs) {
+        let n = column.len().min(out.len());
+        out.slice_mut(s![..n]).assign(&column.slice(s![..n]));
+    }
+}
+
+/// Integer samples of `width` bytes as floats normalized to [-1, 1), like
+/// `npaudioop.lin2float`.
+pub fn int_to_float<T: Sample>(
+    samples: ArrayViewD<'_, T>,
+    width: u32,
+    mut out: ArrayViewMutD<'_, f32>,
+) {
+    let scale = 1.0 / (1i64 << (8 * width - 1)) as f64;
+    Zip::from(&mut out)
+        .and(&samples)
+        .for_each(|y, &x| *y = (x.to_f64() * scale) as f32);
+}
+
+/// Normalized floats as integer samples of `width` bytes, rounded to
+/// nearest (ties to even, like `numpy.rint`) and saturated, like
+/// `npaudioop.float2lin` without dither.
+pub fn float_to_int<T: Sample>(
+    samples: ArrayViewD<'_, f32>,
+    width: u32,
+    mut out: ArrayViewMutD<'_, T>,
+) {
+    let (lo, hi) = bounds(width);
+    let (lo, hi) = (lo as f64, hi as f64);
+    let scale = (1i64 << (8 * width - 1)) as f64;
+    Zip::from(&mut out)
+        .and(&samples)
+        .for_each(|y, &x| *y = T::from_f64((x as f64 * scale).round_ties_even().clamp(lo, hi)));
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use numpy::ndarray::{arr1, arr2, Array1, Array2};
+
+    #[test]
+    fn test_gain_saturates() {
+        let mut samples = arr1(&[1000i16, -1000, 30000, -30000, 3]).into_dyn();
+        gain(samples.view_mut(), 2, 1.5);
+        assert_eq!(
+            samples.as_slice().unwrap(),
+            &[1500, -1500, 32767, -32768, 4]
+        );
+
+        // 24-bit samples in i32
+        let mut samples = arr1(&[8_000_000i32, -3]).into_dyn();
+        gain(samples.view_mut(), 3, 2.0);
+        assert_eq!(samples.as_slice().unwrap(), &[8_388_607, -6]);
+
+        let mut samples = arr1(&[0.75f32, -0.5]).into_dyn();
+        gain(samples.view_mut(), 4, 2.0);
+        assert_eq!(samples.as_slice().unwrap(), &[1.5, -1.0]);
+    }
+
+    #[test]
+    fn test_add_and_bias() {
+        let mut samples = arr1(&[30000i16, -5]).into_dyn();
+        add(samples.view_mut(), arr1(&[5000i16, 3]).into_dyn().view(), 2);
+        assert_eq!(samples.as_slice().unwrap(), &[32767, -2]);
+
+        let mut samples = arr1(&[32767i16, 0]).into_dyn();
+        bias(samples.view_mut(), 2, 1.0);
+        assert_eq!(samples.as_slice().unwrap(), &[-32768, 1]);
+
+        let mut samples = arr1(&[8_388_607i32]).into_dyn();
+        bias(samples.view_mut(), 3, 1.0);
+        assert_eq!(samples.as_slice().unwrap(), &[-8_388_608]);
+    }
+
+    #[test]
+    fn test_clip() {
+        let mut samples = arr1(&[-100i16, 0, 100]).into_dyn();
+        clip(samples.view_mut(), -50.0, 60.0);
+        assert_eq!(samples.as_slice().unwrap(), &[-50, 0, 60]);
+    }
+
+    #[test]
+    fn test_interleave_roundtrip() {
+        let left = arr1(&[1i16, 2, 3]);
+        let right = arr1(&[4i16, 5]);
+        let mut frames = Array2::<i16>::zeros((3, 2));
+        interleave(&[left.view(), right.view()], frames.view_mut());
+        assert_eq!(frames, arr2(&[[1, 4], [2, 5], [3, 0]]));
+
+        let mut a = Array1::<i16>::zeros(3);
+        let mut b = Array1::<i16>::zeros(3);
+        deinterleave(frames.view(), vec![a.view_mut(), b.view_mut()]);
+        assert_eq!((a, b), (arr1(&[1, 2, 3]), arr1(&[4, 5, 0])));
+    }
+
+    #[test]
+    fn test_float_conversions() {
+        let samples = arr1(&[-32768i16, 0, 16384]).into_dyn();
+        let mut floats = Array1::<f32>::zeros(3).into_dyn();
+        int_to_float(samples.view(), 2, floats.view_mut());
+        assert_eq!(floats.as_slice().unwrap(), &[-1.0, 0.0, 0.5]);
+
+        let floats = arr1(&[-1.5f32, 0.5, 1.0, 2.5 / 32768.0]).into_dyn();
+        let mut samples = Array1::<i16>::zeros(4).into_dyn();
+        float_to_int(floats.view(), 2, samples.view_mut());
+        assert_eq!(samples.as_slice().unwrap(), &[-32768, 16384, 32767, 2]);
+    }
+}
@@ -0,0 +1,219 @@
+//! Instrumentation of the extension: `log` records are forwarded to Python
+//! `logging`, and the Python-facing functions keep counters of their calls,
+//! the bytes they read or wrote, the samples they produced and their wall
+//! time.
+//!
+//! Counting is off by default. While it is off `start` is one relaxed
+//! atomic load returning `None`, and `record` returns at once.
+
+use std::collections::BTreeMap;
+use std::ops::AddAssign;
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::Mutex;
+use std::time::Instant;
+
+use log::{Level, LevelFilter, Log, Metadata, Record};
+use pyo3::prelude::*;
+
+static ENABLED: AtomicBool = AtomicBool::new(false);
+static COUNTERS: Mutex<BTreeMap<&'static str, Counters>> = Mutex::new(BTreeMap::new());
+
+/// Totals of one instrumented function.
+#[derive(Clone, Copy, Debug, Default, PartialEq)]
+pub struct Counters {
+    pub calls: u64,
+    pub bytes_read: u64,
+    pub bytes_written: u64,
+    pub samples: u64,
+    pub nanos: u64,
+}
+
+/// What one call moved.
+#[derive(Clone, Copy, Debug, Default)]
+pub struct Io {
+    pub bytes_read: u64,
+    pub bytes_written: u64,
+    pub samples: u64,
+}
+
+impl AddAssign for Io {
+    fn add_assign(&mut self, other: Io) {
+        self.bytes_read += other.bytes_read;
+        self.bytes_written += other.bytes_written;
+        self.samples += other.samples;
+    }
+}
+
+pub fn set_enabled(enabled: bool) {
+    ENABLED.store(enabled, Ordering::Relaxed);
+}
+
+pub fn enabled() -> bool {
+    ENABLED.load(Ordering::Relaxed)
+}
+
+/// Start time of an instrumented call, `None` when counting is off.
+pub fn start() -> Option<Instant> {
+    if enabled() {
+        Some(Instant::now())
+    } else {
+        None
+    }
+}
+
+/// Adds a call of `name` that started at `start` to its counters.
+pub fn record(name: &'static str, start: Option<Instant>, io: Io) {
+    let Some(start) = start else {
+        return;
+    };
+    let nanos = start.elapsed().as_nanos() as u64;
+    // a panic while the lock was held can't leave the totals inconsistent
+    let mut counters = COUNTERS.lock().unwrap_or_else(|e| e.into_inner());
+    let counters = counters.entry(name).or_default();
+    counters.calls += 1;
+    counters.bytes_read += io.bytes_read;
+    counters.bytes_written += io.bytes_written;
+    counters.samples += io.samples;
+    counters.nanos += nanos;
+}
+
+pub fn snapshot() -> Vec<(&'static str, Counters)> {
+    let counters = COUNTERS.lock().unwrap_or_else(|e| e.into_inner());
+    counters.iter().map(|(&name, &c)| (name, c)).collect()
+}
+
+pub fn reset() {
+    COUNTERS.lock().unwrap_or_else(|e| e.into_inner()).clear();
+}
+
+/// Python logger of a record target: `audio_exp::decoder` (this crate) is
+/// `audio_exp._lowlevel.decoder`, other crates keep their path with dots.
+fn logger_name(target: &str) -> String {
+    let path = match target.strip_prefix("audio_exp") {
+        Some(rest) if rest.is_empty() || rest.starts_with("::") => {
+            format!("audio_exp._lowlevel{}", rest)
+        }
+        _ => target.to_string(),
+    };
+    path.replace("::", ".")
+}
+
+fn python_level(level: Level) -> u32 {
+    match level {
+        Level::Error => 40,
+        Level::Warn => 30,
+        Level::Info => 20,
+        Level::Debug => 10,
+        Level::Trace => 5,
+    }
+}
+
+/// The most verbose `log` level a Python logger at `level` lets through.
+pub fn level_filter(level: u32) -> LevelFilter {
+    match level {
+        0..=5 => LevelFilter::Trace,
+        6..=10 => LevelFilter::Debug,
+        11..=20 => LevelFilter::Info,
+        21..=30 => LevelFilter::Warn,
+        31..=40 => LevelFilter::Error,
+        _ => LevelFilter::Off,
+    }
+}
+
+/// Sends every record to `logging.getLogger(name).log(level, message)`.
+/// Records above `log::max_level()` are dropped before the GIL is taken,
+/// `set_log_level` keeps that level in line with the Python logger.
+struct PythonLogger;
+
+impl Log for PythonLogger {
+    fn enabled(&self, metadata: &Metadata) -> bool {
+        metadata.level() <= log::max_level()
+    }
+
+    fn log(&self, record: &Record) {
+        if !self.enabled(record.metadata()) {
+            return;
+        }
+        Python::with_gil(|py| {
+            let result = py
+                .import_bound("logging")
+                .and_then(|logging| {
+                    logging.call_method1("getLogger", (logger_name(record.target()),))
+                })
+                .and_then(|logger| {
+                    logger.call_method1(
+                        "log",
+                        (python_level(record.level()), record.args().to_string()),
+                    )
+                });
+            // a failing handler must not turn into an error of the call
+            // being logged
+            if let Err(e) = result {
+                e.print(py);
+            }
+        });
+    }
+
+    fn flush(&self) {}
+}
+
+static LOGGER: PythonLogger = PythonLogger;
+
+/// Installs the bridge, unless another `log` implementation already was,
+/// and takes the level of the `audio_exp._lowlevel` Python logger.
+pub fn init_logging(py: Python<'_>) -> PyResult<()> {
+    if log::set_logger(&LOGGER).is_ok() {
+        let level: u32 = py
+            .import_bound("logging")?
+            .call_method1("getLogger", ("audio_exp._lowlevel",))?
+            .call_method0("getEffectiveLevel")?
+            .extract()?;
+        log::set_max_level(level_filter(level));
+    }
+    Ok(())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn test_logger_name() {
+        assert_eq!(logger_name("audio_exp"), "audio_exp._lowlevel");
+        assert_eq!(
+            logger_name("audio_exp::decoder"),
+            "audio_exp._lowlevel.decoder"
+        );
+        assert_eq!(logger_name("audio_exp_other"), "audio_exp_other");
+        assert_eq!(logger_name("symphonia_core::probe"), "symphonia_core.probe");
+    }
+
+    #[test]
+    fn test_level_filter() {
+        assert_eq!(level_filter(0), LevelFilter::Trace);
+        assert_eq!(level_filter(20), LevelFilter::Info);
+        assert_eq!(level_filter(30), LevelFilter::Warn);
+        assert_eq!(level_filter(50), LevelFilter::Off);
+    }
+
+    #[test]
+    fn test_counters() {
+        reset();
+        record("test", None, Io::default());
+        assert!(snapshot().is_empty());
+        let io = Io {
+            bytes_read: 4,
+            bytes_written: 0,
+            samples: 2,
+        };
+        record("test", Some(Instant::now()), io);
+        record("test", Some(Instant::now()), io);
+        let counters = snapshot()[0].1;
+        assert_eq!(
+            (counters.calls, counters.bytes_read, counters.samples),
+            (2, 8, 4)
+        );
+        reset();
+        assert!(snapshot().is_empty());
+    }
+}
@@ -1,10 +1,37 @@
-use pyo3::exceptions::PyValueError;
+use pyo3::exceptions::{PyIOError, PyRuntimeError, PyValueError};
 
 use log::info;
 
+use std::fs::File;
+use std::io::{self, BufReader, Read, Seek};
+use std::path::PathBuf;
+
 use hound;
-use numpy::{IntoPyArray, PyArray1, PyReadonlyArrayDyn};
+use numpy::ndarray::Ix2;
+use numpy::{
+    Element, IntoPyArray, PyArray1, PyArrayDyn, PyReadonlyArray1, PyReadonlyArrayDyn,
+    PyReadwriteArray1,
+};
 use pyo3::prelude::*;
+use pyo3::types::PyDict;
+use rayon::prelude::*;
+
+mod adpcm;
+mod decoder;
+mod dsp;
+mod instrument;
+mod samples;
+mod writer;
+
+use adpcm::{AdpcmState, ImaWavInfo};
+use decoder::MediaDecoder;
+use instrument::Io;
+use samples::{
+    fill_samples, read_samples, readonly, readwrite, same, u8_from_i8, SampleArray, SampleArrayMut,
+    SampleKind, SampleSlice, Samples,
+};
+use symphonia::core::errors::{Error as SymphoniaError, SeekErrorKind};
+use writer::{write_wav, WavFormat};
 //use symphonia::core::sample;
 
 #[pyclass]
@@ -15,11 +42,25 @@ struct WavFileMeta {
     sample_format_int: bool,
     duration: u32,
     length: u32,
-    duration_seconds: u32,
+    duration_seconds: f64,
 }
 
 #[pymethods]
 impl WavFileMeta {
+    #[new]
+    #[pyo3(signature = (bits_per_sample, channels, sample_rate, sample_format_int=true))]
+    fn new(bits_per_sample: u16, channels: u16, sample_rate: u32, sample_format_int: bool) -> Self {
+        WavFileMeta {
+            bits_per_sample: bits_per_sample,
+            channels: channels,
+            sample_rate: sample_rate,
+            sample_format_int: sample_format_int,
+            duration: 0,
+            length: 0,
+            duration_seconds: 0.0,
+        }
+    }
+
     #[getter]
     fn bits_per_sample(&self) -> u16 {
         self.bits_per_sample
@@ -51,7 +92,7 @@ impl WavFileMeta {
     }
 
     #[getter]
-    fn duration_seconds(&self) -> u32 {
+    fn duration_seconds(&self) -> f64 {
         self.duration_seconds
     }
 
@@ -63,121 +104,1163 @@ impl WavFileMeta {
     }
 }
 
-fn read_wav_file_metadata(file_path: &str) -> Result<WavFileMeta, hound::Error> {
-    let reader = hound::WavReader::open(file_path).unwrap();
+fn hound_error_to_py(err: hound::Error) -> PyErr {
+    match err {
+        hound::Error::IoError(e) => PyIOError::new_err(e.to_string()),
+        e => PyValueError::new_err(e.to_string()),
+    }
+}
+
+fn symphonia_error_to_py(err: SymphoniaError) -> PyErr {
+    match err {
+        SymphoniaError::IoError(e) => PyIOError::new_err(e.to_string()),
+        SymphoniaError::SeekError(SeekErrorKind::OutOfRange) => {
+            PyValueError::new_err("Starting sample is beyond the duration of the file")
+        }
+        e => PyValueError::new_err(e.to_string()),
+    }
+}
+
+fn wav_file_meta<R: std::io::Read>(reader: &hound::WavReader<R>) -> WavFileMeta {
     let duration = reader.duration();
     let length = reader.len();
     let spec = reader.spec();
-    Ok(WavFileMeta {
+    WavFileMeta {
         bits_per_sample: spec.bits_per_sample,
         channels: spec.channels,
         sample_rate: spec.sample_rate,
         sample_format_int: spec.sample_format == hound::SampleFormat::Int,
         duration: duration,
         length: length,
-        duration_seconds: duration / spec.sample_rate, //  TODO check if we should make it float
-    })
+        duration_seconds: if spec.sample_rate == 0 {
+            0.0
+        } else {
+            duration as f64 / spec.sample_rate as f64
+        },
+    }
+}
+
+fn ima_wav_meta(info: &ImaWavInfo) -> WavFileMeta {
+    // described as the 16-bit samples it decodes to
+    let duration = u32::try_from(info.n_frames).unwrap_or(u32::MAX);
+    WavFileMeta {
+        bits_per_sample: 16,
+        channels: info.channels,
+        sample_rate: info.sample_rate,
+        sample_format_int: true,
+        duration: duration,
+        length: duration.saturating_mul(info.channels as u32),
+        duration_seconds: if info.sample_rate == 0 {
+            0.0
+        } else {
+            info.n_frames as f64 / info.sample_rate as f64
+        },
+    }
+}
+
+/// hound can't read IMA ADPCM, the WAV readers fall back to `adpcm` for
+/// files it rejects. `Err(err)` (hound's error) when the file isn't IMA
+/// ADPCM either.
+fn ima_wav_info(file_path: &str, err: hound::Error) -> Result<ImaWavInfo, hound::Error> {
+    match adpcm::read_ima_wav_info(file_path) {
+        Ok(Some(info)) => Ok(info),
+        _ => Err(err),
+    }
+}
+
+fn read_wav_file_metadata(file_path: &str) -> Result<WavFileMeta, hound::Error> {
+    match hound::WavReader::open(file_path) {
+        Ok(reader) => Ok(wav_file_meta(&reader)),
+        Err(err) => Ok(ima_wav_meta(&ima_wav_info(file_path, err)?)),
+    }
 }
 
 #[pyfunction(name = "read_wav_file_metadata")]
-fn py_read_wav_file_metadata(file_path: &str) -> PyResult<WavFileMeta> {
-    Ok(read_wav_file_metadata(file_path).unwrap())
+fn py_read_wav_file_metadata(py: Python<'_>, file_path: &str) -> PyResult<WavFileMeta> {
+    let start = instrument::start();
+    let meta = py
+        .allow_threads(|| read_wav_file_metadata(file_path))
+        .map_err(hound_error_to_py)?;
+    instrument::record("read_wav_file_metadata", start, Io::default());
+    Ok(meta)
 }
 
-#[pyfunction(name = "read_wav_file")]
-fn py_read_wav_file_np<'py>(
+/// Reads the header of every file in `file_paths` in parallel and returns
+/// the metadata as a dict of columns (one numpy array per field). A file
+/// that can't be read doesn't raise: its row is zeroed and the reason is
+/// put in the `error` column, which is `None` for every other file.
+#[pyfunction(name = "read_wav_files_metadata")]
+#[pyo3(signature = (file_paths, num_threads=None))]
+fn py_read_wav_files_metadata<'py>(
     py: Python<'py>,
+    file_paths: Vec<String>,
+    num_threads: Option<usize>,
+) -> PyResult<Bound<'py, PyDict>> {
+    info!("Reading metadata of {} WAV files", file_paths.len());
+    let start = instrument::start();
+    let results = py.allow_threads(|| {
+        run_on_pool(num_threads, || {
+            file_paths
+                .par_iter()
+                .map(|file_path| read_wav_file_metadata(file_path))
+                .collect::<Vec<_>>()
+        })
+    })?;
+
+    let n = results.len();
+    let mut sample_rate = Vec::with_capacity(n);
+    let mut channels = Vec::with_capacity(n);
+    let mut bits_per_sample = Vec::with_capacity(n);
+    let mut sample_format_int = Vec::with_capacity(n);
+    let mut frames = Vec::with_capacity(n);
+    let mut duration_seconds = Vec::with_capacity(n);
+    let mut error = Vec::with_capacity(n);
+    for result in results {
+        let meta = match result {
+            Ok(meta) => {
+                error.push(None);
+                meta
+            }
+            Err(e) => {
+                error.push(Some(e.to_string()));
+                WavFileMeta::new(0, 0, 0, false)
+            }
+        };
+        sample_rate.push(meta.sample_rate);
+        channels.push(meta.channels);
+        bits_per_sample.push(meta.bits_per_sample);
+        sample_format_int.push(meta.sample_format_int);
+        frames.push(meta.duration);
+        duration_seconds.push(meta.duration_seconds);
+    }
+
+    let columns = PyDict::new_bound(py);
+    columns.set_item("sample_rate", sample_rate.into_pyarray_bound(py))?;
+    columns.set_item("channels", channels.into_pyarray_bound(py))?;
+    columns.set_item("bits_per_sample", bits_per_sample.into_pyarray_bound(py))?;
+    columns.set_item(
+        "sample_format_int",
+        sample_format_int.into_pyarray_bound(py),
+    )?;
+    columns.set_item("frames", frames.into_pyarray_bound(py))?;
+    columns.set_item("duration_seconds", duration_seconds.into_pyarray_bound(py))?;
+    columns.set_item("error", error)?;
+    instrument::record("read_wav_files_metadata", start, Io::default());
+    Ok(columns)
+}
+
+/// Runs `f` on a dedicated pool of `num_threads` threads, or on the global
+/// rayon pool (one thread per core) when `num_threads` is `None`.
+fn run_on_pool<T, F>(num_threads: Option<usize>, f: F) -> PyResult<T>
+where
+    T: Send,
+    F: FnOnce() -> T + Send,
+{
+    match num_threads {
+        Some(num_threads) => rayon::ThreadPoolBuilder::new()
+            .num_threads(num_threads)
+            .build()
+            .map(|pool| pool.install(f))
+            .map_err(|e| PyRuntimeError::new_err(e.to_string())),
+        None => Ok(f()),
+    }
+}
+
+/// Bits a sample takes in an IMA ADPCM file, block headers aside.
+const IMA_ADPCM_BITS: u64 = 4;
+
+/// Bits a sample takes in a PCM file: whole bytes.
+fn pcm_bits(bits_per_sample: u16) -> u64 {
+    (bits_per_sample as u64 + 7) / 8 * 8
+}
+
+/// What reading `n_samples` samples of `bits` bits each moved.
+fn read_io(n_samples: usize, bits: u64) -> Io {
+    Io {
+        bytes_read: (n_samples as u64 * bits + 7) / 8,
+        bytes_written: 0,
+        samples: n_samples as u64,
+    }
+}
+
+/// Frame playing at `time_ms` (rounded down), exact for any sample rate.
+fn ms_to_frame(time_ms: u64, sample_rate: u32) -> u32 {
+    u32::try_from(time_ms * sample_rate as u64 / 1000).unwrap_or(u32::MAX)
+}
+
+/// Decodes `n_frames` frames starting at `start_frame`, or every frame up to
+/// the end of the file when `n_frames` is `None`. Only the requested range is
+/// read from disk.
+fn read_frame_range<R: Read + Seek>(
+    reader: &mut hound::WavReader<R>,
+    start_frame: u32,
+    n_frames: Option<u32>,
+) -> PyResult<Samples> {
+    if start_frame > reader.duration() {
+        return Err(PyErr::new::<PyValueError, _>(
+            "Starting sample is beyond the duration of the WAV file",
+        ));
+    }
+    reader
+        .seek(start_frame)
+        .map_err(|e| PyIOError::new_err(e.to_string()))?;
+    let channels = reader.spec().channels as usize;
+    let n_samples = n_frames.map_or(usize::MAX, |n| n as usize * channels);
+    read_samples(reader, n_samples).map_err(hound_error_to_py)
+}
+
+/// Same as `read_frame_range` for an IMA ADPCM file, decoded to i16.
+fn read_ima_frame_range(
+    file_path: &str,
+    info: &ImaWavInfo,
+    start_frame: u32,
+    n_frames: Option<u32>,
+) -> PyResult<Samples> {
+    if start_frame as u64 > info.n_frames {
+        return Err(PyErr::new::<PyValueError, _>(
+            "Starting sample is beyond the duration of the WAV file",
+        ));
+    }
+    adpcm::read_ima_wav_range(file_path, info, start_frame as u64, n_frames.map(u64::from))
+        .map(Samples::I16)
+        .map_err(|e| match e.kind() {
+            io::ErrorKind::InvalidData => PyValueError::new_err(e.to_string()),
+            _ => PyIOError::new_err(e.to_string()),
+        })
+}
+
+fn read_wav_range(
+    file_path: &str,
+    start_frame: u32,
+    n_frames: Option<u32>,
+) -> PyResult<(Samples, Io)> {
+    match hound::WavReader::open(file_path) {
+        Ok(mut reader) => {
+            let bits = pcm_bits(reader.spec().bits_per_sample);
+            let samples = read_frame_range(&mut reader, start_frame, n_frames)?;
+            let io = read_io(samples.len(), bits);
+            Ok((samples, io))
+        }
+        Err(err) => {
+            let info = ima_wav_info(file_path, err).map_err(hound_error_to_py)?;
+            let samples = read_ima_frame_range(file_path, &info, start_frame, n_frames)?;
+            let io = read_io(samples.len(), IMA_ADPCM_BITS);
+            Ok((samples, io))
+        }
+    }
+}
+
+#[pyfunction(name = "read_wav_file")]
+#[pyo3(signature = (file_path, starting_time_ms=0, duration_ms=None))]
+fn py_read_wav_file_np(
+    py: Python<'_>,
     file_path: &str,
     starting_time_ms: u32,
-) -> PyResult<Bound<'py, PyArray1<i16>>> {
+    duration_ms: Option<u32>,
+) -> PyResult<PyObject> {
     info!("Reading WAV file: {}", file_path);
-    let mut reader = hound::WavReader::open(file_path).unwrap();
-    info!("reader created");
-    let duration = reader.duration();
-    let sample_rate = reader.spec().sample_rate;
-    let channel = reader.spec().channels;
-    let starting_sample = starting_time_ms / 1000 * sample_rate;
-    if starting_sample > duration {
-        Err(PyErr::new::<PyValueError, _>(
-            "Starting sample is beyond the duration of the WAV file",
-        ))
-    } else {
-        reader.seek(starting_sample).unwrap();
-        match channel {
-            1 => {
-                let samples: Vec<i16> = reader.samples::<i16>().map(|s| s.unwrap()).collect();
-                Ok(samples.into_pyarray_bound(py))
-            }
-            2 => {
-                // let samples: Vec<i16> = reader.samples::<i16, i16>().map(|s| s.unwrap()).collect();
+    let frame_range = |sample_rate: u32| {
+        let start_frame = ms_to_frame(starting_time_ms as u64, sample_rate);
+        // derive the end from the end time so consecutive ranges tile exactly
+        let n_frames = duration_ms.map(|duration_ms| {
+            ms_to_frame(starting_time_ms as u64 + duration_ms as u64, sample_rate) - start_frame
+        });
+        (start_frame, n_frames)
+    };
+    let start = instrument::start();
+    let (samples, io) = py.allow_threads(|| match hound::WavReader::open(file_path) {
+        Ok(mut reader) => {
+            info!("reader created");
+            let spec = reader.spec();
+            let (start_frame, n_frames) = frame_range(spec.sample_rate);
+            let samples = read_frame_range(&mut reader, start_frame, n_frames)?;
+            let io = read_io(samples.len(), pcm_bits(spec.bits_per_sample));
+            Ok((samples, io))
+        }
+        Err(err) => {
+            let info = ima_wav_info(file_path, err).map_err(hound_error_to_py)?;
+            let (start_frame, n_frames) = frame_range(info.sample_rate);
+            let samples = read_ima_frame_range(file_path, &info, start_frame, n_frames)?;
+            let io = read_io(samples.len(), IMA_ADPCM_BITS);
+            Ok((samples, io))
+        }
+    })?;
+    let array = samples.into_pyarray(py);
+    instrument::record("read_wav_file", start, io);
+    Ok(array)
+}
 
-                let samples1: Vec<i16> = reader.samples().map(|s| s.unwrap()).collect();
-                Ok(PyArray1::from_vec_bound(py, samples1))
-                //Ok(samples1.into_pyarray_bound(py))
+#[pyfunction(name = "read_wav_frames")]
+#[pyo3(signature = (file_path, start_frame=0, n_frames=None))]
+fn py_read_wav_frames(
+    py: Python<'_>,
+    file_path: &str,
+    start_frame: u32,
+    n_frames: Option<u32>,
+) -> PyResult<PyObject> {
+    info!("Reading WAV file frames: {}", file_path);
+    let start = instrument::start();
+    let (samples, io) = py.allow_threads(|| read_wav_range(file_path, start_frame, n_frames))?;
+    let array = samples.into_pyarray(py);
+    instrument::record("read_wav_frames", start, io);
+    Ok(array)
+}
+
+/// Reads the same frame range from every file in `file_paths`, decoding the
+/// files in parallel on a thread pool with the GIL released. Uses the global
+/// pool (one thread per core) unless `num_threads` is given. Fails with the
+/// first error, naming the file.
+#[pyfunction(name = "read_wav_files")]
+#[pyo3(signature = (file_paths, start_frame=0, n_frames=None, num_threads=None))]
+fn py_read_wav_files(
+    py: Python<'_>,
+    file_paths: Vec<String>,
+    start_frame: u32,
+    n_frames: Option<u32>,
+    num_threads: Option<usize>,
+) -> PyResult<Vec<PyObject>> {
+    info!("Reading {} WAV files", file_paths.len());
+    let start = instrument::start();
+    let results = py.allow_threads(|| {
+        run_on_pool(num_threads, || {
+            file_paths
+                .par_iter()
+                .map(|file_path| read_wav_range(file_path, start_frame, n_frames))
+                .collect::<Vec<_>>()
+        })
+    })?;
+    let mut total = Io::default();
+    let arrays = results
+        .into_iter()
+        .zip(&file_paths)
+        .map(|(result, file_path)| match result {
+            Ok((samples, io)) => {
+                total += io;
+                Ok(samples.into_pyarray(py))
             }
-            _ => Err(PyErr::new::<PyValueError, _>(
-                "Only mono and stereo channels are supported",
+            Err(e) => Err(PyErr::from_type_bound(
+                e.get_type_bound(py),
+                format!("{}: {}", file_path, e.value_bound(py)),
             )),
+        })
+        .collect::<PyResult<Vec<_>>>()?;
+    instrument::record("read_wav_files", start, total);
+    Ok(arrays)
+}
+
+/// Reads a WAV file block by block, so memory use only depends on the block size.
+///
+/// Blocks always hold whole frames of interleaved samples in the native
+/// container of the file (see `SampleKind`). The reader keeps its position
+/// between calls, `read_into` fills a caller-owned buffer so one allocation
+/// can be reused for the whole file.
+#[pyclass]
+struct WavStreamReader {
+    reader: hound::WavReader<BufReader<File>>,
+    kind: SampleKind,
+    channels: u16,
+    block_frames: u32,
+    position: u32,
+}
+
+impl WavStreamReader {
+    fn bits(&self) -> u64 {
+        pcm_bits(self.reader.spec().bits_per_sample)
+    }
+
+    fn read_frames(&mut self, n_frames: usize) -> Result<Samples, hound::Error> {
+        let channels = self.channels as usize;
+        let samples = read_samples(&mut self.reader, n_frames * channels)?;
+        self.position += (samples.len() / channels) as u32;
+        Ok(samples)
+    }
+
+    fn fill<S: hound::Sample, T: Element + Send>(
+        &mut self,
+        py: Python<'_>,
+        out: &mut PyReadwriteArray1<'_, T>,
+        convert: fn(S) -> T,
+    ) -> PyResult<usize> {
+        let channels = self.channels as usize;
+        let buffer = out
+            .as_slice_mut()
+            .map_err(|_| PyValueError::new_err("output buffer must be contiguous"))?;
+        let whole_frames = buffer.len() / channels * channels;
+        let reader = &mut self.reader;
+        let n_samples = py
+            .allow_threads(|| fill_samples(reader, &mut buffer[..whole_frames], convert))
+            .map_err(hound_error_to_py)?;
+        let n_frames = n_samples / channels;
+        self.position += n_frames as u32;
+        Ok(n_frames)
+    }
+}
+
+#[pymethods]
+impl WavStreamReader {
+    #[new]
+    #[pyo3(signature = (file_path, block_frames=4096))]
+    fn new(file_path: &str, block_frames: u32) -> PyResult<Self> {
+        if block_frames == 0 {
+            return Err(PyValueError::new_err("block_frames must be positive"));
+        }
+        info!("Streaming WAV file: {}", file_path);
+        let reader = hound::WavReader::open(file_path).map_err(hound_error_to_py)?;
+        let kind = SampleKind::from_spec(&reader.spec()).map_err(hound_error_to_py)?;
+        let channels = reader.spec().channels;
+        Ok(WavStreamReader {
+            reader: reader,
+            kind: kind,
+            channels: channels,
+            block_frames: block_frames,
+            position: 0,
+        })
+    }
+
+    #[getter]
+    fn metadata(&self) -> WavFileMeta {
+        wav_file_meta(&self.reader)
+    }
+
+    /// numpy dtype of the blocks.
+    #[getter]
+    fn dtype(&self) -> &'static str {
+        self.kind.dtype()
+    }
+
+    /// Index of the next frame to be read.
+    #[getter]
+    fn position(&self) -> u32 {
+        self.position
+    }
+
+    #[getter]
+    fn block_frames(&self) -> u32 {
+        self.block_frames
+    }
+
+    fn seek(&mut self, frame: u32) -> PyResult<()> {
+        if frame > self.reader.duration() {
+            return Err(PyValueError::new_err(
+                "Seek position is beyond the duration of the WAV file",
+            ));
         }
+        self.reader
+            .seek(frame)
+            .map_err(|e| PyIOError::new_err(e.to_string()))?;
+        self.position = frame;
+        Ok(())
+    }
+
+    /// Reads up to `n_frames` frames (one block by default) into a new array.
+    /// The array is empty once the end of the file is reached.
+    #[pyo3(signature = (n_frames=None))]
+    fn read(&mut self, py: Python<'_>, n_frames: Option<u32>) -> PyResult<PyObject> {
+        let start = instrument::start();
+        let n_frames = n_frames.unwrap_or(self.block_frames) as usize;
+        let samples = py
+            .allow_threads(|| self.read_frames(n_frames))
+            .map_err(hound_error_to_py)?;
+        let io = read_io(samples.len(), self.bits());
+        let array = samples.into_pyarray(py);
+        instrument::record("WavStreamReader.read", start, io);
+        Ok(array)
+    }
+
+    /// Fills `out`, whose dtype must be `self.dtype`, with as many whole
+    /// frames as fit and returns the number of frames read, 0 at the end of
+    /// the file.
+    fn read_into(&mut self, py: Python<'_>, out: &Bound<'_, PyAny>) -> PyResult<usize> {
+        let start = instrument::start();
+        let n_frames = match self.kind {
+            SampleKind::U8 => {
+                self.fill(py, &mut out.extract::<PyReadwriteArray1<u8>>()?, u8_from_i8)
+            }
+            SampleKind::I16 => self.fill(
+                py,
+                &mut out.extract::<PyReadwriteArray1<i16>>()?,
+                same::<i16>,
+            ),
+            SampleKind::I32 => self.fill(
+                py,
+                &mut out.extract::<PyReadwriteArray1<i32>>()?,
+                same::<i32>,
+            ),
+            SampleKind::F32 => self.fill(
+                py,
+                &mut out.extract::<PyReadwriteArray1<f32>>()?,
+                same::<f32>,
+            ),
+        }?;
+        let io = read_io(n_frames * self.channels as usize, self.bits());
+        instrument::record("WavStreamReader.read_into", start, io);
+        Ok(n_frames)
+    }
+
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
     }
+
+    fn __next__(&mut self, py: Python<'_>) -> PyResult<Option<PyObject>> {
+        let start = instrument::start();
+        let block_frames = self.block_frames as usize;
+        let samples = py
+            .allow_threads(|| self.read_frames(block_frames))
+            .map_err(hound_error_to_py)?;
+        let io = read_io(samples.len(), self.bits());
+        instrument::record("WavStreamReader.__next__", start, io);
+        if samples.is_empty() {
+            Ok(None)
+        } else {
+            Ok(Some(samples.into_pyarray(py)))
+        }
+    }
+}
+
+/// Describes decoded samples the way a WAV file holding them would: 16-bit
+/// integers, or 32-bit float with `float`.
+fn decoded_meta(decoder: &MediaDecoder, float: bool) -> WavFileMeta {
+    let mut meta = WavFileMeta::new(
+        if float { 32 } else { 16 },
+        decoder.channels,
+        decoder.sample_rate,
+        !float,
+    );
+    if let Some(n_frames) = decoder.n_frames {
+        meta.duration = n_frames as u32;
+        meta.length = meta.duration * decoder.channels as u32;
+        meta.duration_seconds = n_frames as f64 / decoder.sample_rate as f64;
+    }
+    meta
+}
+
+/// Metadata of a compressed audio file as it will be decoded, see
+/// `decoded_meta`. `duration` is 0 when the container doesn't state it.
+#[pyfunction(name = "read_audio_file_metadata")]
+#[pyo3(signature = (file_path, float=false))]
+fn py_read_audio_file_metadata(
+    py: Python<'_>,
+    file_path: &str,
+    float: bool,
+) -> PyResult<WavFileMeta> {
+    let start = instrument::start();
+    let meta = py
+        .allow_threads(|| {
+            let decoder = MediaDecoder::open(file_path)?;
+            Ok(decoded_meta(&decoder, float))
+        })
+        .map_err(symphonia_error_to_py)?;
+    instrument::record("read_audio_file_metadata", start, Io::default());
+    Ok(meta)
+}
+
+/// Decodes a compressed audio file (MP3, FLAC, Ogg Vorbis...) with the GIL
+/// released into interleaved int16 samples, or float32 with `float=True`.
+/// The range is given in frames like `read_wav_frames`.
+#[pyfunction(name = "read_audio_file")]
+#[pyo3(signature = (file_path, start_frame=0, n_frames=None, float=false))]
+fn py_read_audio_file(
+    py: Python<'_>,
+    file_path: &str,
+    start_frame: u64,
+    n_frames: Option<u64>,
+    float: bool,
+) -> PyResult<PyObject> {
+    info!("Decoding audio file: {}", file_path);
+    let start = instrument::start();
+    let (samples, bytes_read) = py
+        .allow_threads(|| -> Result<_, SymphoniaError> {
+            let mut decoder = MediaDecoder::open(file_path)?;
+            let samples = decoder.decode_range(start_frame, n_frames, float)?;
+            Ok((samples, decoder.bytes_read))
+        })
+        .map_err(symphonia_error_to_py)?;
+    let io = Io {
+        bytes_read,
+        bytes_written: 0,
+        samples: samples.len() as u64,
+    };
+    let array = samples.into_pyarray(py);
+    instrument::record("read_audio_file", start, io);
+    Ok(array)
 }
 
-fn read_wav_file(file_path: &str) -> Result<Vec<i16>, hound::Error> {
+/// Decodes a compressed audio file packet by packet, each iteration returns
+/// the interleaved samples of one packet (a few ms of audio for MP3).
+#[pyclass]
+struct AudioStreamReader {
+    decoder: MediaDecoder,
+    float: bool,
+}
+
+#[pymethods]
+impl AudioStreamReader {
+    #[new]
+    #[pyo3(signature = (file_path, float=false))]
+    fn new(file_path: &str, float: bool) -> PyResult<Self> {
+        let decoder = MediaDecoder::open(file_path).map_err(symphonia_error_to_py)?;
+        Ok(AudioStreamReader { decoder, float })
+    }
+
+    #[getter]
+    fn metadata(&self) -> WavFileMeta {
+        decoded_meta(&self.decoder, self.float)
+    }
+
+    #[getter]
+    fn dtype(&self) -> &'static str {
+        if self.float {
+            SampleKind::F32.dtype()
+        } else {
+            SampleKind::I16.dtype()
+        }
+    }
+
+    fn __iter__(slf: PyRef<'_, Self>) -> PyRef<'_, Self> {
+        slf
+    }
+
+    fn __next__(&mut self, py: Python<'_>) -> PyResult<Option<PyObject>> {
+        let start = instrument::start();
+        let bytes_before = self.decoder.bytes_read;
+        let float = self.float;
+        let decoder = &mut self.decoder;
+        let samples = py
+            .allow_threads(|| decoder.decode_packet(float))
+            .map_err(symphonia_error_to_py)?;
+        let io = Io {
+            bytes_read: self.decoder.bytes_read - bytes_before,
+            bytes_written: 0,
+            samples: samples.as_ref().map_or(0, |samples| samples.len() as u64),
+        };
+        instrument::record("AudioStreamReader.__next__", start, io);
+        Ok(samples.map(|samples| samples.into_pyarray(py)))
+    }
+}
+
+fn adpcm_state(state: Option<(i32, i32)>) -> PyResult<AdpcmState> {
+    match state {
+        None => Ok(AdpcmState::default()),
+        Some((valpred, index)) => {
+            AdpcmState::new(valpred, index).ok_or_else(|| PyValueError::new_err("bad state"))
+        }
+    }
+}
+
+/// IMA ADPCM codes of 16-bit samples, two per byte like `audioop.lin2adpcm`.
+/// `state` is the `(valpred, index)` returned by the previous call (`None`
+/// at the start of a stream), returns the codes and the new state.
+#[pyfunction(name = "ima_adpcm_encode")]
+#[pyo3(signature = (samples, state=None))]
+fn py_ima_adpcm_encode<'py>(
+    py: Python<'py>,
+    samples: PyReadonlyArray1<'py, i16>,
+    state: Option<(i32, i32)>,
+) -> PyResult<(Bound<'py, PyArray1<u8>>, (i32, i32))> {
+    let start = instrument::start();
+    let mut state = adpcm_state(state)?;
+    let samples = samples
+        .as_slice()
+        .map_err(|_| PyValueError::new_err("samples must be C-contiguous"))?;
+    let codes = py.allow_threads(|| adpcm::encode(samples, &mut state));
+    let io = Io {
+        samples: samples.len() as u64,
+        ..Io::default()
+    };
+    instrument::record("ima_adpcm_encode", start, io);
+    Ok((codes.into_pyarray_bound(py), (state.valpred, state.index)))
+}
+
+/// 16-bit samples of IMA ADPCM codes, the inverse of `ima_adpcm_encode`.
+#[pyfunction(name = "ima_adpcm_decode")]
+#[pyo3(signature = (codes, state=None))]
+fn py_ima_adpcm_decode<'py>(
+    py: Python<'py>,
+    codes: PyReadonlyArray1<'py, u8>,
+    state: Option<(i32, i32)>,
+) -> PyResult<(Bound<'py, PyArray1<i16>>, (i32, i32))> {
+    let start = instrument::start();
+    let mut state = adpcm_state(state)?;
+    let codes = codes
+        .as_slice()
+        .map_err(|_| PyValueError::new_err("codes must be C-contiguous"))?;
+    let samples = py.allow_threads(|| adpcm::decode(codes, &mut state));
+    let io = Io {
+        samples: samples.len() as u64,
+        ..Io::default()
+    };
+    instrument::record("ima_adpcm_decode", start, io);
+    Ok((samples.into_pyarray_bound(py), (state.valpred, state.index)))
+}
+
+/// Binds `$array` to the typed array of any variant of a `SampleArrayMut`.
+macro_rules! with_samples_mut {
+    ($samples:expr, $array:ident => $body:expr) => {
+        match $samples {
+            SampleArrayMut::I16($array) => $body,
+            SampleArrayMut::I32($array) => $body,
+            SampleArrayMut::F32($array) => $body,
+        }
+    };
+}
+
+/// Rejects sample widths the integer container `T` can't hold.
+fn check_width<T: dsp::Sample>(width: u32) -> PyResult<()> {
+    if T::FLOAT || (1..=T::WIDTH).contains(&width) {
+        Ok(())
+    } else {
+        Err(PyValueError::new_err(format!(
+            "{}-byte samples don't fit in a {}-byte container",
+            width,
+            T::WIDTH
+        )))
+    }
+}
+
+fn check_shapes(samples: &[usize], other: &[usize]) -> PyResult<()> {
+    if samples == other {
+        Ok(())
+    } else {
+        Err(PyValueError::new_err(format!(
+            "shapes {:?} and {:?} differ",
+            samples, other
+        )))
+    }
+}
+
+fn samples_io(n_samples: usize) -> Io {
+    Io {
+        samples: n_samples as u64,
+        ..Io::default()
+    }
+}
+
+fn gain_array<T: dsp::Sample + Element>(
+    py: Python<'_>,
+    array: &Bound<'_, PyArrayDyn<T>>,
+    width: u32,
+    factor: f64,
+) -> PyResult<usize> {
+    check_width::<T>(width)?;
+    let mut array = readwrite(array)?;
+    let samples = array.as_array_mut();
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::gain(samples, width, factor));
+    Ok(n_samples)
+}
+
+fn add_array<'py, T: dsp::Sample + Element>(
+    py: Python<'py>,
+    array: &Bound<'py, PyArrayDyn<T>>,
+    other: &Bound<'py, PyAny>,
+    width: u32,
+) -> PyResult<usize> {
+    check_width::<T>(width)?;
+    let other = other.downcast::<PyArrayDyn<T>>()?;
+    let mut array = readwrite(array)?;
+    // `other` may not alias `array`: the kernel reads it while writing
+    let other = readonly(other)?;
+    let samples = array.as_array_mut();
+    let other = other.as_array();
+    check_shapes(samples.shape(), other.shape())?;
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::add(samples, other, width));
+    Ok(n_samples)
+}
+
+fn bias_array<T: dsp::Sample + Element>(
+    py: Python<'_>,
+    array: &Bound<'_, PyArrayDyn<T>>,
+    width: u32,
+    bias: f64,
+) -> PyResult<usize> {
+    check_width::<T>(width)?;
+    let mut array = readwrite(array)?;
+    let samples = array.as_array_mut();
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::bias(samples, width, bias));
+    Ok(n_samples)
+}
+
+fn clip_array<T: dsp::Sample + Element>(
+    py: Python<'_>,
+    array: &Bound<'_, PyArrayDyn<T>>,
+    lo: f64,
+    hi: f64,
+) -> PyResult<usize> {
+    let mut array = readwrite(array)?;
+    let samples = array.as_array_mut();
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::clip(samples, lo, hi));
+    Ok(n_samples)
+}
+
+fn interleave_array<'py, T: dsp::Sample + Element>(
+    py: Python<'py>,
+    channels: &[Bound<'py, PyAny>],
+    out: &Bound<'py, PyArrayDyn<T>>,
+) -> PyResult<usize> {
+    let mut out = readwrite(out)?;
+    let channels = channels
+        .iter()
+        .map(|channel| readonly(channel.downcast::<PyArray1<T>>()?))
+        .collect::<PyResult<Vec<_>>>()?;
+    let channels: Vec<_> = channels.iter().map(|channel| channel.as_array()).collect();
+    let frames = out
+        .as_array_mut()
+        .into_dimensionality::<Ix2>()
+        .map_err(|_| PyValueError::new_err("out must be laid out as (frames, channels)"))?;
+    check_shapes(&[channels.len()], &[frames.ncols()])?;
+    let n_samples = frames.len();
+    py.allow_threads(|| dsp::interleave(&channels, frames));
+    Ok(n_samples)
+}
+
+fn deinterleave_array<'py, T: dsp::Sample + Element>(
+    py: Python<'py>,
+    samples: &PyReadonlyArrayDyn<'py, T>,
+    outs: &[Bound<'py, PyAny>],
+) -> PyResult<usize> {
+    let frames = samples
+        .as_array()
+        .into_dimensionality::<Ix2>()
+        .map_err(|_| PyValueError::new_err("samples must be laid out as (frames, channels)"))?;
+    check_shapes(&[frames.ncols()], &[outs.len()])?;
+    let mut outs = outs
+        .iter()
+        .map(|out| readwrite(out.downcast::<PyArray1<T>>()?))
+        .collect::<PyResult<Vec<_>>>()?;
+    let outs: Vec<_> = outs.iter_mut().map(|out| out.as_array_mut()).collect();
+    let n_samples = frames.len();
+    py.allow_threads(|| dsp::deinterleave(frames, outs));
+    Ok(n_samples)
+}
+
+fn int_to_float_array<T: dsp::Sample + Element>(
+    py: Python<'_>,
+    samples: &PyReadonlyArrayDyn<'_, T>,
+    width: u32,
+    out: &Bound<'_, PyArrayDyn<f32>>,
+) -> PyResult<usize> {
+    check_width::<T>(width)?;
+    let mut out = readwrite(out)?;
+    let samples = samples.as_array();
+    let out = out.as_array_mut();
+    check_shapes(samples.shape(), out.shape())?;
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::int_to_float(samples, width, out));
+    Ok(n_samples)
+}
+
+fn float_to_int_array<T: dsp::Sample + Element>(
+    py: Python<'_>,
+    samples: &PyReadonlyArrayDyn<'_, f32>,
+    width: u32,
+    out: &Bound<'_, PyArrayDyn<T>>,
+) -> PyResult<usize> {
+    if T::FLOAT {
+        return Err(PyValueError::new_err("out must hold integer samples"));
+    }
+    check_width::<T>(width)?;
+    let mut out = readwrite(out)?;
+    let samples = samples.as_array();
+    let out = out.as_array_mut();
+    check_shapes(samples.shape(), out.shape())?;
+    let n_samples = samples.len();
+    py.allow_threads(|| dsp::float_to_int(samples, width, out));
+    Ok(n_samples)
+}
+
+/// Multiplies int16, int32 or float32 `samples` by `factor` in place, like
+/// `npaudioop.mul`: integer results are floored and saturated to `width`
+/// bytes.
+#[pyfunction(name = "gain_inplace")]
+fn py_gain_inplace(
+    py: Python<'_>,
+    samples: SampleArrayMut<'_>,
+    width: u32,
+    factor: f64,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = with_samples_mut!(samples, array => gain_array(py, &array, width, factor))?;
+    instrument::record("gain_inplace", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Adds `other` (same dtype and shape) to `samples` in place, saturating
+/// like `npaudioop.add`.
+#[pyfunction(name = "add_inplace")]
+fn py_add_inplace<'py>(
+    py: Python<'py>,
+    samples: SampleArrayMut<'py>,
+    other: &Bound<'py, PyAny>,
+    width: u32,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = with_samples_mut!(samples, array => add_array(py, &array, other, width))?;
+    instrument::record("add_inplace", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Adds the DC offset `bias` in place, integer samples wrap around like
+/// `npaudioop.bias`.
+#[pyfunction(name = "bias_inplace")]
+fn py_bias_inplace(
+    py: Python<'_>,
+    samples: SampleArrayMut<'_>,
+    width: u32,
+    bias: f64,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = with_samples_mut!(samples, array => bias_array(py, &array, width, bias))?;
+    instrument::record("bias_inplace", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Limits `samples` to `[lo, hi]` in place.
+#[pyfunction(name = "clip_inplace")]
+fn py_clip_inplace(py: Python<'_>, samples: SampleArrayMut<'_>, lo: f64, hi: f64) -> PyResult<()> {
+    if !(lo <= hi) {
+        return Err(PyValueError::new_err("lo must not be greater than hi"));
+    }
+    let start = instrument::start();
+    let n_samples = with_samples_mut!(samples, array => clip_array(py, &array, lo, hi))?;
+    instrument::record("clip_inplace", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Writes the 1-d `channels` to the columns of `out`, laid out as (frames,
+/// channels) and of the same dtype. Frames after the end of a shorter
+/// channel are left as they are.
+#[pyfunction(name = "interleave")]
+fn py_interleave<'py>(
+    py: Python<'py>,
+    channels: Vec<Bound<'py, PyAny>>,
+    out: SampleArrayMut<'py>,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = with_samples_mut!(out, array => interleave_array(py, &channels, &array))?;
+    instrument::record("interleave", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Writes the columns of `samples`, laid out as (frames, channels), to the
+/// 1-d writable arrays of `outs`, the inverse of `interleave`.
+#[pyfunction(name = "deinterleave")]
+fn py_deinterleave<'py>(
+    py: Python<'py>,
+    samples: SampleArray<'py>,
+    outs: Vec<Bound<'py, PyAny>>,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = match samples {
+        SampleArray::I16(samples) => deinterleave_array(py, &samples, &outs),
+        SampleArray::I32(samples) => deinterleave_array(py, &samples, &outs),
+        SampleArray::F32(samples) => deinterleave_array(py, &samples, &outs),
+        SampleArray::U8(_) => Err(PyValueError::new_err(
+            "samples must be int16, int32 or float32",
+        )),
+    }?;
+    instrument::record("deinterleave", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Writes int16 or int32 `samples` of `width` bytes to the float32 array
+/// `out` of the same shape, normalized like `npaudioop.lin2float`.
+#[pyfunction(name = "int_to_float")]
+fn py_int_to_float<'py>(
+    py: Python<'py>,
+    samples: SampleArray<'py>,
+    width: u32,
+    out: Bound<'py, PyArrayDyn<f32>>,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples = match samples {
+        SampleArray::I16(samples) => int_to_float_array(py, &samples, width, &out),
+        SampleArray::I32(samples) => int_to_float_array(py, &samples, width, &out),
+        SampleArray::U8(_) | SampleArray::F32(_) => {
+            Err(PyValueError::new_err("samples must be int16 or int32"))
+        }
+    }?;
+    instrument::record("int_to_float", start, samples_io(n_samples));
+    Ok(())
+}
+
+/// Writes normalized float32 `samples` to the int16 or int32 array `out` of
+/// the same shape as samples of `width` bytes, rounded to nearest and
+/// saturated like `npaudioop.float2lin` without dither.
+#[pyfunction(name = "float_to_int")]
+fn py_float_to_int<'py>(
+    py: Python<'py>,
+    samples: PyReadonlyArrayDyn<'py, f32>,
+    width: u32,
+    out: SampleArrayMut<'py>,
+) -> PyResult<()> {
+    let start = instrument::start();
+    let n_samples =
+        with_samples_mut!(out, array => float_to_int_array(py, &samples, width, &array))?;
+    instrument::record("float_to_int", start, samples_io(n_samples));
+    Ok(())
+}
+
+fn read_wav_file(file_path: &str) -> Result<Samples, hound::Error> {
     info!("Reading WAV file: {}", file_path);
-    let mut reader = hound::WavReader::open(file_path).unwrap();
+    let mut reader = hound::WavReader::open(file_path)?;
     info!("reader created");
     let duration = reader.duration();
     let sample_rate = reader.spec().sample_rate;
     let channel = reader.spec().channels;
-    let samples: Vec<i16> = reader.samples::<i16>().map(|s| s.unwrap()).collect();
+    let samples = read_samples(&mut reader, usize::MAX)?;
     info!("{:?}, {:?}, {:?}", channel, duration, sample_rate);
     Ok(samples)
 }
 
+/// Where `write_wav_file` writes to: a path, or the descriptor of a file the
+/// caller already opened (it is left open, writing starts at its current
+/// offset).
+#[derive(FromPyObject)]
+enum WavTarget {
+    Path(PathBuf),
+    Fd(i32),
+}
+
+#[cfg(unix)]
+fn write_wav_fd(fd: i32, format: &WavFormat, samples: SampleSlice<'_>) -> io::Result<()> {
+    use std::mem::ManuallyDrop;
+    use std::os::unix::io::FromRawFd;
+
+    // the descriptor belongs to the caller, it must not be closed on drop
+    let mut file = ManuallyDrop::new(unsafe { File::from_raw_fd(fd) });
+    write_wav(&mut *file, format, samples)
+}
+
+#[cfg(not(unix))]
+fn write_wav_fd(_fd: i32, _format: &WavFormat, _samples: SampleSlice<'_>) -> io::Result<()> {
+    Err(io::Error::new(
+        io::ErrorKind::Unsupported,
+        "writing to a file descriptor is only supported on unix",
+    ))
+}
+
+/// Writes `data` (u8, i16, i32 or f32, interleaved) as a WAV file laid out
+/// as described by `spec`. i32 data is packed to 3 bytes for 24-bit specs.
+/// The samples are encoded and written in large blocks with the GIL released.
 #[pyfunction(name = "write_wav_file")]
 fn py_write_wav_file_np<'py>(
     py: Python<'py>,
-    file_path: &str,
+    file: WavTarget,
     spec: &WavFileMeta,
-    data: PyReadonlyArrayDyn<'py, i16>,
+    data: SampleArray<'py>,
 ) -> PyResult<()> {
-    info!("Writing WAV file: {}", file_path);
-    let sample_format = if spec.sample_format_int {
-        hound::SampleFormat::Int
-    } else {
-        hound::SampleFormat::Float
-    };
-
-    let wavspec = hound::WavSpec {
-        bits_per_sample: spec.bits_per_sample,
+    let format = WavFormat {
         channels: spec.channels,
         sample_rate: spec.sample_rate,
-        sample_format: sample_format,
+        bits_per_sample: spec.bits_per_sample,
+        float: !spec.sample_format_int,
+    };
+    let samples = data
+        .as_slice()
+        .map_err(|_| PyValueError::new_err("data must be C-contiguous"))?;
+    let start = instrument::start();
+    let io = Io {
+        bytes_read: 0,
+        bytes_written: (samples.len() * format.sample_bytes()) as u64,
+        samples: samples.len() as u64,
     };
-    let mut writer = hound::WavWriter::create(file_path, wavspec).unwrap();
-    info!("writer created");
 
-    data.as_array().iter().for_each(|s| {
-        writer.write_sample(*s).unwrap();
-    });
+    py.allow_threads(|| match file {
+        WavTarget::Path(path) => {
+            info!("Writing WAV file: {}", path.display());
+            let mut file = File::create(&path)?;
+            write_wav(&mut file, &format, samples)
+        }
+        WavTarget::Fd(fd) => {
+            info!("Writing WAV file to descriptor: {}", fd);
+            write_wav_fd(fd, &format, samples)
+        }
+    })
+    .map_err(|e| match e.kind() {
+        io::ErrorKind::InvalidInput => PyValueError::new_err(e.to_string()),
+        _ => PyIOError::new_err(e.to_string()),
+    })?;
+    instrument::record("write_wav_file", start, io);
+    Ok(())
+}
 
-    writer.finalize().unwrap();
+/// Turns the counters of `stats_snapshot` on or off.
+#[pyfunction(name = "set_stats_enabled")]
+fn py_set_stats_enabled(enabled: bool) {
+    instrument::set_enabled(enabled);
+}
 
-    Ok(())
+/// Counters of the instrumented functions called while counting was on,
+/// as `{name: {"calls", "bytes_read", "bytes_written", "samples",
+/// "seconds"}}`.
+#[pyfunction(name = "stats_snapshot")]
+fn py_stats_snapshot(py: Python<'_>) -> PyResult<Bound<'_, PyDict>> {
+    let snapshot = PyDict::new_bound(py);
+    for (name, counters) in instrument::snapshot() {
+        let entry = PyDict::new_bound(py);
+        entry.set_item("calls", counters.calls)?;
+        entry.set_item("bytes_read", counters.bytes_read)?;
+        entry.set_item("bytes_written", counters.bytes_written)?;
+        entry.set_item("samples", counters.samples)?;
+        entry.set_item("seconds", counters.nanos as f64 * 1e-9)?;
+        snapshot.set_item(name, entry)?;
+    }
+    Ok(snapshot)
+}
+
+#[pyfunction(name = "reset_stats")]
+fn py_reset_stats() {
+    instrument::reset();
+}
+
+/// Drops the `log` records a Python logger at `level` wouldn't emit before
+/// they are sent to `logging`.
+#[pyfunction(name = "set_log_level")]
+fn py_set_log_level(level: u32) {
+    log::set_max_level(instrument::level_filter(level));
 }
 
 /// A Python module implemented in Rust.
 #[pymodule]
-fn _lowlevel(_py: Python, m: &PyModule) -> PyResult<()> {
+fn _lowlevel(py: Python, m: &PyModule) -> PyResult<()> {
+    instrument::init_logging(py)?;
     m.add_function(wrap_pyfunction!(py_read_wav_file_np, m)?)?;
+    m.add_function(wrap_pyfunction!(py_read_wav_frames, m)?)?;
+    m.add_function(wrap_pyfunction!(py_read_wav_files, m)?)?;
     m.add_function(wrap_pyfunction!(py_read_wav_file_metadata, m)?)?;
+    m.add_function(wrap_pyfunction!(py_read_wav_files_metadata, m)?)?;
     m.add_function(wrap_pyfunction!(py_write_wav_file_np, m)?)?;
+    m.add_function(wrap_pyfunction!(py_read_audio_file, m)?)?;
+    m.add_function(wrap_pyfunction!(py_read_audio_file_metadata, m)?)?;
+    m.add_function(wrap_pyfunction!(py_ima_adpcm_encode, m)?)?;
+    m.add_function(wrap_pyfunction!(py_ima_adpcm_decode, m)?)?;
+    m.add_function(wrap_pyfunction!(py_gain_inplace, m)?)?;
+    m.add_function(wrap_pyfunction!(py_add_inplace, m)?)?;
+    m.add_function(wrap_pyfunction!(py_bias_inplace, m)?)?;
+    m.add_function(wrap_pyfunction!(py_clip_inplace, m)?)?;
+    m.add_function(wrap_pyfunction!(py_interleave, m)?)?;
+    m.add_function(wrap_pyfunction!(py_deinterleave, m)?)?;
+    m.add_function(wrap_pyfunction!(py_int_to_float, m)?)?;
+    m.add_function(wrap_pyfunction!(py_float_to_int, m)?)?;
+    m.add_function(wrap_pyfunction!(py_set_stats_enabled, m)?)?;
+    m.add_function(wrap_pyfunction!(py_stats_snapshot, m)?)?;
+    m.add_function(wrap_pyfunction!(py_reset_stats, m)?)?;
+    m.add_function(wrap_pyfunction!(py_set_log_level, m)?)?;
+    m.add_class::<WavFileMeta>()?;
+    m.add_class::<WavStreamReader>()?;
+    m.add_class::<AudioStreamReader>()?;
     Ok(())
 }
 
 #[cfg(test)]
 mod tests {
-    use crate::{read_wav_file, read_wav_file_metadata};
+    use crate::samples::{SampleKind, Samples};
+    use crate::{
+        ms_to_frame, read_frame_range, read_wav_file, read_wav_file_metadata, WavStreamReader,
+    };
 
     #[test]
     fn test_read_wav_file() {
@@ -202,6 +1285,82 @@ mod tests {
         }
     }
 
+    #[test]
+    fn test_stream_reader_blocks() {
+        let file_path = "./python/tests/sounds/44100_pcm16_stereo.wav";
+        let samples = match read_wav_file(file_path).unwrap() {
+            Samples::I16(v) => v,
+            other => panic!("unexpected container {:?}", other),
+        };
+
+        let reader = hound::WavReader::open(file_path).unwrap();
+        let mut stream = WavStreamReader {
+            kind: SampleKind::from_spec(&reader.spec()).unwrap(),
+            channels: reader.spec().channels,
+            reader: reader,
+            block_frames: 1000,
+            position: 0,
+        };
+        let mut streamed: Vec<i16> = Vec::new();
+        loop {
+            match stream.read_frames(1000).unwrap() {
+                Samples::I16(block) if block.is_empty() => break,
+                Samples::I16(block) => {
+                    assert!(block.len() <= 2000);
+                    streamed.extend(block);
+                }
+                other => panic!("unexpected container {:?}", other),
+            }
+        }
+        assert_eq!(streamed, samples);
+        assert_eq!(stream.position as usize, samples.len() / 2);
+    }
+
+    #[test]
+    fn test_read_frame_range() {
+        let file_path = "./python/tests/sounds/8000_pcm16_stereo.wav";
+        let whole = match read_wav_file(file_path).unwrap() {
+            Samples::I16(v) => v,
+            other => panic!("unexpected container {:?}", other),
+        };
+
+        let mut reader = hound::WavReader::open(file_path).unwrap();
+        // 1.25s into an 8 kHz file, not a whole second
+        let start = ms_to_frame(1250, 8000);
+        assert_eq!(start, 10000);
+        match read_frame_range(&mut reader, start, Some(40)).unwrap() {
+            Samples::I16(v) => assert_eq!(v[..], whole[20000..20080]),
+            other => panic!("unexpected container {:?}", other),
+        }
+        // the range is clamped to the end of the file
+        match read_frame_range(&mut reader, 19990, Some(40)).unwrap() {
+            Samples::I16(v) => assert_eq!(v.len(), 20),
+            other => panic!("unexpected container {:?}", other),
+        }
+    }
+
+    #[test]
+    fn test_read_native_containers() {
+        let cases = [
+            ("8000_pcm08_surround.wav", SampleKind::U8),
+            ("8000_pcm16_surround.wav", SampleKind::I16),
+            ("8000_pcm24_surround.wav", SampleKind::I32),
+            ("8000_pcm32_surround.wav", SampleKind::I32),
+        ];
+        for (name, kind) in cases {
+            let file_path = format!("./python/tests/sounds/{}", name);
+            let samples = read_wav_file(&file_path).unwrap();
+            assert_eq!(samples.len(), 20000 * 3);
+            let matches = match (&samples, kind) {
+                (Samples::U8(_), SampleKind::U8) => true,
+                (Samples::I16(_), SampleKind::I16) => true,
+                (Samples::I32(_), SampleKind::I32) => true,
+                _ => false,
+            };
+            assert!(matches, "{} decoded as {:?}", name, kind);
+        }
+    }
+
     #[test]
     fn test_read_wav_file_metadata() {
         let file_path = "./python/tests/sounds/44100_pcm16_stereo.wav";
@@ -217,5 +1376,8 @@ mod tests {
         assert_eq!(tmeta.bits_per_sample, 32);
         assert_eq!(tmeta.channels, 3);
         assert_eq!(tmeta.sample_rate, 8000);
+        assert!((tmeta.duration_seconds - tmeta.duration as f64 / 8000.0).abs() < 1e-12);
+
+        assert!(read_wav_file_metadata("./python/tests/sounds/missing.wav").is_err());
     }
 }
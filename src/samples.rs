@@ -0,0 +1,203 @@
+//! Native sample containers shared by the WAV readers and writer.
+
+use std::io::Read;
+
+use numpy::ndarray::Dimension;
+use numpy::{
+    BorrowError, Element, IntoPyArray, NotContiguousError, PyArray, PyArrayDyn, PyArrayMethods,
+    PyReadonlyArray, PyReadonlyArrayDyn, PyReadwriteArray,
+};
+use pyo3::exceptions::{PyTypeError, PyValueError};
+use pyo3::prelude::*;
+
+/// Container used for the samples of a file: u8 for 8-bit (WAV stores it
+/// unsigned), i16 up to 16 bits, i32 up to 32 bits (24-bit samples are
+/// sign-extended) and f32 for IEEE float.
+#[derive(Clone, Copy, Debug, PartialEq)]
+pub enum SampleKind {
+    U8,
+    I16,
+    I32,
+    F32,
+}
+
+impl SampleKind {
+    pub fn from_spec(spec: &hound::WavSpec) -> Result<SampleKind, hound::Error> {
+        match (spec.sample_format, spec.bits_per_sample) {
+            (hound::SampleFormat::Int, 8) => Ok(SampleKind::U8),
+            (hound::SampleFormat::Int, 9..=16) => Ok(SampleKind::I16),
+            (hound::SampleFormat::Int, 17..=32) => Ok(SampleKind::I32),
+            (hound::SampleFormat::Float, 32) => Ok(SampleKind::F32),
+            _ => Err(hound::Error::Unsupported),
+        }
+    }
+
+    /// Name of the matching numpy dtype.
+    pub fn dtype(&self) -> &'static str {
+        match self {
+            SampleKind::U8 => "uint8",
+            SampleKind::I16 => "int16",
+            SampleKind::I32 => "int32",
+            SampleKind::F32 => "float32",
+        }
+    }
+}
+
+/// Interleaved samples in their native container.
+#[derive(Debug, PartialEq)]
+pub enum Samples {
+    U8(Vec<u8>),
+    I16(Vec<i16>),
+    I32(Vec<i32>),
+    F32(Vec<f32>),
+}
+
+impl Samples {
+    pub fn len(&self) -> usize {
+        match self {
+            Samples::U8(v) => v.len(),
+            Samples::I16(v) => v.len(),
+            Samples::I32(v) => v.len(),
+            Samples::F32(v) => v.len(),
+        }
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.len() == 0
+    }
+
+    /// Moves the samples into a 1-d numpy array without copying them.
+    pub fn into_pyarray(self, py: Python<'_>) -> PyObject {
+        match self {
+            Samples::U8(v) => v.into_pyarray_bound(py).into_py(py),
+            Samples::I16(v) => v.into_pyarray_bound(py).into_py(py),
+            Samples::I32(v) => v.into_pyarray_bound(py).into_py(py),
+            Samples::F32(v) => v.into_pyarray_bound(py).into_py(py),
+        }
+    }
+}
+
+/// Borrowed interleaved samples, see `Samples`.
+pub enum SampleSlice<'a> {
+    U8(&'a [u8]),
+    I16(&'a [i16]),
+    I32(&'a [i32]),
+    F32(&'a [f32]),
+}
+
+impl<'a> SampleSlice<'a> {
+    pub fn len(&self) -> usize {
+        match self {
+            SampleSlice::U8(s) => s.len(),
+            SampleSlice::I16(s) => s.len(),
+            SampleSlice::I32(s) => s.len(),
+            SampleSlice::F32(s) => s.len(),
+        }
+    }
+}
+
+/// A numpy array of samples passed in from Python, in any native container.
+#[derive(FromPyObject)]
+pub enum SampleArray<'py> {
+    U8(PyReadonlyArrayDyn<'py, u8>),
+    I16(PyReadonlyArrayDyn<'py, i16>),
+    I32(PyReadonlyArrayDyn<'py, i32>),
+    F32(PyReadonlyArrayDyn<'py, f32>),
+}
+
+impl<'py> SampleArray<'py> {
+    /// Borrows the samples, which must be C-contiguous. The slice doesn't
+    /// touch Python objects, so it can be used with the GIL released.
+    pub fn as_slice(&self) -> Result<SampleSlice<'_>, NotContiguousError> {
+        Ok(match self {
+            SampleArray::U8(a) => SampleSlice::U8(a.as_slice()?),
+            SampleArray::I16(a) => SampleSlice::I16(a.as_slice()?),
+            SampleArray::I32(a) => SampleSlice::I32(a.as_slice()?),
+            SampleArray::F32(a) => SampleSlice::F32(a.as_slice()?),
+        })
+    }
+}
+
+/// A numpy array of samples to write to, in one of the containers of the
+/// `dsp` kernels. It is borrowed with `readwrite` once the other arguments
+/// are known, so a read-only or aliased array raises instead of panicking.
+#[derive(FromPyObject)]
+pub enum SampleArrayMut<'py> {
+    I16(Bound<'py, PyArrayDyn<i16>>),
+    I32(Bound<'py, PyArrayDyn<i32>>),
+    F32(Bound<'py, PyArrayDyn<f32>>),
+}
+
+fn borrow_error(err: BorrowError) -> PyErr {
+    match err {
+        BorrowError::NotWriteable => PyTypeError::new_err("array is not writeable"),
+        _ => PyValueError::new_err("arrays overlap an array written by the same call"),
+    }
+}
+
+/// Borrows `array` for writing: `TypeError` if it is read-only,
+/// `ValueError` if it overlaps an array already borrowed by the call.
+pub fn readwrite<'py, T: Element, D: Dimension>(
+    array: &Bound<'py, PyArray<T, D>>,
+) -> PyResult<PyReadwriteArray<'py, T, D>> {
+    array.try_readwrite().map_err(borrow_error)
+}
+
+/// Borrows `array` for reading: `ValueError` if it overlaps an array
+/// already borrowed for writing by the call.
+pub fn readonly<'py, T: Element, D: Dimension>(
+    array: &Bound<'py, PyArray<T, D>>,
+) -> PyResult<PyReadonlyArray<'py, T, D>> {
+    array.try_readonly().map_err(borrow_error)
+}
+
+/// hound hands 8-bit samples out re-centred as i8, WAV stores them as u8.
+pub fn u8_from_i8(sample: i8) -> u8 {
+    (sample as u8) ^ 0x80
+}
+
+pub fn same<S>(sample: S) -> S {
+    sample
+}
+
+fn collect_samples<R: Read, S: hound::Sample, T>(
+    reader: &mut hound::WavReader<R>,
+    n_samples: usize,
+    convert: fn(S) -> T,
+) -> Result<Vec<T>, hound::Error> {
+    let iter = reader.samples::<S>().take(n_samples);
+    let mut samples = Vec::with_capacity(iter.size_hint().0);
+    for sample in iter {
+        samples.push(convert(sample?));
+    }
+    Ok(samples)
+}
+
+/// Reads up to `n_samples` interleaved samples from the current position of
+/// `reader`, decoded in a single pass into the native container of the file.
+pub fn read_samples<R: Read>(
+    reader: &mut hound::WavReader<R>,
+    n_samples: usize,
+) -> Result<Samples, hound::Error> {
+    Ok(match SampleKind::from_spec(&reader.spec())? {
+        SampleKind::U8 => Samples::U8(collect_samples(reader, n_samples, u8_from_i8)?),
+        SampleKind::I16 => Samples::I16(collect_samples(reader, n_samples, same::<i16>)?),
+        SampleKind::I32 => Samples::I32(collect_samples(reader, n_samples, same::<i32>)?),
+        SampleKind::F32 => Samples::F32(collect_samples(reader, n_samples, same::<f32>)?),
+    })
+}
+
+/// Fills `out` from the current position of `reader`, returns the number of
+/// samples written.
+pub fn fill_samples<R: Read, S: hound::Sample, T>(
+    reader: &mut hound::WavReader<R>,
+    out: &mut [T],
+    convert: fn(S) -> T,
+) -> Result<usize, hound::Error> {
+    let mut n_samples = 0;
+    for (dst, sample) in out.iter_mut().zip(reader.samples::<S>()) {
+        *dst = convert(sample?);
+        n_samples += 1;
+    }
+    Ok(n_samples)
+}
@@ -0,0 +1,283 @@
+//! Bulk WAV writer.
+//!
+//! The sample count is known up front, so the header is written once with
+//! its final sizes and the target never needs to be seekable. Samples are
+//! encoded to little-endian into a fixed-size block that is handed to the
+//! target with a single `write_all` per block.
+
+use std::io::{self, Write};
+
+use crate::samples::SampleSlice;
+
+const BLOCK_BYTES: usize = 1 << 16;
+
+const WAVE_FORMAT_PCM: u16 = 0x0001;
+const WAVE_FORMAT_IEEE_FLOAT: u16 = 0x0003;
+const WAVE_FORMAT_EXTENSIBLE: u16 = 0xFFFE;
+
+/// Tail of the KSDATAFORMAT_SUBTYPE_* GUIDs, after the format tag.
+const SUBFORMAT_GUID_TAIL: [u8; 14] = [
+    0x00, 0x00, 0x00, 0x00, 0x10, 0x00, 0x80, 0x00, 0x00, 0xAA, 0x00, 0x38, 0x9B, 0x71,
+];
+
+/// Layout of the samples in the written file.
+pub struct WavFormat {
+    pub channels: u16,
+    pub sample_rate: u32,
+    pub bits_per_sample: u16,
+    pub float: bool,
+}
+
+impl WavFormat {
+    pub fn sample_bytes(&self) -> usize {
+        (self.bits_per_sample as usize + 7) / 8
+    }
+}
+
+/// Size of the encoded data chunk, or an error when the samples can't be
+/// stored with `format`.
+fn encoded_size(samples: &SampleSlice<'_>, format: &WavFormat) -> Result<usize, String> {
+    let width = format.sample_bytes();
+    if width == 0 || format.channels == 0 {
+        return Err("bits_per_sample and channels must be positive".to_string());
+    }
+    let valid = match (samples, format.float, width) {
+        (SampleSlice::U8(_), false, _) => true,
+        (SampleSlice::I16(_), false, 2) => true,
+        (SampleSlice::I32(_), false, 3..=4) => true,
+        (SampleSlice::F32(_), true, 4) => true,
+        _ => false,
+    };
+    if !valid {
+        return Err(format!(
+            "can't write this sample type as {}-bit {} samples",
+            format.bits_per_sample,
+            if format.float { "float" } else { "integer" }
+        ));
+    }
+
+    let data_bytes = match samples {
+        SampleSlice::U8(s) => s.len(),
+        _ => samples.len() * width,
+    };
+    if data_bytes % (width * format.channels as usize) != 0 {
+        return Err("not a whole number of frames".to_string());
+    }
+    Ok(data_bytes)
+}
+
+/// Speakers of the standard layouts, in the channel order `npaudioop`
+/// downmixes them with. Other channel counts are left unassigned.
+fn channel_mask(channels: u16) -> u32 {
+    match channels {
+        // FC
+        1 => 0x4,
+        // FL FR
+        2 => 0x3,
+        // FL FR FC
+        3 => 0x7,
+        // FL FR BL BR
+        4 => 0x33,
+        // FL FR FC BL BR
+        5 => 0x37,
+        // 5.1: FL FR FC LFE BL BR
+        6 => 0x3F,
+        // 7.1: FL FR FC LFE BL BR SL SR
+        8 => 0x63F,
+        _ => 0,
+    }
+}
+
+/// Header up to the start of the samples. Like hound, more than 2
+/// channels, more than 16 bits or a width that isn't whole bytes get a
+/// WAVE_FORMAT_EXTENSIBLE fmt chunk, which strict readers require for
+/// them. Float files carry the `fact` chunk of non-PCM formats.
+fn header(format: &WavFormat, data_bytes: u32) -> Vec<u8> {
+    let container_bits = 8 * format.sample_bytes() as u16;
+    let block_align = format.channels as u32 * format.sample_bytes() as u32;
+    let format_tag = if format.float {
+        WAVE_FORMAT_IEEE_FLOAT
+    } else {
+        WAVE_FORMAT_PCM
+    };
+    let extensible = format.channels > 2
+        || format.bits_per_sample > 16
+        || format.bits_per_sample != container_bits;
+
+    let mut fmt = Vec::with_capacity(40);
+    fmt.extend_from_slice(
+        &if extensible {
+            WAVE_FORMAT_EXTENSIBLE
+        } else {
+            format_tag
+        }
+        .to_le_bytes(),
+    );
+    fmt.extend_from_slice(&format.channels.to_le_bytes());
+    fmt.extend_from_slice(&format.sample_rate.to_le_bytes());
+    fmt.extend_from_slice(&(block_align * format.sample_rate).to_le_bytes());
+    fmt.extend_from_slice(&(block_align as u16).to_le_bytes());
+    if extensible {
+        fmt.extend_from_slice(&container_bits.to_le_bytes());
+        // size of the extension
+        fmt.extend_from_slice(&22u16.to_le_bytes());
+        fmt.extend_from_slice(&format.bits_per_sample.to_le_bytes());
+        fmt.extend_from_slice(&channel_mask(format.channels).to_le_bytes());
+        fmt.extend_from_slice(&format_tag.to_le_bytes());
+        fmt.extend_from_slice(&SUBFORMAT_GUID_TAIL);
+    } else {
+        fmt.extend_from_slice(&format.bits_per_sample.to_le_bytes());
+    }
+
+    let mut chunks = Vec::with_capacity(72);
+    chunks.extend_from_slice(b"fmt ");
+    chunks.extend_from_slice(&(fmt.len() as u32).to_le_bytes());
+    chunks.extend_from_slice(&fmt);
+    if format.float {
+        // frames per channel
+        chunks.extend_from_slice(b"fact");
+        chunks.extend_from_slice(&4u32.to_le_bytes());
+        chunks.extend_from_slice(&(data_bytes / block_align).to_le_bytes());
+    }
+    chunks.extend_from_slice(b"data");
+    chunks.extend_from_slice(&data_bytes.to_le_bytes());
+
+    let mut header = Vec::with_capacity(12 + chunks.len());
+    header.extend_from_slice(b"RIFF");
+    let riff_bytes = 4 + chunks.len() as u32 + data_bytes + data_bytes % 2;
+    header.extend_from_slice(&riff_bytes.to_le_bytes());
+    header.extend_from_slice(b"WAVE");
+    header.extend_from_slice(&chunks);
+    header
+}
+
+fn write_encoded<W, T, F>(writer: &mut W, samples: &[T], width: usize, encode: F) -> io::Result<()>
+where
+    W: Write,
+    T: Copy,
+    F: Fn(T, &mut [u8]),
+{
+    let per_block = BLOCK_BYTES / width;
+    let mut block = vec![0u8; per_block.min(samples.len()) * width];
+    for chunk in samples.chunks(per_block) {
+        let bytes = &mut block[..chunk.len() * width];
+        for (sample, out) in chunk.iter().zip(bytes.chunks_exact_mut(width)) {
+            encode(*sample, out);
+        }
+        writer.write_all(bytes)?;
+    }
+    Ok(())
+}
+
+/// Writes a complete WAV file (header, samples and pad byte) to `writer`.
+pub fn write_wav<W: Write>(
+    writer: &mut W,
+    format: &WavFormat,
+    samples: SampleSlice<'_>,
+) -> io::Result<()> {
+    let data_bytes = encoded_size(&samples, format)
+        .map_err(|msg| io::Error::new(io::ErrorKind::InvalidInput, msg))?;
+    let data_bytes_u32 = u32::try_from(data_bytes).map_err(|_| {
+        io::Error::new(
+            io::ErrorKind::InvalidInput,
+            "data is too large for a WAV file",
+        )
+    })?;
+
+    writer.write_all(&header(format, data_bytes_u32))?;
+    match samples {
+        SampleSlice::U8(s) => writer.write_all(s)?,
+        SampleSlice::I16(s) => write_encoded(writer, s, 2, |v: i16, out: &mut [u8]| {
+            out.copy_from_slice(&v.to_le_bytes())
+        })?,
+        SampleSlice::I32(s) if format.sample_bytes() == 3 => {
+            write_encoded(writer, s, 3, |v: i32, out: &mut [u8]| {
+                out.copy_from_slice(&v.to_le_bytes()[..3])
+            })?
+        }
+        SampleSlice::I32(s) => write_encoded(writer, s, 4, |v: i32, out: &mut [u8]| {
+            out.copy_from_slice(&v.to_le_bytes())
+        })?,
+        SampleSlice::F32(s) => write_encoded(writer, s, 4, |v: f32, out: &mut [u8]| {
+            out.copy_from_slice(&v.to_le_bytes())
+        })?,
+    }
+    if data_bytes % 2 == 1 {
+        // RIFF chunks are word aligned
+        writer.write_all(&[0])?;
+    }
+    writer.flush()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{header, write_wav, WavFormat};
+    use crate::samples::SampleSlice;
+
+    #[test]
+    fn test_write_24bit_roundtrip() {
+        let samples: Vec<i32> = vec![0, 1, -1, 8_388_607, -8_388_608, 12345];
+        let format = WavFormat {
+            channels: 2,
+            sample_rate: 8000,
+            bits_per_sample: 24,
+            float: false,
+        };
+        let mut buffer = std::io::Cursor::new(Vec::new());
+        write_wav(&mut buffer, &format, SampleSlice::I32(&samples)).unwrap();
+        // WAVE_FORMAT_EXTENSIBLE header
+        assert_eq!(buffer.get_ref().len(), 68 + 18);
+
+        buffer.set_position(0);
+        let mut reader = hound::WavReader::new(buffer).unwrap();
+        assert_eq!(reader.spec().bits_per_sample, 24);
+        let decoded: Vec<i32> = reader.samples::<i32>().map(|s| s.unwrap()).collect();
+        assert_eq!(decoded, samples);
+    }
+
+    #[test]
+    fn test_header_bytes() {
+        let mut format = WavFormat {
+            channels: 2,
+            sample_rate: 8000,
+            bits_per_sample: 16,
+            float: false,
+        };
+        let pcm = header(&format, 8);
+        assert_eq!(pcm.len(), 44);
+        assert_eq!(&pcm[20..22], &1u16.to_le_bytes());
+
+        format.channels = 6;
+        format.bits_per_sample = 24;
+        let extensible = header(&format, 36);
+        assert_eq!(extensible.len(), 68);
+        assert_eq!(&extensible[4..8], &(60u32 + 36).to_le_bytes());
+        assert_eq!(&extensible[16..20], &40u32.to_le_bytes());
+        assert_eq!(&extensible[20..22], &0xFFFEu16.to_le_bytes());
+        assert_eq!(&extensible[34..36], &24u16.to_le_bytes());
+        assert_eq!(&extensible[40..44], &0x3Fu32.to_le_bytes());
+        assert_eq!(&extensible[44..46], &1u16.to_le_bytes());
+
+        format.channels = 1;
+        format.bits_per_sample = 32;
+        format.float = true;
+        let float = header(&format, 16);
+        assert_eq!(&float[44..46], &3u16.to_le_bytes());
+        assert_eq!(&float[60..64], b"fact");
+        assert_eq!(&float[68..72], &4u32.to_le_bytes());
+        assert_eq!(&float[72..76], b"data");
+    }
+
+    #[test]
+    fn test_write_rejects_mismatched_format() {
+        let samples: Vec<f32> = vec![0.0, 0.5];
+        let format = WavFormat {
+            channels: 1,
+            sample_rate: 8000,
+            bits_per_sample: 16,
+            float: false,
+        };
+        let mut buffer = Vec::new();
+        assert!(write_wav(&mut buffer, &format, SampleSlice::F32(&samples)).is_err());
+    }
+}